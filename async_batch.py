@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Asyncio Batch Engine
+Runs a BatchProcessor batch from a single event loop so hundreds of tracks
+can be in flight at once. Extraction and downloads run in an executor, as
+yt-dlp is blocking, with a concurrency limit per platform. Conversions run as
+asyncio ffmpeg subprocesses, so a track waiting on ffmpeg holds no thread. A
+global cap bounds how many tracks hold sockets or files open. Entries are
+journaled and recorded through the BatchProcessor, so the log has the same
+format as with the threaded engine.
+"""
+
+import asyncio
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from format_selection import conversion_plan, flac_matches_profile
+from streaming_convert import ffmpeg_file_command, ConversionError
+from audio_profiles import get_profile
+from transcode_pool import DEFAULT_TRANSCODE_WORKERS
+
+# Tracks in flight at once, each holding a socket or file open
+DEFAULT_MAX_OPEN = int(os.environ.get('BATCH_MAX_OPEN', '256'))
+
+async def convert_download_async(info, format_type, profile=None, progress=None):
+    """Asyncio counterpart of format_selection.convert_download
+
+    The conversion plan comes from the format metadata yt-dlp reported
+    instead of probing the file, so a profile that sets a sample rate or
+    channel count is always applied to PCM sources.
+    """
+    settings = get_profile(profile)
+    download = (info.get('requested_downloads') or [info])[-1]
+    path = download['filepath']
+    ext = download.get('ext') or os.path.splitext(path)[1][1:]
+    plan = conversion_plan(download.get('acodec'), ext, format_type, settings['bit_depth'])
+    if plan == 'skip':
+        if format_type == 'flac':
+            keep = flac_matches_profile(path, settings)
+        else:
+            keep = not (settings['sample_rate'] or settings['channels'])
+        if keep:
+            info['filepath'] = path
+            return info
+
+    if progress:
+        progress.set_stage('transcode')
+    output_path = f"{os.path.splitext(path)[0]}.{format_type}"
+    source_path = path
+    if output_path == path:
+        source_path = f"{os.path.splitext(path)[0]}.orig.{format_type}"
+        os.replace(path, source_path)
+    tmp_path = f"{output_path}.part"
+    process = await asyncio.create_subprocess_exec(
+        *ffmpeg_file_command(source_path, tmp_path, format_type, settings['sample_rate'],
+                             settings['channels'], settings['bit_depth']),
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', 'replace').strip().splitlines()[-20:]
+            raise ConversionError('; '.join(message) or f"ffmpeg exited with status {process.returncode}")
+        os.replace(tmp_path, output_path)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    os.remove(source_path)
+
+    download['filepath'] = output_path
+    download['ext'] = format_type
+    info['filepath'] = output_path
+    return info
+
+class AsyncBatchRunner:
+    """Runs BatchProcessor entries on an event loop, and converts the tracks they download
+
+    The runner is the transcoder handed to CLIMusicConverter, so download
+    threads return as soon as a file is downloaded.
+    """
+    def __init__(self, processor, platform_workers=1, platform_limits=None,
+                 max_open=DEFAULT_MAX_OPEN, transcode_workers=DEFAULT_TRANSCODE_WORKERS):
+        self.processor = processor
+        self.platform_workers = max(1, platform_workers)
+        self.platform_limits = platform_limits or {}
+        self.max_open = max(1, max_open)
+        self.transcode_workers = max(1, transcode_workers)
+        self.loop = None
+        self.executor = None
+        self._platforms = {}
+
+    def platform_slots(self, url):
+        key = self.processor.rate_limit_key(url)
+        if key not in self._platforms:
+            self._platforms[key] = asyncio.Semaphore(
+                int(self.platform_limits.get(key, self.platform_workers)))
+        return self._platforms[key]
+
+    def submit(self, fn, job, ydl=None):
+        """Transcoder interface: convert job's download, then record it with fn"""
+        return asyncio.run_coroutine_threadsafe(self._transcode(fn, job), self.loop)
+
+    async def _transcode(self, fn, job):
+        try:
+            async with self._cpu_slots:
+                job['progress'].end_span('transcode_wait')
+                await convert_download_async(job['info'], job['storage_format'], job['profile'],
+                                             job['progress'])
+            # Recording copies into the cache and may write WAV/AIFF from FLAC
+            return await self.loop.run_in_executor(self.executor, fn, job)
+        except Exception as e:
+            print(f"Conversion error: {e}")
+            return None
+
+    async def run_entry(self, url_data, index, total, format_type, quality, rate_limiter):
+        try:
+            async with self.platform_slots(url_data['url']):
+                result = await self.loop.run_in_executor(
+                    self.executor, self.processor.process_url, url_data, index, total,
+                    format_type, quality, rate_limiter, self
+                )
+            if isinstance(result, Future):
+                await asyncio.wrap_future(result)
+        finally:
+            self._open_slots.release()
+
+    async def run(self, entries, format_type, quality, rate_limiter, total=None):
+        """Process entries, pulling new ones only while fewer than max_open are in flight"""
+        self.loop = asyncio.get_running_loop()
+        self._open_slots = asyncio.Semaphore(self.max_open)
+        self._cpu_slots = asyncio.Semaphore(self.transcode_workers)
+        entries = iter(entries)
+        tasks = set()
+        index = 0
+        with ThreadPoolExecutor(max_workers=self.max_open) as self.executor:
+            while True:
+                await self._open_slots.acquire()
+                # Entries may come from a slow lazy source such as stdin
+                url_data = await self.loop.run_in_executor(self.executor, next, entries, None)
+                if url_data is None:
+                    self._open_slots.release()
+                    break
+                index += 1
+                task = asyncio.create_task(self.run_entry(url_data, index, total, format_type,
+                                                          quality, rate_limiter))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
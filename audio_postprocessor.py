@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Audio Post-Processor
+yt-dlp post-processor that writes WAV, AIFF or FLAC with the conversion
+plan chosen by format_selection. It lives in its own module because it
+subclasses a yt-dlp class: format_selection imports it on first use, so
+loading the converters does not load yt-dlp.
+"""
+
+import os
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+from streaming_convert import stream_convert, probe_audio
+from audio_profiles import get_profile
+from format_selection import conversion_plan, flac_matches_profile
+
+class AudioOutputPP(FFmpegPostProcessor):
+    """Convert a downloaded file to WAV, AIFF or FLAC, skipping work where possible"""
+    def __init__(self, downloader=None, format_type='wav', profile=None):
+        FFmpegPostProcessor.__init__(self, downloader)
+        self.format_type = format_type.lower()
+        self.profile = get_profile(profile)
+
+    def run(self, information):
+        path = information['filepath']
+        profile = self.profile
+        plan = conversion_plan(self.get_audio_codec(path), information.get('ext'),
+                               self.format_type, profile['bit_depth'])
+        if plan == 'skip' and self.format_type == 'flac':
+            # FLAC sources are kept only at the profile's depth, rate and channels
+            if not flac_matches_profile(path, profile):
+                plan = 'transcode'
+        elif plan == 'skip' and (profile['sample_rate'] or profile['channels']):
+            # Right container and depth, but the profile may still ask for a resample
+            source = probe_audio(path)
+            if ((profile['sample_rate'] or source['sample_rate']) != source['sample_rate']
+                    or (profile['channels'] or source['channels']) != source['channels']):
+                plan = 'remux'
+        information['conversion'] = plan
+        if plan == 'skip':
+            self.to_screen(f'Not converting audio {path}; already {self.format_type.upper()}')
+            return [], information
+
+        new_path = f"{os.path.splitext(path)[0]}.{self.format_type}"
+        orig_path = path
+        if new_path == path:
+            orig_path = f"{os.path.splitext(path)[0]}.orig.{self.format_type}"
+            os.replace(path, orig_path)
+        self.to_screen(f'{"Remuxing" if plan == "remux" else "Converting"} audio to {new_path}')
+        stream_convert(orig_path, new_path, self.format_type, sample_rate=profile['sample_rate'],
+                       channels=profile['channels'], bit_depth=profile['bit_depth'])
+
+        information['filepath'] = new_path
+        information['ext'] = self.format_type
+        return [orig_path], information
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Audio Profiles
+Named sample rate / bit depth / channel layouts for WAV and AIFF output.
+A None field keeps the source's value. The profile, not a bitrate, decides
+the size of an uncompressed file, so smaller profiles cut storage and
+transfer roughly in proportion.
+"""
+
+AUDIO_PROFILES = {
+    'native': {
+        'label': 'Native (source rate, 16-bit)',
+        'sample_rate': None, 'bit_depth': 16, 'channels': None,
+        'source_quality': 'best',
+    },
+    'studio': {
+        'label': 'Studio (48 kHz / 24-bit)',
+        'sample_rate': 48000, 'bit_depth': 24, 'channels': 2,
+        'source_quality': 'best',
+    },
+    'cd': {
+        'label': 'CD (44.1 kHz / 16-bit)',
+        'sample_rate': 44100, 'bit_depth': 16, 'channels': 2,
+        'source_quality': 'high',
+    },
+    'preview': {
+        'label': 'Preview (22.05 kHz mono)',
+        'sample_rate': 22050, 'bit_depth': 16, 'channels': 1,
+        'source_quality': 'medium',
+    },
+}
+
+# Matches what every entry point produced before profiles existed
+DEFAULT_PROFILE = 'native'
+
+def get_profile(name=None):
+    """Profile settings by name; raises ValueError for unknown names"""
+    name = (name or DEFAULT_PROFILE).lower()
+    if name not in AUDIO_PROFILES:
+        raise ValueError(f"Unknown audio profile '{name}', expected one of: "
+                         f"{', '.join(AUDIO_PROFILES)}")
+    return AUDIO_PROFILES[name]
+
+def profile_from_label(label):
+    """Profile name for a label shown in the GUI"""
+    for name, profile in AUDIO_PROFILES.items():
+        if profile['label'] == label:
+            return name
+    return DEFAULT_PROFILE
+
+def output_variant(quality, profile=None):
+    """Quality key for caches and manifests that also tells profiles apart
+
+    The default profile keeps the plain quality, so outputs recorded before
+    profiles existed are still found.
+    """
+    profile = (profile or DEFAULT_PROFILE).lower()
+    if profile == DEFAULT_PROFILE:
+        return quality
+    return f"{quality}+{profile}"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Batch Journal
+Append-only record of batch progress. Every status change is one JSON line;
+the journal is periodically compacted into the batch_log.json snapshot with
+an atomic rename, so a crash never leaves a half-written log behind.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+DEFAULT_COMPACT_EVERY = 1000
+
+class BatchJournal:
+    def __init__(self, log_file, compact_every=DEFAULT_COMPACT_EVERY):
+        self.log_file = log_file
+        self.journal_file = os.path.splitext(log_file)[0] + '.journal.jsonl'
+        self.compact_every = compact_every
+        self.records_since_compact = 0
+        self._handle = None
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        with self._lock:
+            if self._handle is None:
+                self._handle = open(self.journal_file, 'a', encoding='utf-8')
+            self._handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._handle.flush()
+            self.records_since_compact += 1
+
+    def add(self, index, entry):
+        """Record a new entry at position index"""
+        self._write({'op': 'add', 'index': index, 'entry': entry})
+
+    def update(self, index, fields):
+        """Record changed fields of the entry at position index"""
+        self._write({'op': 'update', 'index': index, 'fields': fields})
+
+    def should_compact(self, total):
+        """True once the journal is long enough to be worth folding in
+
+        The threshold grows with the batch so compaction stays amortised O(1)
+        per record.
+        """
+        return self.records_since_compact >= max(self.compact_every, total)
+
+    def compact(self, results, counts):
+        """Write a snapshot of all results and start an empty journal"""
+        log_data = {
+            'timestamp': datetime.now().isoformat(),
+            'total_urls': len(results),
+            'completed': counts.get('completed', 0),
+            'failed': counts.get('failed', 0),
+            'results': results
+        }
+        tmp_file = f"{self.log_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(log_data, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.log_file)
+
+        # Replaying records already folded into the snapshot is harmless, so a
+        # crash between the rename and the truncation loses nothing
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+            self._handle = open(self.journal_file, 'w', encoding='utf-8')
+            self.records_since_compact = 0
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    def load(self):
+        """Rebuild the results list from the snapshot and the journal"""
+        results = []
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                results = json.load(f).get('results', [])
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        break
+                    index = record['index']
+                    if record['op'] == 'add':
+                        while len(results) <= index:
+                            results.append(None)
+                        results[index] = record['entry']
+                    elif record['op'] == 'update' and index < len(results) and results[index]:
+                        results[index].update(record['fields'])
+
+        return [entry for entry in results if entry is not None]
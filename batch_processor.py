@@ -5,125 +5,373 @@ Process multiple music URLs from various sources
 """
 
 import os
-import json
+import re
+import asyncio
 import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from cli_converter import CLIMusicConverter
+from urllib.parse import urlparse
+from cli_converter import CLIMusicConverter, create_cache, create_metadata_cache
+from metadata_cache import DEFAULT_METADATA_TTL
+from progress import ProgressTracker
+from download_cache import DEFAULT_CACHE_DIR
+from batch_journal import BatchJournal
+from url_loaders import iter_urls, iter_urls_from_text, iter_urls_from_json
+from playlist_expander import PlaylistExpander, DEFAULT_EXPAND_WORKERS
+from audio_profiles import AUDIO_PROFILES, DEFAULT_PROFILE
+from transcode_pool import TranscodePool, DEFAULT_TRANSCODE_WORKERS, DEFAULT_TRANSCODE_QUEUE
+from async_batch import AsyncBatchRunner, DEFAULT_MAX_OPEN
+from profiling import add_profiling_arguments, create_profiler
+from work_queue import (SQLiteWorkQueue, default_worker_id, DEFAULT_LEASE_SECONDS,
+                        DEFAULT_MAX_ATTEMPTS, FINISHED_STATES)
+
+class HostRateLimiter:
+    """Enforce a minimum interval between downloads from the same host"""
+    def __init__(self, default_delay=2, delays=None):
+        self.default_delay = default_delay
+        self.delays = delays or {}
+        self._next_slot = {}
+        self._lock = threading.Lock()
+        
+    def wait(self, key):
+        """Block until the next download slot for key is available"""
+        delay = self.delays.get(key, self.default_delay)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, now))
+            self._next_slot[key] = slot + delay
+        remaining = slot - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+def worker_log_name(worker_id):
+    """Batch log file name of one queue worker, so workers sharing a directory keep separate logs"""
+    return f"batch_log.{re.sub(r'[^A-Za-z0-9._-]', '_', worker_id)}.json"
 
 class BatchProcessor:
-    def __init__(self, output_dir="./downloads"):
-        self.converter = CLIMusicConverter()
+    def __init__(self, output_dir="./downloads", cache=None, metadata_cache=None, pipeline=False,
+                 profile=DEFAULT_PROFILE, store_flac=False,
+                 transcode_workers=DEFAULT_TRANSCODE_WORKERS, transcode_queue=DEFAULT_TRANSCODE_QUEUE,
+                 engine='threads', max_open=DEFAULT_MAX_OPEN, platform_workers=None,
+                 log_name="batch_log.json"):
+        # Duplicate tracks in a batch (or across batches) are served from the cache
+        self.converter = CLIMusicConverter(cache, metadata_cache, pipeline, profile, store_flac)
+        # Downloads hand their files to a pool sized to the cores for conversion
+        # (0 workers converts in the download worker itself)
+        self.transcoder = (TranscodePool(transcode_workers, transcode_queue)
+                           if transcode_workers > 0 else None)
+        self.transcode_workers = transcode_workers
+        # 'asyncio' runs the batch from an event loop; max_open caps tracks in
+        # flight and platform_workers overrides the per-platform download limit
+        self.engine = engine
+        self.max_open = max_open
+        self.platform_workers = platform_workers or {}
         self.output_dir = output_dir
-        self.log_file = os.path.join(output_dir, "batch_log.json")
+        self.log_file = os.path.join(output_dir, log_name)
+        self.journal = BatchJournal(self.log_file)
         self.results = []
+        self.status_counts = Counter()
+        self.positions = {}
+        self.lock = threading.RLock()
+        # Shared work queue leases held by this worker, by entry
+        self.work_queue = None
+        self.leases = {}
         
-    def load_urls_from_file(self, file_path):
-        """Load URLs from a text file"""
-        urls = []
+    def rate_limit_key(self, url):
+        """Group URLs by platform, falling back to the host for unknown sites"""
+        platform = self.converter.detect_platform(url)
+        if platform != 'unknown':
+            return platform
+        return urlparse(url).netloc.lower() or 'unknown'
+        
+    def iter_input(self, entries, source):
+        """Pass entries through, reporting a load error instead of raising"""
+        count = 0
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    line = line.strip()
-                    if line and not line.startswith('#'):  # Skip empty lines and comments
-                        urls.append({
-                            'url': line,
-                            'line_number': line_num,
-                            'status': 'pending'
-                        })
-            print(f"Loaded {len(urls)} URLs from {file_path}")
-            return urls
+            for entry in entries:
+                count += 1
+                yield entry
         except Exception as e:
-            print(f"Error loading URLs from {file_path}: {e}")
-            return []
+            print(f"Error loading URLs from {source}: {e}")
+        else:
+            print(f"Loaded {count} URLs from {source}")
+    
+    def load_urls_from_file(self, file_path):
+        """Load URLs from a text file"""
+        return list(self.iter_input(iter_urls_from_text(file_path), file_path))
     
     def load_urls_from_json(self, json_path):
         """Load URLs from a JSON file with metadata"""
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    return data
-                elif 'urls' in data:
-                    return data['urls']
-                else:
-                    print("Invalid JSON format")
-                    return []
-        except Exception as e:
-            print(f"Error loading JSON from {json_path}: {e}")
-            return []
+        return list(self.iter_input(iter_urls_from_json(json_path), json_path))
     
     def save_progress(self):
-        """Save current progress to log file"""
+        """Compact the progress journal into the log file snapshot"""
         try:
-            log_data = {
-                'timestamp': datetime.now().isoformat(),
-                'total_urls': len(self.results),
-                'completed': len([r for r in self.results if r['status'] == 'completed']),
-                'failed': len([r for r in self.results if r['status'] == 'failed']),
-                'results': self.results
-            }
-            
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
+            with self.lock:
+                self.journal.compact(self.results, self.status_counts)
         except Exception as e:
             print(f"Error saving progress: {e}")
     
-    def process_batch(self, urls, format_type='wav', quality='best', delay=2):
-        """Process a batch of URLs"""
-        print(f"Starting batch processing of {len(urls)} URLs")
-        print(f"Format: {format_type}, Quality: {quality}")
-        print(f"Output directory: {self.output_dir}")
-        print("-" * 50)
-        
-        self.results = urls.copy()
+    def reset_results(self, results):
+        """Start tracking a new list of result entries"""
+        with self.lock:
+            self.results = results
+            self.positions = {id(entry): i for i, entry in enumerate(results)}
+            self.status_counts = Counter(entry.get('status') for entry in results)
+    
+    def add_entry(self, url_data):
+        """Append a URL to the batch and journal it"""
+        with self.lock:
+            url_data.setdefault('status', 'pending')
+            self.positions[id(url_data)] = len(self.results)
+            self.journal.add(len(self.results), url_data)
+            self.results.append(url_data)
+            self.status_counts[url_data['status']] += 1
+        return url_data
+    
+    def update_status(self, url_data, **fields):
+        """Update a result entry and append the change to the journal"""
+        with self.lock:
+            old_status = url_data.get('status')
+            url_data.update(fields)
+            if fields.get('status', old_status) != old_status:
+                self.status_counts[old_status] -= 1
+                self.status_counts[fields['status']] += 1
+            self.journal.update(self.positions[id(url_data)], fields)
+            if self.journal.should_compact(len(self.results)):
+                self.save_progress()
+            lease = (self.leases.pop(id(url_data), None)
+                     if fields.get('status') in FINISHED_STATES else None)
+        if lease:
+            self.report_to_queue(lease, fields)
+    
+    def report_to_queue(self, lease, fields):
+        """Record a finished entry in the shared work queue"""
+        item_id, token = lease
+        try:
+            if fields['status'] == 'completed':
+                result = {key: value for key, value in fields.items() if key != 'status'}
+                recorded = self.work_queue.complete(item_id, token, result)
+            else:
+                recorded = self.work_queue.fail(item_id, token, fields.get('error', 'Unknown error'))
+            if not recorded:
+                print(f"Lease on queue item {item_id} was lost; another worker owns it now")
+        except Exception as e:
+            print(f"Error updating work queue: {e}")
+    
+    def process_url(self, url_data, index, total, format_type, quality, rate_limiter,
+                    transcoder=None):
+        """Download a single URL, honouring the per-host rate limit
+
+        With a transcoder, returns a Future that resolves once the entry has
+        been converted and recorded.
+        """
+        url = url_data['url']
+        progress = ProgressTracker(self.converter.print_progress())
         
-        for i, url_data in enumerate(self.results, 1):
-            url = url_data['url']
-            print(f"\n[{i}/{len(self.results)}] Processing: {url}")
+        try:
+            with progress.span('rate_limit'):
+                rate_limiter.wait(self.rate_limit_key(url))
+            print(f"\n[{index}/{total or '?'}] Processing: {url}")
             
-            try:
-                # Update status
-                url_data['status'] = 'processing'
-                url_data['start_time'] = datetime.now().isoformat()
-                
-                # Download
-                result = self.converter.download_audio(
-                    url, self.output_dir, format_type, quality
-                )
-                
-                if result:
-                    url_data['status'] = 'completed'
-                    url_data['output_file'] = result
-                    url_data['end_time'] = datetime.now().isoformat()
-                    print(f"✓ Success: {os.path.basename(result)}")
-                else:
-                    url_data['status'] = 'failed'
-                    url_data['error'] = 'Download failed'
-                    url_data['end_time'] = datetime.now().isoformat()
-                    print(f"✗ Failed: {url}")
+            # Update status
+            self.update_status(url_data, status='processing',
+                               start_time=datetime.now().isoformat())
+            
+            # Download
+            result = self.converter.download_audio(
+                url, self.output_dir, format_type, quality, progress=progress,
+                transcoder=transcoder
+            )
+            if transcoder is not None:
+                # The entry is finished once its conversion is, while this worker
+                # moves on to the next download
+                result.add_done_callback(
+                    lambda future: self.record_result(url_data, future.result(), progress))
+            else:
+                self.record_result(url_data, result, progress)
+            return result
                 
-                # Save progress after each download
+        except Exception as e:
+            self.update_status(url_data, status='failed', error=str(e),
+                               end_time=datetime.now().isoformat(), durations=progress.timings())
+            print(f"✗ Error: {e}")
+    
+    def record_result(self, url_data, result, progress):
+        """Mark an entry completed or failed once its output is known
+
+        The entry records the seconds spent in each stage under durations.
+        """
+        if result:
+            stats = progress.snapshot()
+            self.update_status(url_data, status='completed', output_file=result,
+                               end_time=datetime.now().isoformat(),
+                               downloaded_bytes=stats['downloaded_bytes'],
+                               average_speed=stats['average_speed'],
+                               durations=progress.timings())
+            print(f"✓ Success: {os.path.basename(result)}")
+        else:
+            self.update_status(url_data, status='failed', error='Download failed',
+                               end_time=datetime.now().isoformat(), durations=progress.timings())
+            print(f"✗ Failed: {url_data['url']}")
+    
+    def start_entries(self, urls):
+        """Journal entries as they are consumed from urls
+
+        The previous log and journal are only replaced once the new batch
+        yields its first entry.
+        """
+        for url_data in urls:
+            if not self.results:
                 self.save_progress()
-                
-                # Delay between downloads to be respectful
-                if i < len(self.results) and delay > 0:
-                    print(f"Waiting {delay} seconds before next download...")
-                    time.sleep(delay)
-                    
-            except Exception as e:
-                url_data['status'] = 'failed'
-                url_data['error'] = str(e)
-                url_data['end_time'] = datetime.now().isoformat()
-                print(f"✗ Error: {e}")
+            yield self.add_entry(url_data)
+    
+    def run_entries(self, entries, format_type, quality, delay, workers, host_delays, total=None,
+                    max_open=None):
+        """Download result entries as they arrive and write the final snapshot
+
+        entries may be a lazy iterator; at most a couple of entries per worker
+        are pulled ahead of the downloads. max_open overrides the asyncio
+        engine's cap on entries in flight.
+        """
+        # Downloads to the same platform are spaced by `delay` seconds, while
+        # different platforms proceed independently of each other
+        rate_limiter = HostRateLimiter(max(delay, 0), host_delays)
+        
+        try:
+            if self.engine == 'asyncio':
+                # `workers` downloads per platform, bounded overall by max_open
+                runner = AsyncBatchRunner(self, workers, self.platform_workers,
+                                          max_open or self.max_open, self.transcode_workers)
+                asyncio.run(runner.run(entries, format_type, quality, rate_limiter, total))
+            elif workers > 1:
+                slots = threading.BoundedSemaphore(workers * 2)
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for i, url_data in enumerate(entries, 1):
+                        slots.acquire()
+                        future = executor.submit(self.process_url, url_data, i, total,
+                                                 format_type, quality, rate_limiter,
+                                                 self.transcoder)
+                        future.add_done_callback(lambda _: slots.release())
+            else:
+                for i, url_data in enumerate(entries, 1):
+                    self.process_url(url_data, i, total, format_type, quality, rate_limiter,
+                                     self.transcoder)
+            if self.transcoder is not None:
+                self.transcoder.join()
+        finally:
+            if self.results:
                 self.save_progress()
+            self.journal.close()
+    
+    def lease_entries(self, work_queue, worker_id, poll_interval):
+        """Yield entries leased from the work queue until it is drained
+
+        While other workers still hold leases, keep polling: their entries
+        come back if those workers die.
+        """
+        while True:
+            item = work_queue.lease(worker_id)
+            if item is None:
+                if work_queue.is_drained():
+                    return
+                time.sleep(poll_interval)
+                continue
+            url_data = dict(item['entry'], status='pending', attempt=item['attempt'])
+            with self.lock:
+                self.leases[id(url_data)] = (item['item_id'], item['token'])
+            yield url_data
+    
+    def heartbeat_leases(self, stop, interval):
+        """Renew every lease held by this worker until stop is set"""
+        while not stop.wait(interval):
+            with self.lock:
+                leases = list(self.leases.items())
+            for key, (item_id, token) in leases:
+                try:
+                    if not self.work_queue.heartbeat(item_id, token):
+                        print(f"Lease on queue item {item_id} expired")
+                        with self.lock:
+                            self.leases.pop(key, None)
+                except Exception as e:
+                    print(f"Heartbeat error: {e}")
+    
+    def process_queue(self, work_queue, format_type='wav', quality='best', delay=2,
+                      workers=1, host_delays=None, worker_id=None, poll_interval=5):
+        """Drain a shared work queue alongside any other workers using it
+
+        This worker's own entries are journaled to its batch log as usual;
+        the queue holds the one authoritative result per entry. Entries are
+        leased only as fast as this worker can start them, leaving the rest
+        to other workers: a couple per download worker, as with the threaded
+        engine, also under asyncio.
+        """
+        worker_id = worker_id or default_worker_id()
+        self.work_queue = work_queue
+        print(f"Worker {worker_id} draining {getattr(work_queue, 'db_path', 'work queue')}")
+        print(f"Format: {format_type}, Quality: {quality}, Profile: {self.converter.profile}")
+        print("-" * 50)
+        
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat_leases,
+                                     args=(stop, max(1, work_queue.lease_seconds / 3)), daemon=True)
+        heartbeat.start()
+        try:
+            self.reset_results([])
+            entries = self.start_entries(self.lease_entries(work_queue, worker_id, poll_interval))
+            max_open = min(self.max_open,
+                           2 * max([max(1, workers)] + list(self.platform_workers.values())))
+            self.run_entries(entries, format_type, quality, delay, workers, host_delays,
+                             max_open=max_open)
+        finally:
+            stop.set()
+            heartbeat.join()
+        
+        if self.results:
+            self.print_summary()
+        else:
+            print("No work left in the queue")
+        counts = work_queue.counts()
+        print(f"Queue: {counts.get('completed', 0)} completed, {counts.get('failed', 0)} failed, "
+              f"{counts.get('pending', 0) + counts.get('leased', 0)} remaining")
+    
+    def process_batch(self, urls, format_type='wav', quality='best', delay=2,
+                      workers=1, host_delays=None):
+        """Process a batch of URLs
+
+        urls may be a list or any iterable of entries, such as the lazy
+        loaders in url_loaders; entries are journaled as they are consumed.
+        """
+        total = len(urls) if hasattr(urls, '__len__') else None
+        print(f"Starting batch processing of {total if total is not None else 'streamed'} URLs")
+        print(f"Format: {format_type}, Quality: {quality}, Profile: {self.converter.profile}")
+        print(f"Output directory: {self.output_dir}")
+        if self.engine == 'asyncio':
+            print(f"Engine: asyncio, Downloads per platform: {workers}, "
+                  f"Max in flight: {self.max_open}, Delay per host: {delay}s")
+        else:
+            print(f"Workers: {workers}, Transcode workers: "
+                  f"{self.transcoder.max_workers if self.transcoder else 0}, Delay per host: {delay}s")
+        print("-" * 50)
+        
+        self.reset_results([])
+        entries = self.start_entries(urls)
+        
+        self.run_entries(entries, format_type, quality, delay, workers, host_delays, total)
+        
+        if not self.results:
+            print("No URLs to process")
+            return
         
         # Final summary
         self.print_summary()
     
     def print_summary(self):
         """Print processing summary"""
-        completed = len([r for r in self.results if r['status'] == 'completed'])
-        failed = len([r for r in self.results if r['status'] == 'failed'])
+        completed = self.status_counts['completed']
+        failed = self.status_counts['failed']
         total = len(self.results)
         
         print("\n" + "=" * 50)
@@ -132,7 +380,15 @@ class BatchProcessor:
         print(f"Total URLs: {total}")
         print(f"Completed: {completed}")
         print(f"Failed: {failed}")
-        print(f"Success rate: {(completed/total*100):.1f}%")
+        print(f"Success rate: {(completed/total*100 if total else 0):.1f}%")
+        
+        # Where the time went, summed over every entry of this run
+        stage_totals = Counter()
+        for result in self.results:
+            stage_totals.update(result.get('durations') or {})
+        if stage_totals:
+            print("Time per stage: " + ', '.join(
+                f"{stage} {seconds:.1f}s" for stage, seconds in stage_totals.items()))
         
         if failed > 0:
             print("\nFailed URLs:")
@@ -142,65 +398,156 @@ class BatchProcessor:
         
         print(f"\nLog saved to: {self.log_file}")
     
-    def resume_from_log(self, format_type='wav', quality='best', delay=2):
+    def resume_from_log(self, format_type='wav', quality='best', delay=2,
+                        workers=1, host_delays=None):
         """Resume processing from a previous log file"""
-        if not os.path.exists(self.log_file):
+        if not os.path.exists(self.log_file) and not os.path.exists(self.journal.journal_file):
             print(f"No log file found at {self.log_file}")
             return
         
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                log_data = json.load(f)
+            # Replay the journal on top of the last snapshot, then fold it in
+            self.reset_results(self.journal.load())
+            self.save_progress()
             
-            self.results = log_data['results']
-            pending_urls = [r for r in self.results if r['status'] in ['pending', 'failed']]
+            # Entries left in 'processing' were interrupted mid-download
+            pending_urls = [r for r in self.results
+                            if r['status'] in ['pending', 'failed', 'processing']]
             
             if not pending_urls:
                 print("No pending URLs to process")
                 return
             
             print(f"Resuming processing of {len(pending_urls)} pending URLs")
-            self.process_batch(pending_urls, format_type, quality, delay)
+            self.run_entries(pending_urls, format_type, quality, delay, workers, host_delays,
+                             len(pending_urls))
+            self.print_summary()
             
         except Exception as e:
             print(f"Error resuming from log: {e}")
 
+def parse_host_delays(values):
+    """Parse PLATFORM=SECONDS pairs from the command line"""
+    host_delays = {}
+    for value in values or []:
+        key, sep, seconds = value.partition('=')
+        if not sep:
+            raise ValueError(f"Invalid host delay '{value}', expected PLATFORM=SECONDS")
+        host_delays[key.strip().lower()] = float(seconds)
+    return host_delays
+
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Batch process music URLs')
-    parser.add_argument('input_file', help='Text file with URLs or JSON file with metadata')
+    parser.add_argument('input_file', nargs='?',
+                       help='Text, JSON Lines or JSON file with URLs, or - to read from stdin')
     parser.add_argument('-f', '--format', choices=['wav', 'aiff'], default='wav',
                        help='Output format (default: wav)')
     parser.add_argument('-q', '--quality', choices=['best', 'high', 'medium'], default='best',
                        help='Audio quality (default: best)')
+    parser.add_argument('-p', '--profile', choices=list(AUDIO_PROFILES), default=DEFAULT_PROFILE,
+                       help=f'Output sample rate, bit depth and channels (default: {DEFAULT_PROFILE})')
     parser.add_argument('-o', '--output', default='./downloads',
                        help='Output directory (default: ./downloads)')
     parser.add_argument('-d', '--delay', type=int, default=2,
-                       help='Delay between downloads in seconds (default: 2)')
+                       help='Delay between downloads from the same platform in seconds (default: 2)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                       help='Number of concurrent downloads (default: 1)')
+    parser.add_argument('--host-delay', action='append', metavar='PLATFORM=SECONDS',
+                       help='Override the delay for a platform or host, e.g. youtube=5 (repeatable)')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='Convert while downloading, without an intermediate file')
+    parser.add_argument('--expand-workers', type=int, default=DEFAULT_EXPAND_WORKERS,
+                       help=f'Playlists and channels listed in parallel (default: {DEFAULT_EXPAND_WORKERS})')
+    parser.add_argument('--no-expand', action='store_true',
+                       help='Pass playlist and channel URLs to yt-dlp as single entries')
     parser.add_argument('--resume', action='store_true',
                        help='Resume from previous log file')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                       help=f'Download cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-size', type=int, default=None, metavar='MB',
+                       help='Download cache size budget in MB')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always download, bypassing the download cache')
+    parser.add_argument('--metadata-ttl', type=int, default=DEFAULT_METADATA_TTL, metavar='SECONDS',
+                       help=f'How long extracted metadata is reused (default: {DEFAULT_METADATA_TTL})')
+    parser.add_argument('--store-flac', action='store_true',
+                       help='Keep cached audio as FLAC and write WAV/AIFF from it when needed')
+    parser.add_argument('--transcode-workers', type=int, default=DEFAULT_TRANSCODE_WORKERS,
+                       help='Conversions run in parallel, separate from the download workers; '
+                            f'0 converts in the download worker (default: {DEFAULT_TRANSCODE_WORKERS})')
+    parser.add_argument('--transcode-queue', type=int, default=DEFAULT_TRANSCODE_QUEUE,
+                       help='Downloads waiting for conversion before downloaders pause '
+                            f'(default: {DEFAULT_TRANSCODE_QUEUE})')
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads',
+                       help='threads, or asyncio for batches with hundreds of tracks in flight; '
+                            'with asyncio, --workers is the download limit per platform')
+    parser.add_argument('--max-open', type=int, default=DEFAULT_MAX_OPEN,
+                       help=f'Tracks in flight at once with the asyncio engine (default: {DEFAULT_MAX_OPEN})')
+    parser.add_argument('--platform-workers', action='append', metavar='PLATFORM=N',
+                       help='Concurrent downloads for one platform with the asyncio engine')
+    parser.add_argument('--queue', metavar='PATH',
+                       help='Shared work queue database; URLs from input_file are added to it')
+    parser.add_argument('--worker', action='store_true',
+                       help='Drain the --queue together with any other workers using it')
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                       help=f'How long a worker may go without a heartbeat (default: {DEFAULT_LEASE_SECONDS})')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                       help=f'Attempts per queued URL before it is failed (default: {DEFAULT_MAX_ATTEMPTS})')
+    add_profiling_arguments(parser)
     
     args = parser.parse_args()
+    if args.worker and not args.queue:
+        parser.error('--worker requires --queue')
+    if not args.input_file and not args.worker:
+        parser.error('input_file is required unless running as a --worker')
+    
+    try:
+        host_delays = parse_host_delays(args.host_delay)
+        platform_workers = {key: int(value)
+                            for key, value in parse_host_delays(args.platform_workers).items()}
+    except ValueError as e:
+        parser.error(str(e))
     
     # Create output directory
     os.makedirs(args.output, exist_ok=True)
     
-    processor = BatchProcessor(args.output)
+    # Queue workers sharing an output directory each write their own log
+    worker_id = default_worker_id()
+    log_name = worker_log_name(worker_id) if args.worker else "batch_log.json"
+    processor = BatchProcessor(args.output, create_cache(args), create_metadata_cache(args),
+                               args.pipeline, args.profile, args.store_flac,
+                               args.transcode_workers, args.transcode_queue,
+                               args.engine, args.max_open, platform_workers, log_name)
     
-    if args.resume:
-        processor.resume_from_log(args.format, args.quality, args.delay)
-    else:
-        # Determine file type and load URLs
-        if args.input_file.endswith('.json'):
-            urls = processor.load_urls_from_json(args.input_file)
-        else:
-            urls = processor.load_urls_from_file(args.input_file)
-        
-        if urls:
-            processor.process_batch(urls, args.format, args.quality, args.delay)
+    processor.converter.profiler = create_profiler(args, args.output)
+    try:
+        if args.queue:
+            work_queue = SQLiteWorkQueue(args.queue, args.lease_seconds, args.max_attempts)
+            if args.input_file:
+                urls = processor.iter_input(iter_urls(args.input_file), args.input_file)
+                if not args.no_expand:
+                    urls = PlaylistExpander(args.expand_workers).expand(urls)
+                print(f"Queued {work_queue.enqueue(urls)} new URLs in {args.queue}")
+            if args.worker:
+                processor.process_queue(work_queue, args.format, args.quality, args.delay,
+                                        args.workers, host_delays, worker_id)
+        elif args.resume:
+            processor.resume_from_log(args.format, args.quality, args.delay,
+                                      args.workers, host_delays)
         else:
-            print("No URLs to process")
+            # Stream URLs into the batch as they are read
+            urls = processor.iter_input(iter_urls(args.input_file), args.input_file)
+            if not args.no_expand:
+                # Playlist tracks join the batch while the rest is still being listed
+                urls = PlaylistExpander(args.expand_workers).expand(urls)
+            processor.process_batch(urls, args.format, args.quality, args.delay,
+                                    args.workers, host_delays)
+    finally:
+        if processor.converter.profiler:
+            processor.converter.profiler.close()
+        processor.converter.sessions.close()
 
 if __name__ == "__main__":
     main()
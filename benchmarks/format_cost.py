@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Format Cost Benchmark
+Measures the CPU-seconds spent turning one track into WAV/AIFF for each
+common source codec, comparing the old path (always decode and re-encode
+with ffmpeg, as FFmpegExtractAudio did) with the conversion plan and
+streaming converter in format_selection. Also shows which source each
+quality setting selects and what that choice costs per track.
+
+Usage: python benchmarks/format_cost.py [--duration SECONDS] [--format wav|aiff] [--json]
+Requires ffmpeg and ffprobe on the PATH; fixtures are generated locally.
+"""
+
+import os
+import sys
+import json
+import shutil
+import resource
+import subprocess
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from format_selection import audio_format_selector, conversion_plan, is_lossless, QUALITY_TARGETS
+from streaming_convert import stream_convert
+
+# (name, extension, ffmpeg encoder arguments)
+FIXTURES = [
+    ('pcm_wav', 'wav', ['-c:a', 'pcm_s16le']),
+    ('pcm_aiff', 'aiff', ['-c:a', 'pcm_s16be']),
+    ('flac', 'flac', ['-c:a', 'flac']),
+    ('mp3_320', 'mp3', ['-c:a', 'libmp3lame', '-b:a', '320k']),
+    ('aac_128', 'm4a', ['-c:a', 'aac', '-b:a', '128k']),
+    ('opus_160', 'webm', ['-c:a', 'libopus', '-b:a', '160k']),
+]
+
+def cpu_seconds():
+    """CPU time used so far by this process and its finished children"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def measure(fn):
+    start = cpu_seconds()
+    fn()
+    return cpu_seconds() - start
+
+def make_fixture(directory, name, ext, encoder_args, duration):
+    path = os.path.join(directory, f"{name}.{ext}")
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi',
+         '-i', f'sine=frequency=440:sample_rate=44100:duration={duration}',
+         '-ac', '2', *encoder_args, path],
+        check=True
+    )
+    return path
+
+def probe(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=codec_name,bit_rate:format=bit_rate', '-of', 'json', path],
+        capture_output=True, text=True, check=True
+    )
+    data = json.loads(result.stdout)
+    stream = data['streams'][0]
+    bit_rate = stream.get('bit_rate') or data.get('format', {}).get('bit_rate') or 0
+    return stream['codec_name'], int(bit_rate) / 1000
+
+def old_path(source, output, format_type):
+    codec = 'pcm_s16be' if format_type == 'aiff' else 'pcm_s16le'
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-i', source, '-vn', '-acodec', codec, output],
+                   check=True)
+
+def new_path(source, output, format_type, plan):
+    if plan != 'skip':
+        stream_convert(source, output, format_type)
+
+def run(duration, format_type):
+    results = {'duration': duration, 'format': format_type, 'tracks': [], 'selection': []}
+    with tempfile.TemporaryDirectory() as directory:
+        formats = []
+        for name, ext, encoder_args in FIXTURES:
+            source = make_fixture(directory, name, ext, encoder_args, duration)
+            codec, kbps = probe(source)
+            plan = conversion_plan(codec, ext, format_type)
+            output = os.path.join(directory, f"out_{name}.{format_type}")
+
+            old_cpu = measure(lambda: old_path(source, output, format_type))
+            os.remove(output)
+            new_cpu = measure(lambda: new_path(source, output, format_type, plan))
+
+            results['tracks'].append({
+                'source': name, 'codec': codec, 'plan': plan,
+                'old_cpu_seconds': round(old_cpu, 4), 'new_cpu_seconds': round(new_cpu, 4),
+                'saved_cpu_seconds': round(old_cpu - new_cpu, 4),
+            })
+            formats.append({'format_id': name, 'acodec': codec, 'vcodec': 'none',
+                            'abr': kbps, 'protocol': 'https', 'cpu': new_cpu, 'old_cpu': old_cpu})
+
+        # 'bestaudio' took the highest bitrate stream and always re-encoded it
+        bestaudio = max((f for f in formats if not is_lossless(f)), key=lambda f: f['abr'])
+        for quality in QUALITY_TARGETS:
+            chosen = next(audio_format_selector(quality)({'formats': formats}))
+            results['selection'].append({
+                'quality': quality,
+                'bestaudio': bestaudio['format_id'], 'bestaudio_cpu_seconds': round(bestaudio['old_cpu'], 4),
+                'selected': chosen['format_id'], 'selected_cpu_seconds': round(chosen['cpu'], 4),
+                'saved_cpu_seconds': round(bestaudio['old_cpu'] - chosen['cpu'], 4),
+            })
+    return results
+
+def print_report(results):
+    print(f"CPU-seconds per {results['duration']}s track, output {results['format'].upper()}")
+    print(f"{'source':<10} {'codec':<10} {'plan':<10} {'old':>8} {'new':>8} {'saved':>8}")
+    for track in results['tracks']:
+        print(f"{track['source']:<10} {track['codec']:<10} {track['plan']:<10} "
+              f"{track['old_cpu_seconds']:>8.3f} {track['new_cpu_seconds']:>8.3f} "
+              f"{track['saved_cpu_seconds']:>8.3f}")
+    print("\nSource selection (when every fixture is offered as a format)")
+    for row in results['selection']:
+        print(f"  {row['quality']:<7} bestaudio={row['bestaudio']} ({row['bestaudio_cpu_seconds']:.3f}s)"
+              f"  selected={row['selected']} ({row['selected_cpu_seconds']:.3f}s)"
+              f"  saved={row['saved_cpu_seconds']:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure conversion CPU cost per source format')
+    parser.add_argument('--duration', type=int, default=180,
+                       help='Length of the generated tracks in seconds (default: 180)')
+    parser.add_argument('--format', choices=['wav', 'aiff'], default='wav',
+                       help='Output format (default: wav)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("ffmpeg and ffprobe are required for this benchmark")
+        sys.exit(1)
+
+    results = run(args.duration, args.format)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+if __name__ == "__main__":
+    main()
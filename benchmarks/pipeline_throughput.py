@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Pipeline Throughput Benchmark
+Measures the whole download and convert pipeline offline. Synthetic tracks
+of various lengths, codecs and sample rates are served from a local HTTP
+server, where yt-dlp's generic extractor picks them up as direct links, so
+every run goes through extraction, download, conversion and recording
+exactly as a real one does, without touching any platform.
+
+Each mode runs in its own process so CPU time and peak RSS are not shared:
+  single      cli_converter, one track after another
+  batch       batch_processor with download workers and the transcode pool
+  concurrent  web_app, all tracks submitted at once through /convert
+
+Usage: python benchmarks/pipeline_throughput.py [--tracks N] [--modes single,batch,concurrent]
+                                                [--output results.json] [--compare old.json]
+Requires ffmpeg and ffprobe on the PATH; fixtures are generated locally.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+import argparse
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ('single', 'batch', 'concurrent')
+
+# (name, extension, ffmpeg encoder arguments, sample rate, duration in seconds)
+FIXTURES = [
+    ('mp3_44k', 'mp3', ['-c:a', 'libmp3lame', '-b:a', '320k'], 44100, 30),
+    ('aac_48k', 'm4a', ['-c:a', 'aac', '-b:a', '192k'], 48000, 60),
+    ('opus_48k', 'webm', ['-c:a', 'libopus', '-b:a', '160k'], 48000, 120),
+    ('flac_96k', 'flac', ['-c:a', 'flac'], 96000, 30),
+    ('wav_44k', 'wav', ['-c:a', 'pcm_s16le'], 44100, 15),
+    ('mp3_22k', 'mp3', ['-c:a', 'libmp3lame', '-b:a', '64k'], 22050, 240),
+]
+
+def make_fixture(directory, name, ext, encoder_args, sample_rate, duration):
+    path = os.path.join(directory, f"{name}.{ext}")
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi',
+         '-i', f'sine=frequency=440:sample_rate={sample_rate}:duration={duration}',
+         '-ac', '2', *encoder_args, path],
+        check=True
+    )
+    return path
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves /<n>/<fixture>_<n>.<ext> from <fixture>.<ext>
+
+    Every track gets its own URL and name, so the generic extractor gives it
+    its own id and nothing is skipped as already downloaded.
+    """
+    def translate_path(self, path):
+        name = os.path.basename(path.split('?', 1)[0])
+        stem, ext = os.path.splitext(name)
+        return super().translate_path('/' + stem.rsplit('_', 1)[0] + ext)
+
+    def log_message(self, format, *args):
+        pass
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # yt-dlp closes the connection after sniffing the start of a file
+        pass
+
+def start_server(directory):
+    server = FixtureServer(('127.0.0.1', 0), partial(FixtureHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def track_urls(base_url, fixtures, count):
+    urls = []
+    for n in range(count):
+        name, ext = fixtures[n % len(fixtures)][:2]
+        urls.append(f"{base_url}/{n}/{name}_{n}.{ext}")
+    return urls
+
+def usage():
+    """CPU-seconds and peak RSS (MB) of this process and its children"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'cpu_seconds': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        'peak_rss_mb': own.ru_maxrss / scale,
+        'peak_child_rss_mb': children.ru_maxrss / scale,
+    }
+
+def count_outputs(directory, format_type):
+    return sum(1 for name in os.listdir(directory) if name.endswith(f'.{format_type}'))
+
+def run_single(urls, work_dir, format_type, quality, workers):
+    from cli_converter import CLIMusicConverter
+    converter = CLIMusicConverter(None, None)
+    output_dir = os.path.join(work_dir, 'single')
+    os.makedirs(output_dir, exist_ok=True)
+    for url in urls:
+        converter.download_audio(url, output_dir, format_type, quality)
+    return count_outputs(output_dir, format_type)
+
+def run_batch(urls, work_dir, format_type, quality, workers):
+    from batch_processor import BatchProcessor
+    output_dir = os.path.join(work_dir, 'batch')
+    os.makedirs(output_dir, exist_ok=True)
+    processor = BatchProcessor(output_dir)
+    processor.process_batch([{'url': url} for url in urls], format_type, quality,
+                            delay=0, workers=workers)
+    return sum(1 for result in processor.results if result.get('status') == 'completed')
+
+def run_concurrent(urls, work_dir, format_type, quality, workers):
+    # web_app keeps its downloads relative to the working directory and sets
+    # up its pools and caches on import
+    os.chdir(work_dir)
+    os.environ.update(JOB_STORE='memory', MUSIC_CACHE_DISABLED='1',
+                      MAX_CONCURRENT_JOBS=str(workers), MAX_QUEUED_JOBS=str(len(urls)))
+    import web_app
+    client = web_app.app.test_client()
+    job_ids = []
+    for url in urls:
+        response = client.post('/convert', json={'url': url, 'format': format_type,
+                                                 'quality': quality})
+        job_ids.append(response.get_json().get('job_id'))
+    pending = set(job_id for job_id in job_ids if job_id)
+    completed = 0
+    while pending:
+        time.sleep(0.2)
+        for job_id in list(pending):
+            job = web_app.job_store.get(job_id)
+            if job and job.get('status') in ('completed', 'failed'):
+                pending.discard(job_id)
+                completed += job['status'] == 'completed'
+    return completed
+
+RUNNERS = {'single': run_single, 'batch': run_batch, 'concurrent': run_concurrent}
+
+def run_mode(mode, urls, format_type, quality, workers):
+    """Run one mode in this process and return its measurements"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        before = usage()
+        start = time.perf_counter()
+        completed = RUNNERS[mode](urls, work_dir, format_type, quality, workers)
+        elapsed = time.perf_counter() - start
+        after = usage()
+    return {
+        'mode': mode,
+        'tracks': len(urls),
+        'completed': completed,
+        'wall_seconds': round(elapsed, 3),
+        'tracks_per_min': round(completed * 60 / elapsed, 2) if elapsed else 0,
+        'cpu_seconds': round(after['cpu_seconds'] - before['cpu_seconds'], 3),
+        'cpu_seconds_per_track': round((after['cpu_seconds'] - before['cpu_seconds'])
+                                       / max(completed, 1), 3),
+        'peak_rss_mb': round(after['peak_rss_mb'], 1),
+        'peak_child_rss_mb': round(after['peak_child_rss_mb'], 1),
+    }
+
+def run_mode_isolated(mode, urls, format_type, quality, workers):
+    """Run one mode in a fresh interpreter, with its output discarded"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as result_file:
+        result_path = result_file.name
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--run-mode', mode,
+                   '--result-file', result_path, '--format', format_type, '--quality', quality,
+                   '--workers', str(workers), *urls]
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 text=True)
+        if process.returncode != 0:
+            return {'mode': mode, 'error': process.stderr.strip().splitlines()[-1:]}
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def environment():
+    import yt_dlp
+    ffmpeg = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'ffmpeg': (ffmpeg.splitlines() or [''])[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def run(modes, track_count, format_type, quality, workers, scale):
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'parameters': {'tracks': track_count, 'format': format_type, 'quality': quality,
+                       'workers': workers, 'duration_scale': scale},
+        'fixtures': [],
+        'modes': [],
+    }
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        for name, ext, encoder_args, sample_rate, duration in FIXTURES:
+            duration = max(1, round(duration * scale))
+            make_fixture(fixture_dir, name, ext, encoder_args, sample_rate, duration)
+            results['fixtures'].append({'name': name, 'ext': ext, 'sample_rate': sample_rate,
+                                        'duration': duration})
+        server = start_server(fixture_dir)
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            urls = track_urls(base_url, FIXTURES, track_count)
+            for mode in modes:
+                print(f"Running {mode} ({track_count} tracks)...", file=sys.stderr)
+                results['modes'].append(run_mode_isolated(mode, urls, format_type, quality, workers))
+        finally:
+            server.shutdown()
+    return results
+
+def compare(results, baseline):
+    """Percent change of each mode against a previous run"""
+    previous = {mode['mode']: mode for mode in baseline.get('modes', [])}
+    changes = []
+    for mode in results['modes']:
+        old = previous.get(mode['mode'])
+        if not old or 'error' in mode or 'error' in old:
+            continue
+        change = {'mode': mode['mode']}
+        for key in ('tracks_per_min', 'cpu_seconds_per_track', 'peak_rss_mb'):
+            if old.get(key):
+                change[key] = round((mode[key] - old[key]) * 100 / old[key], 1)
+        changes.append(change)
+    return {'baseline_revision': baseline.get('environment', {}).get('revision'),
+            'changes_percent': changes}
+
+def print_report(results):
+    env = results['environment']
+    print(f"Revision {env['revision']}, yt-dlp {env['yt_dlp']}, Python {env['python']}, "
+          f"{env['cpu_count']} CPUs")
+    params = results['parameters']
+    print(f"{params['tracks']} tracks to {params['format'].upper()}, {params['workers']} workers")
+    print(f"{'mode':<11} {'done':>6} {'wall s':>8} {'tracks/min':>11} {'CPU s':>8} "
+          f"{'CPU s/trk':>10} {'RSS MB':>8} {'child MB':>9}")
+    for mode in results['modes']:
+        if 'error' in mode:
+            print(f"{mode['mode']:<11} failed: {'; '.join(mode['error'])}")
+            continue
+        print(f"{mode['mode']:<11} {mode['completed']:>6} {mode['wall_seconds']:>8.2f} "
+              f"{mode['tracks_per_min']:>11.2f} {mode['cpu_seconds']:>8.2f} "
+              f"{mode['cpu_seconds_per_track']:>10.3f} {mode['peak_rss_mb']:>8.1f} "
+              f"{mode['peak_child_rss_mb']:>9.1f}")
+    if 'comparison' in results:
+        comparison = results['comparison']
+        print(f"\nChange against {comparison['baseline_revision']} (%)")
+        for change in comparison['changes_percent']:
+            print(f"  {change['mode']:<11} " + '  '.join(
+                f"{key}={value:+.1f}" for key, value in change.items() if key != 'mode'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure download and convert throughput offline')
+    parser.add_argument('--tracks', type=int, default=12,
+                       help='Tracks to run through each mode (default: 12)')
+    parser.add_argument('--modes', default=','.join(MODES),
+                       help=f'Comma-separated modes to run (default: {",".join(MODES)})')
+    parser.add_argument('--format', choices=['wav', 'aiff', 'flac'], default='wav',
+                       help='Output format (default: wav)')
+    parser.add_argument('--quality', choices=['best', 'high', 'medium'], default='best',
+                       help='Quality setting (default: best)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Download workers for the batch and concurrent modes (default: 4)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                       help='Multiply every fixture length by this factor (default: 1.0)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Previous results file to report changes against')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--run-mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    parser.add_argument('urls', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        result = run_mode(args.run_mode, args.urls, args.format, args.quality, args.workers)
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("ffmpeg and ffprobe are required for this benchmark")
+        sys.exit(1)
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    results = run(modes, args.tracks, args.format, args.quality, args.workers, args.scale)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            results['comparison'] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+if __name__ == "__main__":
+    main()
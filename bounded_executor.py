@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Bounded Executor
+Fixed-size pool of worker threads fed by a bounded queue. When the queue is
+full, submissions are rejected with an estimate of when to retry instead of
+piling up more work than the machine can handle.
+"""
+
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+# Assumed job duration until the first jobs have finished
+DEFAULT_JOB_SECONDS = 30
+
+class QueueFull(Exception):
+    def __init__(self, position, retry_after):
+        super().__init__(f"Queue is full (position {position}, retry after {retry_after}s)")
+        self.position = position
+        self.retry_after = retry_after
+
+class WorkerThreads(ABC):
+    """Fixed set of daemon threads running _worker, shared by the executor and TranscodePool"""
+    def __init__(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self._threads = []
+        self._threads_lock = threading.Lock()
+
+    def _start_workers(self):
+        # Threads are started on first use so they are created after
+        # gunicorn forks its worker processes
+        with self._threads_lock:
+            while len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    @abstractmethod
+    def _worker(self):
+        """Take work and run it, forever"""
+
+class BoundedExecutor(WorkerThreads):
+    def __init__(self, max_workers, max_queue):
+        super().__init__(max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._active = 0
+        self._durations = deque(maxlen=50)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                fn, args, kwargs, tag = self._pending.popleft()
+                self._active += 1
+
+            start = time.monotonic()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Worker error: {e}")
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._durations.append(time.monotonic() - start)
+
+    def average_job_seconds(self):
+        """Mean duration of recently finished jobs"""
+        with self._cond:
+            if not self._durations:
+                return DEFAULT_JOB_SECONDS
+            return sum(self._durations) / len(self._durations)
+
+    def estimate_wait(self, position):
+        """Seconds until the job at a given queue position starts"""
+        return math.ceil(self.average_job_seconds() * position / self.max_workers)
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        return max(1, math.ceil(self.average_job_seconds() / self.max_workers))
+
+    def submit(self, fn, *args, tag=None, **kwargs):
+        """Queue fn for execution and return its queue position
+
+        Raises QueueFull when max_queue jobs are already waiting.
+        """
+        with self._cond:
+            position = self._active + len(self._pending) + 1 - self.max_workers
+            if position > self.max_queue:
+                raise QueueFull(position, self.retry_after())
+            self._start_workers()
+            self._pending.append((fn, args, kwargs, tag))
+            self._cond.notify()
+            return max(0, position)
+
+    def queued_tags(self):
+        """Tags of waiting jobs, in queue order"""
+        with self._cond:
+            return [item[3] for item in self._pending]
+
+    def queue_depth(self):
+        """Number of jobs waiting for a free worker"""
+        with self._cond:
+            return max(0, self._active + len(self._pending) - self.max_workers)
+
+    def active_count(self):
+        """Number of jobs currently running"""
+        with self._cond:
+            return self._active
@@ -8,14 +8,42 @@ import argparse
 import os
 import sys
 import re
+import shutil
+import threading
+from concurrent.futures import Future
 from pathlib import Path
-import yt_dlp
-from pydub import AudioSegment
-from pydub.utils import which
+from download_cache import DownloadCache, DEFAULT_CACHE_DIR, media_id_for_info
+from metadata_cache import MetadataCache, DEFAULT_METADATA_TTL
+from output_manifest import OutputManifest, final_output_path, source_id
+from url_loaders import iter_urls
+from playlist_expander import PlaylistExpander, DEFAULT_EXPAND_WORKERS, is_collection_url
+from progress import ProgressTracker, format_bytes
+from streaming_convert import stream_convert, materialize
+from format_selection import convert_download
+from download_flow import DownloadFlow
+from transcode_pool import completed_future
+from audio_profiles import AUDIO_PROFILES, DEFAULT_PROFILE, get_profile
+from profiling import add_profiling_arguments, create_profiler
+from ydl_sessions import SessionPool
 
 class CLIMusicConverter:
-    def __init__(self):
+    def __init__(self, cache=None, metadata_cache=None, pipeline=False, profile=DEFAULT_PROFILE,
+                 store_flac=False, session_pool=None):
         self.supported_platforms = ['youtube', 'soundcloud', 'spotify', 'apple_music']
+        self.cache = cache
+        self.metadata_cache = metadata_cache
+        # Stream downloads straight into ffmpeg instead of converting afterwards
+        self.pipeline = pipeline
+        # Sample rate, bit depth and channels of the files written
+        self.profile = profile
+        # Keep cache entries as FLAC and write WAV/AIFF from them on demand
+        self.store_flac = store_flac
+        # RunProfiler that profiles each download, when profiling is enabled
+        self.profiler = None
+        # YoutubeDL instances reused from one download to the next
+        self.sessions = session_pool or SessionPool()
+        self.manifests = {}
+        self.manifest_lock = threading.Lock()
         
     def detect_platform(self, url):
         """Detect the platform from the URL"""
@@ -37,98 +65,309 @@ class CLIMusicConverter:
             filename = filename.replace(char, '_')
         return filename[:100]  # Limit length
         
-    def download_audio(self, url, output_dir, format_type, quality, custom_name=None):
-        """Download audio using yt-dlp"""
+    def get_manifest(self, output_dir):
+        """Output manifest for a directory, opened once per converter"""
+        key = os.path.abspath(output_dir)
+        with self.manifest_lock:
+            if key not in self.manifests:
+                self.manifests[key] = OutputManifest(output_dir)
+            return self.manifests[key]
+        
+    def find_existing(self, manifest, source, format_type, quality, name=None):
+        """Path of an output already in the manifest, honouring a custom name"""
+        entry = manifest.lookup(source, format_type, quality)
+        if not entry:
+            return None
+        if name and os.path.splitext(os.path.basename(entry['path']))[0] != name:
+            return None
+        return entry['path']
+        
+    def print_progress(self):
+        """Progress callback that reports each stage change"""
+        last_stage = [None]
+        def report(snapshot):
+            if snapshot['stage'] != last_stage[0]:
+                last_stage[0] = snapshot['stage']
+                print(f"Stage: {snapshot['stage']}")
+        return report
+        
+    def convert_local(self, input_path, output_dir, format_type, custom_name=None, progress=None,
+                      profile=None):
+        """Convert a local audio file, streaming it through ffmpeg"""
+        if progress is None:
+            progress = ProgressTracker(self.print_progress())
+        try:
+            settings = get_profile(profile or self.profile)
+            name = self.sanitize_filename(custom_name) if custom_name else Path(input_path).stem
+            output_path = os.path.join(output_dir, f"{name}.{format_type.lower()}")
+            if os.path.abspath(output_path) == os.path.abspath(input_path):
+                print(f"Input is already {format_type.upper()}: {input_path}")
+                return input_path
+            
+            print(f"Converting local file: {input_path}")
+            stream_convert(input_path, output_path, format_type,
+                           sample_rate=settings['sample_rate'], channels=settings['channels'],
+                           bit_depth=settings['bit_depth'], progress=progress.transcode_progress)
+            progress.finish()
+            print(f"Successfully converted: {output_path}")
+            return output_path
+        except Exception as e:
+            print(f"Conversion error: {str(e)}")
+            return None
+        
+    def download_audio(self, url, output_dir, format_type, quality, custom_name=None, progress=None,
+                       profile=None, transcoder=None):
+        """Download audio using yt-dlp
+
+        With a transcoder, this thread only downloads: the conversion is
+        queued on the transcoder and a Future of the output path is returned,
+        already resolved when there was nothing to convert.
+        """
+        job_profile = self.profiler.start_job(url) if self.profiler else None
+        if job_profile:
+            transcoder = job_profile.wrap_transcoder(transcoder)
+            result = job_profile.call(self._download_audio, url, output_dir, format_type, quality,
+                                      custom_name, progress, profile, transcoder)
+        else:
+            result = self._download_audio(url, output_dir, format_type, quality, custom_name,
+                                          progress, profile, transcoder)
+        if transcoder is not None and not isinstance(result, Future):
+            result = completed_future(result)
+        if job_profile:
+            if isinstance(result, Future):
+                result.add_done_callback(lambda _: job_profile.finish())
+            else:
+                job_profile.finish()
+        return result
+        
+    def _download_audio(self, url, output_dir, format_type, quality, custom_name, progress,
+                        profile, transcoder):
+        if progress is None:
+            progress = ProgressTracker(self.print_progress())
+        profile = profile or self.profile
+        if os.path.isfile(url):
+            return self.convert_local(url, output_dir, format_type, custom_name, progress, profile)
         try:
             print(f"Detecting platform...")
             platform = self.detect_platform(url)
             print(f"Platform: {platform}")
             
-            # Configure yt-dlp options
-            quality_map = {
-                'best': '320',
-                'high': '192', 
-                'medium': '128'
-            }
+            name = self.sanitize_filename(custom_name) if custom_name else None
+            return CLIDownload(self, url, output_dir, format_type, quality, name, progress, profile,
+                               transcoder).run()
+        except Exception as e:
+            print(f"Download error: {str(e)}")
+            return None
             
-            bitrate = quality_map.get(quality.lower(), '192')
+    def finish_download(self, job, ydl=None):
+        """Convert a download if ydl is given, then record the output in the manifest and cache
+
+        job holds the download's info dict, manifest, requested and stored
+        formats, variant, profile and progress tracker.
+        """
+        info, storage_format, progress = job['info'], job['storage_format'], job['progress']
+        try:
+            progress.end_span('transcode_wait')
+            if ydl is not None:
+                convert_download(ydl, info, storage_format, job['profile'], progress)
+            progress.finish()
             
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
-                'extractaudio': True,
-                'audioformat': format_type.lower(),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': format_type.lower(),
-                    'preferredquality': bitrate,
-                }],
-                'quiet': False,
-                'no_warnings': False,
-            }
+            # The output step reports where the converted file ended up
+            final_path = final_output_path(info)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Get video info first
-                print("Extracting video information...")
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'Unknown')
-                duration = info.get('duration', 0)
-                
-                print(f"Title: {title}")
-                print(f"Duration: {duration // 60}:{duration % 60:02d}")
-                
-                # Use custom name if provided
-                if custom_name:
-                    safe_name = self.sanitize_filename(custom_name)
-                    ydl_opts['outtmpl'] = os.path.join(output_dir, f"{safe_name}.%(ext)s")
-                    ydl = yt_dlp.YoutubeDL(ydl_opts)
-                
-                # Download
-                print("Starting download...")
-                ydl.download([url])
-                
-                # Find the downloaded file
-                downloaded_files = [f for f in os.listdir(output_dir) 
-                                  if f.endswith(f'.{format_type.lower()}')]
-                
-                if downloaded_files:
-                    final_path = os.path.join(output_dir, downloaded_files[0])
-                    print(f"Successfully downloaded: {final_path}")
-                    return final_path
-                else:
-                    print("Download completed but file not found")
-                    return None
-                    
+            if final_path and os.path.exists(final_path):
+                return self.store_output(job, final_path)
+            else:
+                print("Download completed but file not found")
+                return None
         except Exception as e:
-            print(f"Download error: {str(e)}")
+            print(f"Conversion error: {str(e)}")
             return None
             
+    def store_output(self, job, final_path):
+        """Copy a converted download into the cache, write the requested format and record it"""
+        info, format_type, storage_format = job['info'], job['format_type'], job['storage_format']
+        variant = job['variant']
+        with job['progress'].span('store'):
+            cache_key = self.cache.key_for_info(info, storage_format, variant) if self.cache else None
+            if cache_key:
+                self.cache.put(
+                    cache_key, final_path, info.get('extractor_key'), info.get('id'),
+                    storage_format.lower(), variant.lower(),
+                    os.path.splitext(os.path.basename(final_path))[0]
+                )
+            if storage_format != format_type:
+                stored_path = final_path
+                final_path = materialize(
+                    stored_path, f"{os.path.splitext(stored_path)[0]}.{format_type.lower()}",
+                    format_type
+                )
+                os.remove(stored_path)
+            source = source_id(*media_id_for_info(info))
+            job['manifest'].record(source, final_path, format_type, variant,
+                                   info.get('title', 'Unknown'))
+        print(f"Successfully downloaded: {final_path}")
+        return final_path
+            
     def convert_batch(self, urls, output_dir, format_type, quality):
-        """Convert multiple URLs"""
+        """Convert multiple URLs, consuming urls lazily"""
         results = []
+        total = len(urls) if hasattr(urls, '__len__') else '?'
         for i, url in enumerate(urls, 1):
-            print(f"\n--- Processing {i}/{len(urls)} ---")
+            print(f"\n--- Processing {i}/{total} ---")
             result = self.download_audio(url, output_dir, format_type, quality)
             results.append(result)
         return results
 
-def main():
+class CLIDownload(DownloadFlow):
+    """Download flow of CLIMusicConverter, reporting to the console"""
+    def __init__(self, converter, url, output_dir, format_type, quality, name, progress, profile,
+                 transcoder=None):
+        # With FLAC storage one cache entry serves both WAV and AIFF output
+        storage_format = 'flac' if converter.store_flac and converter.cache else format_type
+        outtmpl = os.path.join(output_dir, f"{name}.%(ext)s" if name else '%(title)s.%(ext)s')
+        super().__init__(url, format_type, quality, profile, progress, outtmpl, converter.sessions,
+                         converter.cache, converter.metadata_cache, storage_format,
+                         converter.pipeline, transcoder)
+        self.converter = converter
+        self.output_dir = output_dir
+        self.name = name
+        self.manifest = converter.get_manifest(output_dir)
+
+    def find_existing(self):
+        existing = self.converter.find_existing(self.manifest, self.source, self.format_type,
+                                                self.variant, self.name)
+        if existing:
+            self.progress.finish()
+            print(f"Already downloaded: {existing}")
+        return existing
+
+    def find_cached(self):
+        cached = self.cache.fetch(self.cache_key, self.output_dir, self.name,
+                                  format_type=self.format_type)
+        if cached:
+            self.progress.finish()
+            self.manifest.record(self.source, cached, self.format_type, self.variant)
+            print(f"Found in cache: {cached}")
+        return cached
+
+    def downloading(self):
+        print("Extracting and downloading...")
+
+    def downloaded(self, info):
+        title = info.get('title', 'Unknown')
+        duration = int(info.get('duration') or 0)
+        print(f"Title: {title}")
+        print(f"Duration: {duration // 60}:{duration % 60:02d}")
+        stats = self.progress.snapshot()
+        if stats['average_speed']:
+            print(f"Downloaded {format_bytes(stats['downloaded_bytes'])} "
+                  f"at {format_bytes(stats['average_speed'])}/s")
+
+    def job(self, info):
+        return dict(super().job(info), manifest=self.manifest)
+
+    def finish(self, job, ydl=None):
+        return self.converter.finish_download(job, ydl)
+
+def create_cache(args):
+    """Build the download cache selected on the command line"""
+    if args.no_cache:
+        return None
+    if args.cache_size is not None:
+        return DownloadCache(args.cache_dir, args.cache_size)
+    return DownloadCache(args.cache_dir)
+
+def create_metadata_cache(args):
+    """Build the metadata cache selected on the command line"""
+    if args.no_cache:
+        return None
+    return MetadataCache(args.cache_dir, args.metadata_ttl)
+
+def process_urls(converter, expander, args):
+    """Convert the URLs, playlists or batch file given on the command line"""
+    # Handle batch processing
+    if args.batch and len(args.urls) == 1:
+        batch_file = args.urls[0]
+        if batch_file == '-' or os.path.exists(batch_file):
+            # Read the list lazily so the first download starts right away
+            entries = iter_urls(batch_file)
+            if expander:
+                entries = expander.expand(entries)
+            urls = (entry['url'] for entry in entries)
+            print(f"Processing URLs from {'stdin' if batch_file == '-' else batch_file}")
+            results = converter.convert_batch(urls, args.output, args.format, args.quality)
+        else:
+            print(f"Batch file not found: {batch_file}")
+            return
+    else:
+        # Single URL processing
+        for url in args.urls:
+            if expander and is_collection_url(url):
+                # Tracks download one by one while the playlist is still being listed
+                print(f"Processing playlist: {url}")
+                tracks = (entry['url'] for entry in expander.expand([{'url': url}]))
+                results = converter.convert_batch(tracks, args.output, args.format, args.quality)
+                print(f"✓ {sum(1 for r in results if r)}/{len(results)} tracks converted")
+                continue
+            print(f"Processing: {url}")
+            progress = ProgressTracker(converter.print_progress())
+            result = converter.download_audio(url, args.output, args.format, args.quality, args.name,
+                                              progress)
+            print("Timings: " + ', '.join(f"{stage} {seconds:.2f}s"
+                                          for stage, seconds in progress.timings().items()))
+            if result:
+                print(f"✓ Success: {result}")
+            else:
+                print(f"✗ Failed: {url}")
+
+def build_parser():
+    """Command line options of the converter, also parsed by converter_daemon"""
     parser = argparse.ArgumentParser(description='Download and convert music from various platforms')
-    parser.add_argument('urls', nargs='+', help='URL(s) to download')
+    parser.add_argument('urls', nargs='+', help='URL(s) to download, or local audio files to convert')
     parser.add_argument('-f', '--format', choices=['wav', 'aiff'], default='wav',
                        help='Output format (default: wav)')
     parser.add_argument('-q', '--quality', choices=['best', 'high', 'medium'], default='best',
                        help='Audio quality (default: best)')
+    parser.add_argument('-p', '--profile', choices=list(AUDIO_PROFILES), default=DEFAULT_PROFILE,
+                       help=f'Output sample rate, bit depth and channels (default: {DEFAULT_PROFILE})')
     parser.add_argument('-o', '--output', default='./downloads',
                        help='Output directory (default: ./downloads)')
     parser.add_argument('-n', '--name', help='Custom filename (without extension)')
     parser.add_argument('--batch', action='store_true',
-                       help='Process multiple URLs from a text file')
-    
-    args = parser.parse_args()
-    
+                       help='Process multiple URLs from a text, JSON Lines or JSON file (- for stdin)')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='Convert while downloading, without an intermediate file')
+    parser.add_argument('--expand-workers', type=int, default=DEFAULT_EXPAND_WORKERS,
+                       help=f'Playlists and channels listed in parallel (default: {DEFAULT_EXPAND_WORKERS})')
+    parser.add_argument('--no-expand', action='store_true',
+                       help='Pass playlist and channel URLs to yt-dlp as single entries')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                       help=f'Download cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-size', type=int, default=None, metavar='MB',
+                       help='Download cache size budget in MB')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always download, bypassing the download cache')
+    parser.add_argument('--metadata-ttl', type=int, default=DEFAULT_METADATA_TTL, metavar='SECONDS',
+                       help=f'How long extracted metadata is reused (default: {DEFAULT_METADATA_TTL})')
+    parser.add_argument('--store-flac', action='store_true',
+                       help='Keep cached audio as FLAC and write WAV/AIFF from it when needed')
+    add_profiling_arguments(parser)
+    return parser
+
+def create_converter(args):
+    """Build the converter selected on the command line"""
+    return CLIMusicConverter(create_cache(args), create_metadata_cache(args), args.pipeline,
+                             args.profile, args.store_flac)
+
+def run(args, converter=None):
+    """Run the converter with parsed options
+
+    converter_daemon passes in a converter it keeps between runs, so its
+    caches and manifests stay open.
+    """
     # Check if FFmpeg is available
-    if not which("ffmpeg"):
+    if not shutil.which("ffmpeg"):
         print("Warning: FFmpeg not found. Please install FFmpeg for audio conversion.")
         print("Download from: https://ffmpeg.org/download.html")
         return
@@ -136,28 +375,22 @@ def main():
     # Create output directory
     os.makedirs(args.output, exist_ok=True)
     
-    converter = CLIMusicConverter()
+    # A converter passed in is kept warm by its owner, along with its sessions
+    owned = converter is None
+    converter = converter or create_converter(args)
+    expander = None if args.no_expand else PlaylistExpander(args.expand_workers)
     
-    # Handle batch processing
-    if args.batch and len(args.urls) == 1:
-        batch_file = args.urls[0]
-        if os.path.exists(batch_file):
-            with open(batch_file, 'r') as f:
-                urls = [line.strip() for line in f if line.strip()]
-            print(f"Processing {len(urls)} URLs from {batch_file}")
-            results = converter.convert_batch(urls, args.output, args.format, args.quality)
-        else:
-            print(f"Batch file not found: {batch_file}")
-            return
-    else:
-        # Single URL processing
-        for url in args.urls:
-            print(f"Processing: {url}")
-            result = converter.download_audio(url, args.output, args.format, args.quality, args.name)
-            if result:
-                print(f"✓ Success: {result}")
-            else:
-                print(f"✗ Failed: {url}")
+    converter.profiler = create_profiler(args, args.output)
+    try:
+        process_urls(converter, expander, args)
+    finally:
+        if converter.profiler:
+            converter.profiler.close()
+        if owned:
+            converter.sessions.close()
+
+def main():
+    run(build_parser().parse_args())
 
 if __name__ == "__main__":
     main()
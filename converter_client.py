@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Converter Client
+Thin stand-in for cli_converter.py that hands its arguments to a running
+converter_daemon.py over a Unix socket and prints what the daemon sends
+back. It imports nothing beyond the standard library, so each call costs
+an interpreter start instead of loading yt-dlp and its extractors.
+Without a daemon it falls back to running cli_converter in this process.
+
+Usage: python converter_client.py <URL> [cli_converter options]
+"""
+
+import os
+import sys
+import json
+import socket
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+def default_socket_path():
+    """Socket shared by the daemon and its clients (set CONVERTER_SOCKET to override)"""
+    if os.environ.get('CONVERTER_SOCKET'):
+        return os.environ['CONVERTER_SOCKET']
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(runtime_dir, f'music-converter-{uid}.sock')
+
+def connect(socket_path):
+    """Connected socket to the daemon, or None if it is not running"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+def send_stdin(sock):
+    """Stream our stdin to the daemon after the request, then end our side of the connection"""
+    try:
+        while True:
+            chunk = sys.stdin.buffer.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            sock.sendall(chunk)
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        # The daemon finished without reading all of it
+        pass
+
+def run_remote(sock, argv):
+    """Send argv to the daemon, relay its output and return the exit status"""
+    request = {'argv': argv, 'cwd': os.getcwd()}
+    # A batch read from stdin is streamed along, since the daemon cannot read ours
+    stream_stdin = '-' in argv
+    if stream_stdin:
+        request['stdin'] = True
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        if stream_stdin:
+            # Sent from a thread, so the daemon's output is relayed while stdin is still open
+            threading.Thread(target=send_stdin, args=(sock,), daemon=True).start()
+        for line in stream:
+            message = json.loads(line)
+            if 'exit' in message:
+                return message['exit']
+            target = sys.stderr if message.get('stream') == 'stderr' else sys.stdout
+            target.write(message.get('data', ''))
+            target.flush()
+    print("Connection to the converter daemon was lost", file=sys.stderr)
+    return 1
+
+def main():
+    sock = connect(default_socket_path())
+    if sock is None:
+        # Only now pay for importing yt-dlp and the converter
+        import cli_converter
+        cli_converter.main()
+        return
+    sys.exit(run_remote(sock, sys.argv[1:]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Converter Daemon
+Long-lived cli_converter that serves converter_client.py over a Unix
+socket. yt-dlp, the converters and every extractor's URL pattern are
+loaded once at startup, and converters with their caches and manifests are
+kept between requests, so a short job no longer pays for interpreter and
+extractor startup. Each request runs in its own thread with the client's
+arguments and working directory. Its output, including that of the
+expander and transcode threads working for it, is streamed back to the
+client, and a batch read from '-' is streamed in from the client's stdin.
+
+Usage: python converter_daemon.py [--socket PATH]
+"""
+
+import io
+import os
+import sys
+import json
+import signal
+import socket
+import threading
+import argparse
+import importlib
+import contextvars
+import socketserver
+from converter_client import default_socket_path
+import cli_converter
+from download_cache import canonical_media_id
+
+# Client of the request being served; worker threads started by the
+# converter's pools run in a copy of the submitting request's context
+current_client = contextvars.ContextVar('current_client', default=None)
+
+class RequestOutput:
+    """sys.stdout/sys.stderr stand-in that sends each request's output to its client
+
+    Output outside of any request goes to the daemon's own stream.
+    """
+    def __init__(self, fallback, name):
+        self.fallback = fallback
+        self.name = name
+
+    @property
+    def target(self):
+        return current_client.get()
+
+    def write(self, text):
+        client = self.target
+        if client is None:
+            return self.fallback.write(text)
+        client.send(stream=self.name, data=text)
+        return len(text)
+
+    def flush(self):
+        if self.target is None:
+            self.fallback.flush()
+
+    def isatty(self):
+        return False
+
+    @property
+    def encoding(self):
+        return 'utf-8'
+
+    @property
+    def buffer(self):
+        # yt-dlp writes encoded text to the stream's buffer when it has one
+        return RequestOutputBuffer(self)
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+class RequestOutputBuffer:
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, data):
+        self.output.write(data.decode('utf-8', 'replace'))
+        return len(data)
+
+    def flush(self):
+        self.output.flush()
+
+class RequestInput:
+    """sys.stdin stand-in that reads the stdin the request's client streams after its request"""
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    @property
+    def source(self):
+        client = current_client.get()
+        if client is None or client.stdin is None:
+            return self.fallback
+        return client.stdin
+
+    def read(self, size=-1):
+        return self.source.read(size)
+
+    def readline(self, size=-1):
+        return self.source.readline(size)
+
+    def __iter__(self):
+        return iter(self.source)
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+class ClientConnection:
+    """Sends JSON messages to one client, one per line"""
+    def __init__(self, wfile, stdin=None):
+        self.wfile = wfile
+        # Text stream of the client's stdin, when the request asked to send it
+        self.stdin = stdin
+        self.lock = threading.Lock()
+        self.connected = True
+
+    def send(self, **message):
+        if not self.connected:
+            return
+        with self.lock:
+            try:
+                self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+                self.wfile.flush()
+            except OSError:
+                # The client went away; let the job finish quietly
+                self.connected = False
+
+def absolute_paths(args, cwd):
+    """Resolve the client's relative paths against its working directory"""
+    args.output = os.path.join(cwd, args.output)
+    args.cache_dir = os.path.join(cwd, args.cache_dir)
+    if args.profile_dir:
+        args.profile_dir = os.path.join(cwd, args.profile_dir)
+    args.urls = [os.path.join(cwd, url) if url != '-' and os.path.exists(os.path.join(cwd, url)) else url
+                 for url in args.urls]
+
+class ConverterDaemon:
+    def __init__(self):
+        self.parser = cli_converter.build_parser()
+        self.parser.prog = 'converter_client.py'
+        # Converters by the options that shape them, reused between requests
+        self.converters = {}
+        self.converters_lock = threading.Lock()
+
+    def warm_up(self):
+        """Load yt-dlp and every extractor, compiling their URL patterns, ahead of the first request"""
+        # The converter modules import these on first use
+        for module in ('yt_dlp', 'audio_postprocessor'):
+            importlib.import_module(module)
+        canonical_media_id('https://example.invalid/warm-up')
+
+    def converter_for(self, args):
+        if args.cprofile or args.profile_dir or args.profile_stacks:
+            # A profiled run gets a converter of its own
+            return None
+        key = (args.no_cache, args.cache_dir, args.cache_size, args.metadata_ttl,
+               args.pipeline, args.profile, args.store_flac)
+        with self.converters_lock:
+            if key not in self.converters:
+                self.converters[key] = cli_converter.create_converter(args)
+            return self.converters[key]
+
+    def handle(self, request):
+        """Run one client request, returning its exit status"""
+        try:
+            args = self.parser.parse_args(list(request.get('argv', [])))
+            absolute_paths(args, request.get('cwd') or os.getcwd())
+            cli_converter.run(args, self.converter_for(args))
+            return 0
+        except SystemExit as e:
+            # argparse exits on --help and on invalid options
+            return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            print(f"Error: {e}")
+            return 1
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            print(f"Bad request: {e}")
+            ClientConnection(self.wfile).send(exit=2)
+            return
+        # Anything after the request line is the client's stdin
+        stdin = (io.TextIOWrapper(self.rfile, encoding='utf-8', newline=None)
+                 if request.get('stdin') else None)
+        client = ClientConnection(self.wfile, stdin)
+        token = current_client.set(client)
+        try:
+            status = self.server.daemon.handle(request)
+        finally:
+            current_client.reset(token)
+        client.send(exit=status)
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def remove_stale_socket(socket_path):
+    """Delete a socket left behind by a daemon that died; False if one is still running"""
+    if not os.path.exists(socket_path):
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return False
+    except OSError:
+        os.remove(socket_path)
+        return True
+    finally:
+        probe.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve converter_client.py from a warm process')
+    parser.add_argument('--socket', default=default_socket_path(),
+                       help=f'Unix socket to listen on (default: {default_socket_path()})')
+    args = parser.parse_args()
+
+    if not remove_stale_socket(args.socket):
+        print(f"A converter daemon is already listening on {args.socket}")
+        sys.exit(1)
+
+    daemon = ConverterDaemon()
+    print("Loading extractors...")
+    daemon.warm_up()
+
+    sys.stdout = RequestOutput(sys.stdout, 'stdout')
+    sys.stderr = RequestOutput(sys.stderr, 'stderr')
+    sys.stdin = RequestInput(sys.stdin)
+    # Requests run as this user, so only this user may connect
+    old_umask = os.umask(0o177)
+    try:
+        server = DaemonServer(args.socket, RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.daemon = daemon
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Converter daemon listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping")
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Download Cache
+Content-addressed on-disk cache of converted audio shared by all front ends.
+Entries are keyed by (extractor, media id, format, quality) and evicted in
+least-recently-used order once the cache grows past its size budget.
+Entries stored as FLAC are turned into WAV or AIFF when fetched.
+"""
+
+import os
+import shutil
+import sqlite3
+import hashlib
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from streaming_convert import materialize
+from extractor_lookup import suitable_extractor
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'MUSIC_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'music_converter')
+)
+DEFAULT_CACHE_SIZE_MB = int(os.environ.get('MUSIC_CACHE_SIZE_MB', '2048'))
+
+# Extractors whose track URLs carry no id; the named URL parts stand in for it
+URL_ID_GROUPS = {
+    'Soundcloud': ('uploader', 'title'),
+}
+
+def canonical_media_id(url):
+    """Resolve a URL to (extractor, media id) without touching the network
+
+    Different URL spellings of the same track (youtube.com/watch?v=X and
+    youtu.be/X) resolve to the same pair. Returns None when the id can only
+    be known after extraction.
+    """
+    ie = suitable_extractor(url)
+    if ie is None or ie.ie_key() == 'Generic':
+        return None
+    try:
+        media_id = ie.get_temp_id(url)
+    except Exception:
+        media_id = None
+    if not media_id and ie.ie_key() in URL_ID_GROUPS:
+        match = ie._match_valid_url(url)
+        parts = [match.group(name) for name in URL_ID_GROUPS[ie.ie_key()]] if match else []
+        if parts and all(parts):
+            media_id = '/'.join(parts)
+    if media_id:
+        return ie.ie_key(), str(media_id)
+    return None
+
+def media_id_for_info(info):
+    """(extractor, media id) of an extracted track, as canonical_media_id gives it for its URL"""
+    extractor = info.get('extractor_key') or info.get('extractor')
+    if extractor in URL_ID_GROUPS and info.get('webpage_url'):
+        media = canonical_media_id(info['webpage_url'])
+        if media and media[0] == extractor:
+            return media
+    return extractor, info.get('id')
+
+class CacheStats:
+    """Hit and miss counts of a cache's lookups in this process"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+class DownloadCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.stats = CacheStats()
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.db_path = os.path.join(cache_dir, 'index.sqlite3')
+        # A key's lock lives only while some job holds or waits on it
+        self._key_locks = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    extractor TEXT,
+                    media_id TEXT,
+                    format TEXT,
+                    quality TEXT,
+                    title TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON entries (last_used)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(extractor, media_id, format_type, quality):
+        """Build the cache key for a converted track"""
+        raw = '\0'.join([str(extractor).lower(), str(media_id),
+                         str(format_type).lower(), str(quality).lower()])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def key_for_url(self, url, format_type, quality):
+        """Cache key derived from the URL alone, or None if it needs extraction"""
+        media = canonical_media_id(url)
+        if not media:
+            return None
+        return self.make_key(media[0], media[1], format_type, quality)
+
+    def key_for_info(self, info, format_type, quality):
+        """Cache key derived from a yt-dlp info dict"""
+        extractor, media_id = media_id_for_info(info)
+        if not extractor or not media_id:
+            return None
+        return self.make_key(extractor, media_id, format_type, quality)
+
+    def lock(self, key):
+        """Per-key lock so concurrent jobs for the same track download it once"""
+        with self._locks_guard:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """Return the cache entry for key, marking it as recently used"""
+        if not key:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT filename, size, title FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if not row:
+                self.stats.record(False)
+                return None
+            path = os.path.join(self.cache_dir, row[0])
+            if not os.path.exists(path):
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self.stats.record(False)
+                return None
+            conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.stats.record(True)
+        return {'path': path, 'size': row[1], 'title': row[2]}
+
+    def fetch(self, key, output_dir, name=None, prefix='', format_type=None):
+        """Copy a cached file into output_dir, returning its path on a hit
+
+        The file is named after name when given, otherwise after the name
+        it had when it was first downloaded. A FLAC entry fetched with a
+        format_type of wav or aiff is written out in that format instead.
+        """
+        entry = self.get(key)
+        if not entry:
+            return None
+        ext = os.path.splitext(entry['path'])[1]
+        materialized = ext == '.flac' and format_type and format_type.lower() != 'flac'
+        if materialized:
+            ext = f".{format_type.lower()}"
+        dest_path = os.path.join(output_dir, f"{prefix}{name or entry['title'] or key}{ext}")
+        try:
+            if materialized:
+                return materialize(entry['path'], dest_path, format_type)
+            tmp_path = f"{dest_path}.part"
+            shutil.copyfile(entry['path'], tmp_path)
+            os.replace(tmp_path, dest_path)
+            return dest_path
+        except Exception as e:
+            print(f"Cache read error: {e}")
+            return None
+
+    def put(self, key, source_path, extractor=None, media_id=None,
+            format_type=None, quality=None, title=None):
+        """Store a converted file in the cache and evict old entries
+
+        title is the file name (without extension) used when the entry is
+        later fetched without an explicit name.
+        """
+        if not key or not os.path.exists(source_path):
+            return None
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return None
+
+        ext = os.path.splitext(source_path)[1]
+        filename = f"{key}{ext}"
+        path = os.path.join(self.cache_dir, filename)
+        try:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, filename, size, time.time(), extractor, media_id,
+                     format_type, quality, title)
+                )
+            self.evict()
+            return path
+        except (OSError, sqlite3.Error) as e:
+            print(f"Cache write error: {e}")
+            return None
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget"""
+        with self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute(
+                'SELECT key, filename, size FROM entries ORDER BY last_used ASC'
+            ).fetchall()
+            for key, filename, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except FileNotFoundError:
+                    pass
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
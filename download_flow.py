@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Download Flow
+The steps every front end takes to turn a URL into a converted file:
+look the track up in the output manifest and download cache without network
+access, wait on the per-track cache lock, download with a pooled YoutubeDL
+session, and convert, either in place or on a transcoder. Front ends
+subclass DownloadFlow to say how an output that already exists or is cached
+finishes the job, and what becomes of a finished download.
+"""
+
+from abc import ABC, abstractmethod
+from metadata_cache import resolve_media_id
+from output_manifest import source_id
+from audio_profiles import output_variant
+from format_selection import audio_format_selector, add_audio_postprocessor
+from pipelined_download import pipelined_download
+
+class DownloadFlow(ABC):
+    # yt-dlp's own console output; front ends without a console turn it off
+    quiet = False
+
+    def __init__(self, url, format_type, quality, profile, progress, outtmpl, sessions,
+                 cache=None, metadata_cache=None, storage_format=None, pipeline=False,
+                 transcoder=None):
+        self.url = url
+        self.format_type = format_type
+        self.quality = quality
+        self.profile = profile
+        self.progress = progress
+        self.outtmpl = outtmpl
+        self.sessions = sessions
+        self.cache = cache
+        self.metadata_cache = metadata_cache
+        # Format kept in the cache and manifest, when it differs from the one requested
+        self.storage_format = storage_format or format_type
+        self.pipeline = pipeline
+        self.transcoder = transcoder
+        # Outputs of different profiles are cached and indexed separately
+        self.variant = output_variant(quality, profile)
+        # A pipelined download converts as it downloads, so it cannot be split
+        self.deferred = transcoder is not None and not pipeline
+        self.media = None
+        self.source = None
+        self.cache_key = None
+
+    def find_existing(self):
+        """Finish from an output already in the manifest, returning a true value on a hit"""
+        return None
+
+    def find_cached(self):
+        """Finish from the cache entry for self.cache_key, returning a true value on a hit"""
+        return None
+
+    def downloading(self):
+        """Called once a download is about to start"""
+
+    def downloaded(self, info):
+        """Called with the info dict of a finished download, before it is converted"""
+
+    def job(self, info):
+        """Everything finish needs about a download; also read by AsyncBatchRunner"""
+        return {'info': info, 'format_type': self.format_type,
+                'storage_format': self.storage_format, 'variant': self.variant,
+                'profile': self.profile, 'progress': self.progress}
+
+    @abstractmethod
+    def finish(self, job, ydl=None):
+        """Convert a download if ydl is given, then record the output and return the result"""
+
+    def run(self):
+        """Run the flow and return its result
+
+        The result is what find_existing, find_cached or finish returned, or,
+        when the conversion was handed to the transcoder, a Future of finish's
+        result. Errors are raised to the front end.
+        """
+        lock = None
+        session = None
+        try:
+            # Identify the track from the URL, or from metadata of a previous run,
+            # so existing outputs and cache entries are found without any network access
+            with self.progress.span('lookup'):
+                self.media = resolve_media_id(self.url, self.metadata_cache)
+                if self.media:
+                    self.source = source_id(*self.media)
+                    if self.cache:
+                        self.cache_key = self.cache.make_key(*self.media, self.storage_format,
+                                                             self.variant)
+                found = self.find_existing() or (self.cache_key and self.find_cached())
+            if found:
+                return found
+
+            # Concurrent jobs for the same track wait here and then hit the cache;
+            # a deferred conversion releases the lock once it has finished
+            if self.cache:
+                lock = self.cache.lock(self.cache_key or self.url)
+                with self.progress.span('cache_wait'):
+                    lock.acquire()
+                if self.cache_key:
+                    with self.progress.span('lookup'):
+                        found = self.find_cached()
+                    if found:
+                        return found
+
+            # Pick the cheapest source that meets the quality setting; the output
+            # step skips or only remuxes sources that are already PCM
+            ydl_opts = {
+                'format': audio_format_selector(self.quality, self.pipeline),
+                'quiet': self.quiet,
+                'no_warnings': self.quiet,
+            }
+            # The YoutubeDL instance comes from the pool with this job's output
+            # template and hooks; a deferred conversion returns it once it has finished
+            session = self.sessions.lease(('download', self.quality, self.pipeline, self.quiet),
+                                          ydl_opts, self.outtmpl, self.progress.ydl_options())
+            ydl = session.ydl
+            if not self.deferred:
+                add_audio_postprocessor(ydl, self.storage_format, self.profile)
+            self.downloading()
+            # Extract and download in a single pass
+            if self.pipeline:
+                info = pipelined_download(ydl, self.url, self.storage_format, self.progress,
+                                          self.profile)
+            else:
+                info = ydl.extract_info(self.url, download=True)
+            if self.metadata_cache:
+                self.metadata_cache.put(self.url, info)
+            self.downloaded(info)
+
+            job = self.job(info)
+            if self.deferred:
+                # A transcoder is anything with submit(fn, job, ydl) returning a Future
+                self.progress.start_span('transcode_wait')
+                future = self.transcoder.submit(self.finish, job, ydl)
+                if lock is not None:
+                    future.add_done_callback(lambda _, lock=lock: lock.release())
+                    lock = None
+                future.add_done_callback(lambda _, session=session: session.release())
+                session = None
+                return future
+            session.release()
+            session = None
+            return self.finish(job)
+        except BaseException:
+            if session is not None:
+                session.release(failed=True)
+                session = None
+            raise
+        finally:
+            if lock is not None:
+                lock.release()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Extractor Lookup
+Finds the yt-dlp extractor for a URL without testing all of yt-dlp's
+extractor classes every time. The extractors of common music hosts are
+tried first, and the dedicated extractor each host last matched is
+remembered, so later URLs of that host skip the full scan.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Hosts most batches come from, with the ie_key prefix their extractors share
+COMMON_HOSTS = {
+    'youtube.com': 'Youtube',
+    'youtu.be': 'Youtube',
+    'youtube-nocookie.com': 'Youtube',
+    'soundcloud.com': 'Soundcloud',
+    'bandcamp.com': 'Bandcamp',
+    'mixcloud.com': 'Mixcloud',
+    'vimeo.com': 'Vimeo',
+}
+
+# Hosts whose matched extractor is remembered, least recently used dropped first
+MAX_CACHED_HOSTS = int(os.environ.get('EXTRACTOR_CACHE_HOSTS', '4096'))
+
+_extractors = None
+_common = {}
+_hosts = OrderedDict()
+_lock = threading.Lock()
+
+def _all_extractors():
+    global _extractors
+    if _extractors is None:
+        from yt_dlp.extractor import gen_extractor_classes
+        _extractors = list(gen_extractor_classes())
+    return _extractors
+
+def _common_extractors(host):
+    """Extractors of a common host in yt-dlp's order, or None for other hosts"""
+    for domain, prefix in COMMON_HOSTS.items():
+        if host == domain or host.endswith('.' + domain):
+            if prefix not in _common:
+                _common[prefix] = [ie for ie in _all_extractors()
+                                   if ie.ie_key().startswith(prefix)]
+            return _common[prefix]
+    return None
+
+def suitable_extractor(url):
+    """The first extractor, in yt-dlp's order, that accepts the URL
+
+    A host is taken to be served by the extractor its last URL matched for as
+    long as that extractor accepts its URLs; other URLs of the host are
+    scanned in full. The generic extractor is never remembered, since it
+    accepts every URL and would hide the host's own extractors.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    for ie in _common_extractors(host) or ():
+        if ie.suitable(url):
+            return ie
+    if host:
+        with _lock:
+            ie = _hosts.get(host)
+            if ie is not None:
+                _hosts.move_to_end(host)
+        if ie is not None and ie.suitable(url):
+            return ie
+    for ie in _all_extractors():
+        if ie.suitable(url):
+            break
+    else:
+        return None
+    if host and ie.ie_key() != 'Generic':
+        with _lock:
+            _hosts[host] = ie
+            _hosts.move_to_end(host)
+            while len(_hosts) > MAX_CACHED_HOSTS:
+                _hosts.popitem(last=False)
+    return ie
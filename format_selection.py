@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Format Selection
+Picks the source format by what it costs to turn into PCM as well as by its
+fidelity, and converts downloads with the least work that suffices: PCM
+sources already in the target container are kept as they are, other PCM
+sources only have their samples rewritten, and everything else is decoded
+through the streaming converter. FLAC storage keeps FLAC sources as they are
+when they already match the profile.
+
+Output is always uncompressed, so a bitrate setting means nothing for the
+result; the quality setting instead says how much source fidelity is worth
+paying decode time for.
+"""
+
+import os
+from streaming_convert import read_flac_info
+
+# Rough CPU cost of decoding one second of audio, relative to MP3
+DECODE_COST = {
+    'pcm': 0.05,
+    'flac': 0.3,
+    'alac': 0.3,
+    'wavpack': 0.4,
+    'mp3': 1.0,
+    'aac': 1.0,
+    'mp4a': 1.0,
+    'ac-3': 1.0,
+    'ec-3': 1.1,
+    'vorbis': 1.2,
+    'opus': 1.5,
+}
+UNKNOWN_DECODE_COST = 1.5
+# Formats with video cost a demux and a much larger download
+VIDEO_PENALTY = 5.0
+# Source bitrate (kbps) whose download is weighed like one unit of decode cost
+DOWNLOAD_COST_KBPS = 500
+
+LOSSLESS_CODECS = ('pcm', 'flac', 'alac', 'wavpack')
+
+# Source bitrate (kbps) each quality setting asks for
+QUALITY_TARGETS = {'best': None, 'high': 192, 'medium': 128}
+
+# Sample formats that can be written to each container without conversion
+CONTAINER_PCM = {'wav': ('pcm_s16le', 'pcm_s24le', 'pcm_s32le'),
+                 'aiff': ('pcm_s16be', 'pcm_s24be', 'pcm_s32be')}
+CONTAINER_EXTS = {'wav': ('wav',), 'aiff': ('aiff', 'aif')}
+
+def codec_family(acodec):
+    """Normalised codec name, e.g. 'mp4a.40.2' -> 'mp4a', 'pcm_s16le' -> 'pcm'"""
+    if not acodec or acodec == 'none':
+        return None
+    acodec = acodec.lower()
+    if acodec.startswith('pcm'):
+        return 'pcm'
+    return acodec.split('.')[0]
+
+def decode_cost(fmt):
+    """Estimated cost of turning a format into PCM"""
+    cost = DECODE_COST.get(codec_family(fmt.get('acodec')), UNKNOWN_DECODE_COST)
+    if fmt.get('vcodec') not in (None, 'none'):
+        cost += VIDEO_PENALTY
+    return cost
+
+def selection_cost(fmt):
+    """Decode cost plus the cost of fetching the larger stream"""
+    return decode_cost(fmt) + format_bitrate(fmt) / DOWNLOAD_COST_KBPS
+
+def is_lossless(fmt):
+    return codec_family(fmt.get('acodec')) in LOSSLESS_CODECS
+
+def format_bitrate(fmt):
+    return fmt.get('abr') or fmt.get('tbr') or 0
+
+def format_rank(fmt, quality='best', pipeline=False):
+    """Sort key for a format; higher is better"""
+    target = QUALITY_TARGETS.get((quality or 'best').lower())
+    audio_only = fmt.get('vcodec') in (None, 'none')
+    piped = fmt.get('protocol') in ('http', 'https')
+    if target is None:
+        # Fidelity first, with decode cost only breaking ties
+        key = (audio_only, is_lossless(fmt), format_bitrate(fmt), -decode_cost(fmt))
+    else:
+        # Any format good enough for the target will do, so take the cheapest;
+        # if none is, get as close to the target as possible
+        sufficient = is_lossless(fmt) or format_bitrate(fmt) >= target
+        preference = -selection_cost(fmt) if sufficient else format_bitrate(fmt)
+        key = (audio_only, sufficient, preference, format_bitrate(fmt))
+    return (piped,) + key if pipeline else key
+
+def audio_format_selector(quality='best', pipeline=False):
+    """Format selector for YoutubeDL's 'format' option
+
+    Ranks every format carrying audio by decode cost and fidelity for the
+    given quality. With pipeline, single HTTP(S) streams are preferred so the
+    download can be piped into ffmpeg.
+    """
+    def select(ctx):
+        # Direct links without codec information have no acodec at all and are
+        # kept; video-only formats are not, so yt-dlp reports that no format fits
+        formats = [f for f in ctx['formats'] if f.get('acodec') != 'none']
+        if formats:
+            yield max(formats, key=lambda f: format_rank(f, quality, pipeline))
+    return select
+
+def conversion_plan(acodec, ext, format_type, bit_depth=16):
+    """'skip', 'remux' or 'transcode' for a file of the given codec and extension
+
+    skip: already PCM of the right depth in the target container.
+    remux: PCM that only needs its samples rewritten, with no decoding.
+    transcode: a compressed source that has to be decoded.
+
+    For FLAC output only FLAC sources can be skipped; everything else is encoded.
+    """
+    format_type = format_type.lower()
+    if format_type == 'flac':
+        return 'skip' if codec_family(acodec) == 'flac' and (ext or '').lower() == 'flac' else 'transcode'
+    if codec_family(acodec) != 'pcm':
+        return 'transcode'
+    depth_matches = acodec.lower()[5:7] == str(bit_depth)
+    if (depth_matches and acodec.lower() in CONTAINER_PCM.get(format_type, ())
+            and (ext or '').lower() in CONTAINER_EXTS.get(format_type, ())):
+        return 'skip'
+    return 'remux'
+
+def flac_matches_profile(path, profile):
+    """Whether a FLAC file already has the depth, rate and channels a profile asks for"""
+    source = read_flac_info(path)
+    return (source['bits_per_sample'] == profile['bit_depth']
+            and (profile['sample_rate'] or source['sample_rate']) == source['sample_rate']
+            and (profile['channels'] or source['channels']) == source['channels'])
+
+def convert_download(ydl, info, format_type, profile=None, progress=None):
+    """Run the output step on a finished download outside of yt-dlp
+
+    Used when conversion is handed to a separate pool. The download's entry
+    in info is updated as the post-processor would update it, and the
+    original file is removed.
+    """
+    if progress:
+        progress.set_stage('transcode')
+    download = (info.get('requested_downloads') or [info])[-1]
+    download.setdefault('ext', os.path.splitext(download['filepath'])[1][1:])
+    from audio_postprocessor import AudioOutputPP
+    files_to_delete, download = AudioOutputPP(ydl, format_type, profile).run(download)
+    info['filepath'] = download['filepath']
+    for path in files_to_delete:
+        if path != download['filepath'] and os.path.exists(path):
+            os.remove(path)
+    return info
+
+def add_audio_postprocessor(ydl, format_type, profile=None):
+    """Attach the WAV/AIFF/FLAC output step for an audio profile to a YoutubeDL instance"""
+    from audio_postprocessor import AudioOutputPP
+    ydl.add_post_processor(AudioOutputPP(ydl, format_type, profile), when='post_process')
+    return ydl
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Job Store
+Shared storage for web conversion jobs. The SQLite backend lets every
+gunicorn worker process see the same jobs; the in-memory backend is kept for
+single-process use.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+DEFAULT_JOB_TTL = int(os.environ.get('JOB_TTL', str(24 * 3600)))
+
+# Jobs in these states no longer change and expire after the TTL
+FINISHED_STATES = ('completed', 'failed')
+
+def new_job_id():
+    """Generate a job ID that is unique across processes and hosts"""
+    return f"job_{uuid.uuid4().hex}"
+
+class JobStore(ABC):
+    """Interface shared by all job store backends"""
+    def __init__(self, ttl=DEFAULT_JOB_TTL):
+        self.ttl = ttl
+        self._changed = threading.Condition()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, timeout):
+        """Block until a job changes in this process or the timeout expires
+
+        Changes made by other processes are only seen once the timeout
+        expires, so callers should re-read the jobs they follow either way.
+        """
+        with self._changed:
+            self._changed.wait(timeout)
+
+    @abstractmethod
+    def create(self, job_id, **fields):
+        """Insert a new job"""
+
+    @abstractmethod
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+
+    @abstractmethod
+    def update(self, job_id, **fields):
+        """Atomically merge fields into an existing job"""
+
+    @abstractmethod
+    def delete(self, job_id):
+        """Remove a job"""
+
+    @abstractmethod
+    def purge_expired(self):
+        """Delete finished jobs older than the TTL and return them"""
+
+class MemoryJobStore(JobStore):
+    def __init__(self, ttl=DEFAULT_JOB_TTL):
+        super().__init__(ttl)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id] = dict(fields, updated_at=time.time())
+        self._notify()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+        self._notify()
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.get('status') in FINISHED_STATES and job['updated_at'] < cutoff]
+            return [self._jobs.pop(job_id) for job_id in expired]
+
+class SQLiteJobStore(JobStore):
+    def __init__(self, db_path, ttl=DEFAULT_JOB_TTL):
+        super().__init__(ttl)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets readers in other processes proceed while a job is updated
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_expiry ON jobs (status, updated_at)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self, job_id, **fields):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (job_id, status, data, updated_at) VALUES (?, ?, ?, ?)',
+                (job_id, fields.get('status'), json.dumps(fields), time.time())
+            )
+        self._notify()
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT data, updated_at FROM jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+        return dict(json.loads(row[0]), updated_at=row[1]) if row else None
+
+    def update(self, job_id, **fields):
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock up front so concurrent
+            # read-modify-write cycles cannot lose each other's fields
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+                if row:
+                    data = json.loads(row[0])
+                    data.update(fields)
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE job_id = ?',
+                        (data.get('status'), json.dumps(data), time.time(), job_id)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        self._notify()
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        placeholders = ', '.join('?' for _ in FINISHED_STATES)
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    f'SELECT data FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?',
+                    (*FINISHED_STATES, cutoff)
+                ).fetchall()
+                conn.execute(
+                    f'DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?',
+                    (*FINISHED_STATES, cutoff)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return [json.loads(row[0]) for row in rows]
+
+def create_job_store(spec=None, ttl=DEFAULT_JOB_TTL):
+    """Create a job store from a spec: 'memory' or a path to an SQLite file"""
+    spec = spec or os.environ.get('JOB_STORE', os.path.join('downloads', 'jobs.sqlite3'))
+    if spec == 'memory':
+        return MemoryJobStore(ttl)
+    return SQLiteJobStore(spec, ttl)
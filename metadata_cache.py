@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Metadata Cache
+Persistent cache of yt-dlp extraction results keyed by URL, so re-runs can
+resolve titles, durations and media ids without extracting the page again.
+"""
+
+import os
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from download_cache import DEFAULT_CACHE_DIR, CacheStats, canonical_media_id, media_id_for_info
+
+DEFAULT_METADATA_TTL = int(os.environ.get('MUSIC_METADATA_TTL', str(7 * 24 * 3600)))
+
+# Only the fields the converters use are kept; full info dicts carry format
+# manifests with expiring URLs that are not worth persisting
+METADATA_FIELDS = ('id', 'extractor', 'extractor_key', 'title', 'duration',
+                   'uploader', 'webpage_url')
+
+class MetadataCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_METADATA_TTL):
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.db_path = os.path.join(cache_dir, 'metadata.sqlite3')
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    url TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, url):
+        """Return cached metadata for url, or None if missing or expired"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT info, fetched_at FROM metadata WHERE url = ?', (url,)
+            ).fetchone()
+            if not row:
+                self.stats.record(False)
+                return None
+            if time.time() - row[1] > self.ttl:
+                conn.execute('DELETE FROM metadata WHERE url = ?', (url,))
+                self.stats.record(False)
+                return None
+        self.stats.record(True)
+        return json.loads(row[0])
+
+    def put(self, url, info):
+        """Store the relevant fields of a yt-dlp info dict"""
+        metadata = {field: info.get(field) for field in METADATA_FIELDS}
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)',
+                    (url, json.dumps(metadata, ensure_ascii=False), time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"Metadata cache write error: {e}")
+        return metadata
+
+    def purge_expired(self):
+        """Delete all expired entries"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM metadata WHERE fetched_at < ?', (time.time() - self.ttl,))
+
+def resolve_media_id(url, metadata_cache=None):
+    """(extractor, media id) for a URL without extracting it, or None
+
+    Uses the URL itself where the extractor allows it, otherwise metadata
+    cached by a previous run.
+    """
+    metadata = metadata_cache.get(url) if metadata_cache else None
+    if metadata and metadata.get('id'):
+        return media_id_for_info(metadata)
+    return canonical_media_id(url)
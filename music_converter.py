@@ -11,12 +11,45 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
 import re
+import shutil
 from pathlib import Path
-import yt_dlp
-from pydub import AudioSegment
-from pydub.utils import which
 import requests
 from urllib.parse import urlparse, parse_qs
+from progress import ProgressTracker, format_bytes
+from output_manifest import OutputManifest, final_output_path, source_id
+from download_cache import media_id_for_info
+from streaming_convert import stream_convert
+from download_flow import DownloadFlow
+from ydl_sessions import SessionPool
+from audio_profiles import AUDIO_PROFILES, DEFAULT_PROFILE, get_profile, profile_from_label
+
+class GUIDownload(DownloadFlow):
+    """Download flow of the GUI, which skips tracks already converted into the output directory"""
+    def __init__(self, gui, url, output_dir, format_type, quality, profile, progress):
+        # Each track gets its own file, so manifest entries never share a path
+        super().__init__(url, format_type, quality, profile, progress,
+                         os.path.join(output_dir, '%(title)s.%(ext)s'), gui.sessions)
+        self.gui = gui
+        self.manifest = OutputManifest(output_dir)
+
+    def find_existing(self):
+        existing = self.manifest.lookup(self.source, self.format_type, self.variant)
+        if existing:
+            self.gui.log_message(f"Already converted: {existing['path']}")
+            return existing['path']
+        return None
+
+    def downloaded(self, info):
+        self.gui.log_message(f"Downloaded: {info.get('title', 'Unknown')}")
+
+    def finish(self, job, ydl=None):
+        info = job['info']
+        self.progress.finish()
+        final_path = final_output_path(info)
+        if final_path:
+            self.manifest.record(source_id(*media_id_for_info(info)),
+                                 final_path, self.format_type, self.variant, info.get('title', 'Unknown'))
+        return final_path
 
 class MusicConverter:
     def __init__(self):
@@ -36,6 +69,8 @@ class MusicConverter:
         self.setup_ui()
         self.output_dir = os.path.join(os.getcwd(), "downloads")
         os.makedirs(self.output_dir, exist_ok=True)
+        # YoutubeDL instances reused from one conversion to the next
+        self.sessions = SessionPool()
         
     def setup_ui(self):
         # Title
@@ -64,10 +99,12 @@ class MusicConverter:
         quality_frame = ttk.Frame(self.root)
         quality_frame.pack(pady=10, padx=20, fill='x')
         
+        # Each output profile also implies how good a source is worth fetching
         ttk.Label(quality_frame, text="Audio Quality:").pack(anchor='w')
-        self.quality_var = tk.StringVar(value="Best")
+        self.quality_var = tk.StringVar(value=AUDIO_PROFILES[DEFAULT_PROFILE]['label'])
         quality_combo = ttk.Combobox(quality_frame, textvariable=self.quality_var,
-                                   values=["Best", "High", "Medium"], state="readonly", width=20)
+                                   values=[profile['label'] for profile in AUDIO_PROFILES.values()],
+                                   state="readonly", width=30)
         quality_combo.pack(pady=5, anchor='w')
         
         # Output directory frame
@@ -121,6 +158,28 @@ class MusicConverter:
         self.log_text.see(tk.END)
         self.root.update_idletasks()
         
+    def update_progress(self, snapshot):
+        """Show byte-level progress reported by the download hooks"""
+        if snapshot['stage'] == 'extract':
+            return
+        if str(self.progress['mode']) != 'determinate':
+            self.progress.stop()
+            self.progress.config(mode='determinate', maximum=100)
+        self.progress['value'] = snapshot['percent']
+        
+        if snapshot['stage'] == 'download':
+            text = (f"Downloading {format_bytes(snapshot['downloaded_bytes'])}"
+                    f" / {format_bytes(snapshot['total_bytes'])}")
+            if snapshot['speed']:
+                text += f" at {format_bytes(snapshot['speed'])}/s"
+            if snapshot['eta'] is not None:
+                text += f", {int(snapshot['eta'])}s left"
+        elif snapshot['stage'] == 'transcode':
+            text = "Converting audio..."
+        else:
+            text = "Finishing up..."
+        self.status_label.config(text=text)
+        
     def detect_platform(self, url):
         """Detect the platform from the URL"""
         if 'youtube.com' in url or 'youtu.be' in url:
@@ -158,58 +217,50 @@ class MusicConverter:
         # You would implement actual Spotify API integration here
         return None
         
-    def download_audio(self, url, output_path, format_type, quality):
-        """Download audio using yt-dlp"""
+    def download_audio(self, url, output_dir, format_type, quality, profile=DEFAULT_PROFILE):
+        """Download audio using yt-dlp, returning the converted file's path"""
         try:
-            # Configure yt-dlp options
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': output_path,
-                'extractaudio': True,
-                'audioformat': 'wav' if format_type.upper() == 'WAV' else 'aiff',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'wav' if format_type.upper() == 'WAV' else 'aiff',
-                    'preferredquality': '192' if quality == 'High' else '128' if quality == 'Medium' else '320',
-                }],
-                'quiet': False,
-                'no_warnings': False,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Get video info first
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'Unknown')
-                self.log_message(f"Found: {title}")
-                
-                # Download
-                ydl.download([url])
-                return True
+            # Hooks run on the worker thread; hand updates to the Tk main loop
+            progress = ProgressTracker(
+                lambda snapshot: self.root.after(0, self.update_progress, snapshot)
+            )
+            return GUIDownload(self, url, output_dir, format_type, quality, profile, progress).run()
                 
         except Exception as e:
             self.log_message(f"Download error: {str(e)}")
-            return False
+            return None
             
-    def convert_to_format(self, input_file, output_file, format_type):
-        """Convert audio file to specified format using pydub"""
+    def convert_to_format(self, input_file, output_file, format_type, profile=DEFAULT_PROFILE):
+        """Convert audio file to specified format, streaming it through ffmpeg"""
         try:
-            # Load audio file
-            audio = AudioSegment.from_file(input_file)
-            
-            # Convert to specified format
-            if format_type.upper() == 'WAV':
-                audio.export(output_file, format="wav")
-            elif format_type.upper() == 'AIFF':
-                audio.export(output_file, format="aiff")
-                
+            progress = ProgressTracker(
+                lambda snapshot: self.root.after(0, self.update_progress, snapshot)
+            )
+            settings = get_profile(profile)
+            stream_convert(input_file, output_file, format_type.lower(),
+                           sample_rate=settings['sample_rate'], channels=settings['channels'],
+                           bit_depth=settings['bit_depth'], progress=progress.transcode_progress)
+            progress.finish()
             return True
         except Exception as e:
             self.log_message(f"Conversion error: {str(e)}")
             return False
             
-    def process_url(self, url, output_dir, format_type, quality):
+    def process_url(self, url, output_dir, format_type, quality, profile=DEFAULT_PROFILE):
         """Main processing function"""
         try:
+            # Local audio files are converted directly
+            if os.path.isfile(url):
+                output_path = os.path.join(output_dir, f"{Path(url).stem}.{format_type.lower()}")
+                if os.path.abspath(output_path) == os.path.abspath(url):
+                    self.log_message("Input file is already in the selected format")
+                    return False
+                self.log_message("Converting local file...")
+                if self.convert_to_format(url, output_path, format_type, profile):
+                    self.log_message(f"Successfully converted to {output_path}")
+                    return True
+                return False
+                
             platform = self.detect_platform(url)
             self.log_message(f"Detected platform: {platform}")
             
@@ -223,15 +274,11 @@ class MusicConverter:
                 # In a real implementation, you'd use Spotify API here
                 # For now, we'll treat it as a regular URL
                 
-            # Create output filename
-            safe_title = "converted_audio"
-            output_filename = f"{safe_title}.{format_type.lower()}"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            # Download audio
+            # Download audio, named after the track's title
             self.log_message("Starting download...")
-            if self.download_audio(url, output_path, format_type, quality):
-                self.log_message(f"Successfully converted to {output_path}")
+            final_path = self.download_audio(url, output_dir, format_type, quality, profile)
+            if final_path:
+                self.log_message(f"Successfully converted to {final_path}")
                 return True
             else:
                 self.log_message("Download failed")
@@ -250,6 +297,7 @@ class MusicConverter:
             
         # Disable convert button and start progress
         self.convert_btn.config(state='disabled')
+        self.progress.config(mode='indeterminate', value=0)
         self.progress.start()
         self.status_label.config(text="Converting...")
         
@@ -263,14 +311,15 @@ class MusicConverter:
             url = self.url_entry.get().strip()
             output_dir = self.dir_var.get()
             format_type = self.format_var.get()
-            quality = self.quality_var.get()
+            profile = profile_from_label(self.quality_var.get())
+            quality = get_profile(profile)['source_quality']
             
             self.log_message(f"Processing: {url}")
             self.log_message(f"Output format: {format_type}")
-            self.log_message(f"Quality: {quality}")
+            self.log_message(f"Quality: {self.quality_var.get()}")
             self.log_message(f"Output directory: {output_dir}")
             
-            success = self.process_url(url, output_dir, format_type, quality)
+            success = self.process_url(url, output_dir, format_type, quality, profile)
             
             if success:
                 self.log_message("Conversion completed successfully!")
@@ -300,7 +349,7 @@ def main():
     print("Starting Music Converter...")
     
     # Check if required tools are available
-    if not which("ffmpeg"):
+    if not shutil.which("ffmpeg"):
         print("Warning: FFmpeg not found. Please install FFmpeg for audio conversion.")
         print("Download from: https://ffmpeg.org/download.html")
         
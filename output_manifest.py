@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Output Manifest
+Index of converted files kept inside an output directory, mapping each
+source track (extractor and media id) to its file, size, checksum and format.
+Lets every entry point find or skip an existing output without listing the
+directory.
+"""
+
+import os
+import sqlite3
+import hashlib
+import time
+from contextlib import contextmanager
+
+MANIFEST_NAME = '.manifest.sqlite3'
+
+def final_output_path(info):
+    """Path of the converted file as reported by yt-dlp after post-processing"""
+    for download in reversed(info.get('requested_downloads') or []):
+        if download.get('filepath'):
+            return download['filepath']
+    return info.get('filepath')
+
+def source_id(extractor, media_id):
+    """Stable identifier for a source track, or None if it is not known"""
+    if not extractor or not media_id:
+        return None
+    return f"{str(extractor).lower()}:{media_id}"
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class OutputManifest:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.db_path = os.path.join(output_dir, MANIFEST_NAME)
+        os.makedirs(output_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outputs (
+                    source_id TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    quality TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    checksum TEXT,
+                    title TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (source_id, format, quality)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_outputs_filename ON outputs (filename)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, source, format_type, quality):
+        """Return the recorded output for a source, or None
+
+        Entries whose file was removed or changed size are dropped.
+        """
+        if not source:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT filename, size, checksum, title FROM outputs '
+                'WHERE source_id = ? AND format = ? AND quality = ?',
+                (source, format_type.lower(), quality.lower())
+            ).fetchone()
+            if not row:
+                return None
+            path = os.path.join(self.output_dir, row[0])
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            if size != row[1]:
+                conn.execute(
+                    'DELETE FROM outputs WHERE source_id = ? AND format = ? AND quality = ?',
+                    (source, format_type.lower(), quality.lower())
+                )
+                return None
+        return {'path': path, 'size': row[1], 'checksum': row[2], 'title': row[3]}
+
+    def record(self, source, path, format_type, quality, title=None, checksum=None):
+        """Add or replace the output recorded for a source"""
+        if not source or not path or not os.path.exists(path):
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (source, format_type.lower(), quality.lower(),
+                     os.path.relpath(path, self.output_dir), os.path.getsize(path),
+                     checksum or file_checksum(path), title, time.time())
+                )
+        except (OSError, sqlite3.Error) as e:
+            print(f"Manifest write error: {e}")
+
+    def remove_file(self, path):
+        """Forget every entry that points at path"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM outputs WHERE filename = ?',
+                         (os.path.relpath(path, self.output_dir),))
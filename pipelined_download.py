@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Pipelined Download
+Streams the selected audio format from the network straight into ffmpeg, so
+transcoding runs while the download is still in progress and no intermediate
+file is written. Only plain HTTP(S) formats can be piped; anything else
+(HLS, DASH fragments, merged formats) takes yt-dlp's normal
+download-then-convert path.
+"""
+
+import os
+import time
+from streaming_convert import stream_convert
+from audio_profiles import get_profile
+
+PIPELINE_PROTOCOLS = ('http', 'https')
+
+READ_SIZE = 64 * 1024
+
+def pipeline_format(info):
+    """The selected format when it can be piped, else None"""
+    if info.get('requested_formats') or not info.get('url'):
+        return None
+    if info.get('protocol') not in PIPELINE_PROTOCOLS:
+        return None
+    return info
+
+def _content_total(response):
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    if response.status == 200 and response.headers.get('Content-Length'):
+        return int(response.headers['Content-Length'])
+    return None
+
+def http_chunks(ydl, fmt, progress=None, read_size=READ_SIZE):
+    """Yield the bytes of a format, in HTTP ranges where the site asks for them
+
+    Requests go through ydl, so its cookies, proxy and headers apply.
+    Download progress is reported to a ProgressTracker in the same shape as
+    yt-dlp's own progress hooks.
+    """
+    from yt_dlp.networking import Request
+    from yt_dlp.networking.exceptions import HTTPError
+
+    # YouTube throttles unranged requests; its formats carry the range size
+    range_size = (fmt.get('downloader_options') or {}).get('http_chunk_size')
+    total = fmt.get('filesize')
+    downloaded = 0
+    started = time.monotonic()
+
+    while True:
+        headers = dict(fmt.get('http_headers') or {})
+        if range_size:
+            headers['Range'] = f'bytes={downloaded}-{downloaded + range_size - 1}'
+        try:
+            response = ydl.urlopen(Request(fmt['url'], headers=headers))
+        except HTTPError as e:
+            if e.status == 416 and downloaded:
+                # The previous range ended exactly at the end of the file
+                break
+            raise
+        try:
+            total = _content_total(response) or total
+            received = 0
+            while True:
+                chunk = response.read(read_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                downloaded += len(chunk)
+                if progress:
+                    elapsed = time.monotonic() - started
+                    speed = downloaded / elapsed if elapsed > 0 else None
+                    progress.progress_hook({
+                        'status': 'downloading',
+                        'downloaded_bytes': downloaded,
+                        'total_bytes': total,
+                        'speed': speed,
+                        'eta': (total - downloaded) / speed if total and speed else None,
+                        'elapsed': elapsed,
+                    })
+                yield chunk
+            full_response = response.status == 200
+        finally:
+            response.close()
+        if not range_size or full_response or received < range_size:
+            break
+        if total and downloaded >= total:
+            break
+
+    if total and downloaded < total:
+        raise IOError(f"Connection closed after {downloaded} of {total} bytes")
+    if progress:
+        progress.progress_hook({'status': 'finished', 'downloaded_bytes': downloaded,
+                                'total_bytes': downloaded,
+                                'elapsed': time.monotonic() - started})
+
+def pipelined_download(ydl, url, format_type, progress=None, profile=None):
+    """Download and convert url in one pass, returning yt-dlp's info dict
+
+    The converted file's path is in info['requested_downloads'], as after a
+    normal download and conversion. Formats that cannot be piped,
+    and pipelines that fail part way, fall back to ydl's regular download
+    using the info already extracted.
+    """
+    settings = get_profile(profile)
+    info = ydl.extract_info(url, download=False)
+    fmt = pipeline_format(info)
+    if fmt is not None:
+        output_path = f"{os.path.splitext(ydl.prepare_filename(info))[0]}.{format_type.lower()}"
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        try:
+            stream_convert(
+                http_chunks(ydl, fmt, progress), output_path, format_type,
+                sample_rate=settings['sample_rate'] or fmt.get('asr'),
+                channels=settings['channels'] or fmt.get('audio_channels'),
+                bit_depth=settings['bit_depth']
+            )
+            info['filepath'] = output_path
+            info['requested_downloads'] = [{'filepath': output_path,
+                                            'format_id': fmt.get('format_id')}]
+            return info
+        except Exception as e:
+            ydl.report_warning(f"Pipelined download failed ({e}), downloading normally")
+    return ydl.process_ie_result(info, download=True)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Playlist Expander
+Turns playlist, album and channel URLs in a batch into one entry per track.
+Collections are read with flat extraction, which pages through the listing
+without resolving each track, and several collections are expanded at once.
+Tracks are handed to the batch as soon as their page arrives, so the first
+downloads start while the rest of a playlist is still being listed.
+"""
+
+import os
+import queue
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from extractor_lookup import suitable_extractor
+
+DEFAULT_EXPAND_WORKERS = int(os.environ.get('PLAYLIST_EXPAND_WORKERS', '4'))
+
+# Entries listed ahead of the downloads before expansion waits
+DEFAULT_QUEUE_SIZE = 10000
+
+_DONE = object()
+
+def _returns_playlists(ie):
+    if ie is None or ie.ie_key() == 'Generic':
+        return False
+    return getattr(ie, '_RETURN_TYPE', None) in ('playlist', 'any')
+
+def is_collection_url(url, ie_key=None):
+    """True if the URL's extractor returns playlists rather than single tracks
+
+    Decided from the URL alone, or from ie_key when a listing already named
+    the extractor. Extractors that may return either (such as YouTube tabs)
+    count as collections; the generic extractor does not.
+    """
+    if ie_key:
+        try:
+            from yt_dlp.extractor import get_info_extractor
+            return _returns_playlists(get_info_extractor(ie_key))
+        except Exception:
+            pass
+    return _returns_playlists(suitable_extractor(url))
+
+class PlaylistExpander:
+    def __init__(self, workers=DEFAULT_EXPAND_WORKERS, max_depth=2, queue_size=DEFAULT_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        self.queue_size = queue_size
+        self.ydl_opts = {
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+        }
+
+    def track_entry(self, parent, item, playlist_title, index):
+        """Batch entry for one track listed in a playlist"""
+        url = item.get('webpage_url') or item.get('url')
+        if not url:
+            return None
+        entry = {key: value for key, value in parent.items()
+                 if key not in ('url', 'title', 'status')}
+        entry.update({
+            'url': url,
+            'title': item.get('title'),
+            'playlist': playlist_title,
+            'playlist_url': parent.get('playlist_url') or parent['url'],
+            'playlist_index': index,
+            'status': 'pending',
+        })
+        return entry
+
+    def expand_entry(self, entry, depth, emit, submit):
+        """List one collection, emitting tracks and submitting nested collections"""
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            info = ydl.extract_info(entry['url'], download=False, process=False)
+
+        # Some URLs redirect to the extractor that actually lists the playlist
+        if info.get('_type') in ('url', 'url_transparent') and depth < self.max_depth:
+            target = info.get('url')
+            if target and target != entry['url'] and is_collection_url(target):
+                submit(dict(entry, url=target, playlist_url=entry['url']), depth + 1)
+                return
+        entries = info.get('entries')
+        if entries is None:
+            # Not a playlist after all; download it as given
+            emit(entry)
+            return
+
+        title = info.get('title')
+        print(f"Expanding playlist: {title or entry['url']}")
+        count = 0
+        for index, item in enumerate(entries, 1):
+            if not item:
+                continue
+            child = self.track_entry(entry, item, title, index)
+            if not child:
+                continue
+            nested = (item.get('_type') == 'playlist'
+                      or is_collection_url(child['url'], item.get('ie_key')))
+            if nested and depth < self.max_depth:
+                # Channels list their tabs and playlists, which are expanded in turn
+                submit(dict(child, playlist_url=child['url']), depth + 1)
+            else:
+                count += 1
+                emit(child)
+        print(f"Listed {count} tracks from {title or entry['url']}")
+
+    def expand(self, entries):
+        """Yield entries with every collection replaced by its tracks
+
+        entries is consumed on a background thread. Single-track entries pass
+        through unchanged; tracks from different playlists may interleave,
+        but each playlist keeps its own order. A collection that cannot be
+        listed is yielded as is, so it still shows up in the batch results.
+        """
+        results = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        lock = threading.Lock()
+        state = {'pending': 0, 'input_done': False, 'error': None}
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+
+        def emit(item):
+            # Give up if the consumer went away rather than blocking forever
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def finish_one():
+            with lock:
+                state['pending'] -= 1
+                done = state['input_done'] and state['pending'] == 0
+            if done:
+                emit(_DONE)
+
+        def run(entry, depth):
+            try:
+                self.expand_entry(entry, depth, emit, submit)
+            except Exception as e:
+                print(f"Playlist expansion error for {entry['url']}: {e}")
+                emit(entry)
+            finally:
+                finish_one()
+
+        def submit(entry, depth):
+            with lock:
+                state['pending'] += 1
+            try:
+                # Listing runs in the caller's context (converter_daemon routes output by it)
+                pool.submit(contextvars.copy_context().run, run, entry, depth)
+            except RuntimeError:
+                # The pool was shut down because the consumer stopped
+                finish_one()
+
+        def feed():
+            try:
+                for entry in entries:
+                    if stop.is_set():
+                        break
+                    if is_collection_url(entry['url']):
+                        submit(entry, 0)
+                    else:
+                        emit(entry)
+            except Exception as e:
+                state['error'] = e
+            finally:
+                with lock:
+                    state['input_done'] = True
+                    done = state['pending'] == 0
+                if done:
+                    emit(_DONE)
+
+        feeder = threading.Thread(target=contextvars.copy_context().run, args=(feed,), daemon=True)
+        feeder.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                yield item
+            if state['error'] is not None:
+                raise state['error']
+        finally:
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
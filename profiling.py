@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Profiling
+Built-in profiling for CLI and batch runs (--cprofile). Every job is
+profiled with cProfile in each thread that works on it (the download worker
+and, when conversions are queued, the transcode worker), and a sampler
+records which stacks those threads are in. A run directory then holds, per
+job and for the whole run:
+
+  job-NNNN.pstats / run.pstats        cProfile data, for pstats or snakeviz
+  job-NNNN.collapsed / run.collapsed  sampled stacks for flamegraph.pl or
+                                      speedscope (with --profile-stacks)
+  breakdown.json                      wall time split between Python code,
+                                      yt-dlp extractors, yt-dlp downloads,
+                                      waiting on ffmpeg and waiting on locks
+
+From Python 3.12 only one cProfile profiler can be active at a time, so
+with several workers some jobs may have no pstats file; they are still
+sampled. With --engine asyncio conversions run as asyncio subprocesses on
+the event loop, so their ffmpeg time is not part of any job's breakdown.
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.01'))
+
+# Categories of breakdown.json, in report order
+CATEGORIES = ('python', 'extractor', 'download', 'ffmpeg', 'waiting')
+
+def frame_category(filenames):
+    """Category of a sampled stack, given its file names from the innermost frame out
+
+    ffmpeg covers the subprocess module (ffprobe and yt-dlp's post-processors
+    wait there) and streaming_convert, which only pumps data between ffmpeg
+    pipes. waiting is time blocked on locks, queues and futures.
+    """
+    innermost = filenames[0]
+    base = os.path.basename(innermost)
+    if base in ('subprocess.py', 'streaming_convert.py'):
+        return 'ffmpeg'
+    if base == 'threading.py' or innermost.endswith(os.path.join('concurrent', 'futures', '_base.py')):
+        return 'waiting'
+    for filename in filenames:
+        if os.sep + os.path.join('yt_dlp', 'extractor') + os.sep in filename:
+            return 'extractor'
+        if (os.sep + os.path.join('yt_dlp', 'downloader') + os.sep in filename
+                or os.sep + os.path.join('yt_dlp', 'networking') + os.sep in filename):
+            return 'download'
+    return 'python'
+
+class JobProfile:
+    """Profiles and samples for one job, which may run in several threads"""
+    def __init__(self, run, name, label):
+        self.run = run
+        self.name = name
+        self.label = label
+        self.started_at = time.monotonic()
+        self.profiles = []
+        self.samples = Counter()
+        self.categories = Counter()
+        self.unprofiled_calls = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn in this thread, profiled and sampled as part of this job"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active (Python 3.12+)
+            profile = None
+        ident = threading.get_ident()
+        self.run.attach(ident, self)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.run.detach(ident)
+            with self._lock:
+                if profile is not None:
+                    profile.disable()
+                    self.profiles.append(profile)
+                else:
+                    self.unprofiled_calls += 1
+
+    def wrap(self, fn):
+        def profiled(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return profiled
+
+    def wrap_transcoder(self, transcoder):
+        """Transcoder that profiles the work it runs as part of this job"""
+        if transcoder is None:
+            return None
+        return ProfiledTranscoder(transcoder, self)
+
+    def add_sample(self, stack, category):
+        with self._lock:
+            self.samples[stack] += 1
+            self.categories[category] += 1
+
+    def stats(self):
+        """Merged pstats.Stats of every profiled call, or None"""
+        with self._lock:
+            profiles = list(self.profiles)
+        stats = None
+        for profile in profiles:
+            try:
+                stats = pstats.Stats(profile) if stats is None else stats.add(profile)
+            except TypeError:
+                # A call that recorded nothing has no stats to merge
+                continue
+        return stats
+
+    def finish(self):
+        self.run.finish_job(self)
+
+class ProfiledTranscoder:
+    """Passes conversions to a transcoder, profiling them as part of a job"""
+    def __init__(self, transcoder, job_profile):
+        self.transcoder = transcoder
+        self.job_profile = job_profile
+
+    def submit(self, fn, *args, **kwargs):
+        return self.transcoder.submit(self.job_profile.wrap(fn), *args, **kwargs)
+
+class RunProfiler:
+    def __init__(self, profile_dir, stacks=False, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        self.run_dir = os.path.join(profile_dir, datetime.now().strftime('run-%Y%m%d-%H%M%S'))
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.stacks = stacks
+        self.sample_interval = sample_interval
+        self.started_at = time.monotonic()
+        self.jobs = []
+        self.run_stats = None
+        self.run_samples = Counter()
+        self.breakdown = {}
+        self._threads = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._sampler.start()
+
+    def start_job(self, label):
+        with self._lock:
+            self._count += 1
+            job = JobProfile(self, f"job-{self._count:04d}", label)
+            self.jobs.append(job)
+        return job
+
+    def attach(self, ident, job):
+        with self._lock:
+            self._threads[ident] = job
+
+    def detach(self, ident):
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident, job in threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                names = []
+                filenames = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}")
+                    filenames.append(code.co_filename)
+                    frame = frame.f_back
+                job.add_sample(';'.join(reversed(names)), frame_category(filenames))
+
+    def write_collapsed(self, path, samples):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def finish_job(self, job):
+        """Write a finished job's files and add it to the run totals"""
+        try:
+            stats = job.stats()
+            if stats is not None:
+                stats.dump_stats(os.path.join(self.run_dir, f"{job.name}.pstats"))
+            if self.stacks:
+                self.write_collapsed(os.path.join(self.run_dir, f"{job.name}.collapsed"), job.samples)
+            breakdown = {category: round(job.categories[category] * self.sample_interval, 3)
+                         for category in CATEGORIES}
+            with self._lock:
+                if stats is not None:
+                    self.run_stats = stats if self.run_stats is None else self.run_stats.add(stats)
+                self.run_samples.update(job.samples)
+                self.breakdown[job.name] = {
+                    'job': job.label,
+                    'wall_seconds': round(time.monotonic() - job.started_at, 3),
+                    'seconds': breakdown,
+                    'profiled': job.unprofiled_calls == 0,
+                }
+        except Exception as e:
+            print(f"Profiling error for {job.label}: {e}")
+
+    def close(self):
+        """Stop sampling and write the run's files, returning the run directory"""
+        self._stop.set()
+        self._sampler.join()
+        totals = Counter()
+        for entry in self.breakdown.values():
+            totals.update(entry['seconds'])
+        report = {
+            'wall_seconds': round(time.monotonic() - self.started_at, 3),
+            'sample_interval': self.sample_interval,
+            'totals': {category: round(totals[category], 3) for category in CATEGORIES},
+            'jobs': self.breakdown,
+        }
+        try:
+            if self.run_stats is not None:
+                self.run_stats.dump_stats(os.path.join(self.run_dir, 'run.pstats'))
+            if self.stacks:
+                self.write_collapsed(os.path.join(self.run_dir, 'run.collapsed'), self.run_samples)
+            with open(os.path.join(self.run_dir, 'breakdown.json'), 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+        busy = sum(totals.values())
+        if busy:
+            print("Thread time by activity: " + ', '.join(
+                f"{category} {totals[category]:.1f}s ({totals[category] * 100 / busy:.0f}%)"
+                for category in CATEGORIES))
+        print(f"Profile written to: {self.run_dir}")
+        return self.run_dir
+
+def create_profiler(args, output_dir):
+    """Build the run profiler selected on the command line, or None"""
+    if not (args.cprofile or args.profile_dir or args.profile_stacks):
+        return None
+    return RunProfiler(args.profile_dir or os.path.join(output_dir, 'profiles'), args.profile_stacks)
+
+def add_profiling_arguments(parser):
+    """Add the profiling options shared by the CLI and batch processor"""
+    parser.add_argument('--cprofile', action='store_true',
+                       help='Profile each job and the whole run (see --profile-dir)')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                       help='Where profiles are written, implies --cprofile '
+                            '(default: <output>/profiles)')
+    parser.add_argument('--profile-stacks', action='store_true',
+                       help='Also write sampled stacks in the collapsed flame graph format, implies --cprofile')
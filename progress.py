@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Progress Tracking
+A single progress model fed by yt-dlp's progress and post-processor hooks,
+shared by the GUI, CLI and web front ends. It also times each stage, plus
+named spans such as cache lookups, so slow conversions can be attributed.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ('extract', 'download', 'transcode', 'done')
+
+# Share of the overall percentage given to each stage
+STAGE_SPAN = {
+    'extract': (0, 5),
+    'download': (5, 85),
+    'transcode': (85, 99),
+    'done': (100, 100),
+}
+
+def format_bytes(num_bytes):
+    """Human readable byte count"""
+    if num_bytes is None:
+        return '?'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{int(num_bytes)} B"
+        num_bytes /= 1024
+
+class ProgressTracker:
+    def __init__(self, callback=None, min_interval=0.5):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.stage = 'extract'
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.speed = None
+        self.eta = None
+        self.filename = None
+        self.started_at = time.monotonic()
+        self.download_started_at = None
+        self.download_finished_at = None
+        self.download_elapsed = None
+        self.transcode_fraction = 0.0
+        # Seconds spent per stage and per named span
+        self.durations = {}
+        self._stage_started_at = self.started_at
+        self._span_seconds = 0.0
+        self._open_spans = {}
+        self._last_emit = 0
+        self._lock = threading.Lock()
+
+    def ydl_options(self):
+        """Hook options to merge into a YoutubeDL options dict"""
+        return {
+            'progress_hooks': [self.progress_hook],
+            'postprocessor_hooks': [self.postprocessor_hook],
+        }
+
+    def progress_hook(self, d):
+        """yt-dlp download progress hook"""
+        with self._lock:
+            status = d.get('status')
+            if status == 'downloading':
+                if self.download_started_at is None:
+                    self.download_started_at = time.monotonic()
+                self._enter_stage('download')
+                self.downloaded_bytes = d.get('downloaded_bytes') or 0
+                self.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+                self.speed = d.get('speed')
+                self.eta = d.get('eta')
+                self.filename = d.get('filename')
+                self.download_elapsed = d.get('elapsed', self.download_elapsed)
+            elif status == 'finished':
+                self.download_finished_at = time.monotonic()
+                self.downloaded_bytes = d.get('total_bytes') or d.get('downloaded_bytes') or self.downloaded_bytes
+                self.total_bytes = self.downloaded_bytes
+                self.download_elapsed = d.get('elapsed', self.download_elapsed)
+                self.eta = 0
+        self._emit(force=d.get('status') == 'finished')
+
+    def postprocessor_hook(self, d):
+        """yt-dlp post-processor hook"""
+        if d.get('postprocessor') in ('ExtractAudio', 'AudioOutput') and d.get('status') == 'started':
+            self.set_stage('transcode')
+
+    def set_stage(self, stage):
+        """Move to a new stage and notify immediately"""
+        with self._lock:
+            if stage == self.stage:
+                return
+            self._enter_stage(stage)
+            if stage in ('transcode', 'done'):
+                self.speed = None
+                self.eta = None
+        self._emit(force=True)
+
+    def transcode_progress(self, fraction):
+        """Report how much of the track has been converted, 0-1"""
+        with self._lock:
+            changed = self.stage != 'transcode'
+            self._enter_stage('transcode')
+            self.speed = None
+            self.eta = None
+            self.transcode_fraction = fraction
+        self._emit(force=changed or fraction >= 1.0)
+
+    def finish(self):
+        self.set_stage('done')
+
+    def _enter_stage(self, stage):
+        """Switch stage, adding the time spent in the old one (less named spans)"""
+        if stage == self.stage:
+            return
+        now = time.monotonic()
+        if self.stage != 'done':
+            elapsed = max(0.0, now - self._stage_started_at - self._span_seconds)
+            self.durations[self.stage] = self.durations.get(self.stage, 0.0) + elapsed
+        self.stage = stage
+        self._stage_started_at = now
+        self._span_seconds = 0.0
+
+    def record(self, name, seconds):
+        """Add seconds to the named span; they no longer count towards the current stage"""
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+            if self.stage != 'done':
+                self._span_seconds += seconds
+
+    def start_span(self, name):
+        with self._lock:
+            self._open_spans[name] = time.monotonic()
+
+    def end_span(self, name):
+        """Close a span opened with start_span; does nothing if it is not open"""
+        with self._lock:
+            started_at = self._open_spans.pop(name, None)
+        if started_at is not None:
+            self.record(name, time.monotonic() - started_at)
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block as the named span"""
+        self.start_span(name)
+        try:
+            yield
+        finally:
+            self.end_span(name)
+
+    def timings(self):
+        """Seconds spent per stage and span so far, plus the total up to now"""
+        with self._lock:
+            now = time.monotonic()
+            durations = dict(self.durations)
+            if self.stage != 'done':
+                elapsed = max(0.0, now - self._stage_started_at - self._span_seconds)
+                durations[self.stage] = durations.get(self.stage, 0.0) + elapsed
+            durations['total'] = now - self.started_at
+        return {name: round(seconds, 3) for name, seconds in durations.items()}
+
+    def percent(self):
+        """Overall progress across all stages, 0-100"""
+        low, high = STAGE_SPAN[self.stage]
+        if self.stage == 'download' and self.total_bytes:
+            fraction = min(1.0, self.downloaded_bytes / self.total_bytes)
+            return low + (high - low) * fraction
+        if self.stage == 'transcode':
+            return low + (high - low) * self.transcode_fraction
+        return low
+
+    def average_speed(self):
+        """Mean download throughput in bytes per second"""
+        if self.download_started_at is None:
+            return None
+        # Prefer yt-dlp's own timing, which starts before the first hook call
+        elapsed = self.download_elapsed
+        if not elapsed:
+            end = self.download_finished_at or time.monotonic()
+            elapsed = end - self.download_started_at
+        return self.downloaded_bytes / elapsed if elapsed > 0 else None
+
+    def snapshot(self):
+        """Current progress as a plain dict"""
+        with self._lock:
+            return {
+                'stage': self.stage,
+                'percent': round(self.percent(), 1),
+                'downloaded_bytes': self.downloaded_bytes,
+                'total_bytes': self.total_bytes,
+                'speed': self.speed,
+                'eta': self.eta,
+                'average_speed': self.average_speed(),
+                'elapsed': round(time.monotonic() - self.started_at, 3),
+            }
+
+    def _emit(self, force=False):
+        if not self.callback:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+        self.callback(self.snapshot())
@@ -7,18 +7,20 @@ Simple launcher script to choose between GUI and CLI modes
 import sys
 import os
 import subprocess
+import importlib.util
 
 def check_dependencies():
-    """Check if required dependencies are installed"""
-    try:
-        import yt_dlp
-        import pydub
-        import tkinter
-        return True
-    except ImportError as e:
-        print(f"Missing dependency: {e}")
+    """Check if required dependencies are installed
+
+    Modules are looked up without importing them, which would load all of
+    yt-dlp and start Tk just to see that they exist.
+    """
+    missing = [name for name in ('yt_dlp', 'tkinter') if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"Missing dependency: {', '.join(missing)}")
         print("Please run: pip install -r requirements.txt")
         return False
+    return True
 
 def main():
     print("Music Converter Launcher")
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Streaming Conversion
+Converts audio files to WAV or AIFF by piping raw PCM out of ffmpeg in
+fixed-size chunks straight into the output writer. Memory use stays at a few
+chunks no matter how long the track is, unlike decoding the whole file into
+an AudioSegment first.
+
+Audio can also be stored as FLAC and turned back into WAV or AIFF only when
+it is asked for, either as a file or as a stream of known length.
+"""
+
+import os
+import json
+import struct
+import math
+import subprocess
+import threading
+import wave
+from collections import deque
+
+CHUNK_SIZE = 256 * 1024
+
+# ffmpeg raw sample formats per (bit depth, byte order)
+PCM_FORMATS = {
+    (16, 'little'): 's16le', (24, 'little'): 's24le', (32, 'little'): 's32le',
+    (16, 'big'): 's16be', (24, 'big'): 's24be', (32, 'big'): 's32be',
+}
+
+OUTPUT_FORMATS = ('wav', 'aiff', 'flac')
+PCM_OUTPUT_FORMATS = ('wav', 'aiff')
+
+# ffmpeg's FLAC encoder takes 24-bit samples in 32-bit containers
+FLAC_SAMPLE_FORMATS = {16: 's16', 24: 's32'}
+
+class ConversionError(Exception):
+    pass
+
+def probe_audio(input_path):
+    """Sample rate, channel count and duration of the first audio stream"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=sample_rate,channels:format=duration',
+         '-of', 'json', input_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise ConversionError(result.stderr.strip() or f"ffprobe failed on {input_path}")
+    data = json.loads(result.stdout or '{}')
+    streams = data.get('streams') or []
+    if not streams:
+        raise ConversionError(f"No audio stream in {input_path}")
+    duration = data.get('format', {}).get('duration')
+    return {
+        'sample_rate': int(streams[0].get('sample_rate') or 44100),
+        'channels': int(streams[0].get('channels') or 2),
+        'duration': float(duration) if duration not in (None, 'N/A') else None,
+    }
+
+def _extended80(value):
+    """IEEE 754 80-bit extended float, as AIFF stores its sample rate"""
+    if value <= 0:
+        return b'\x00' * 10
+    mantissa, exponent = math.frexp(value)
+    exponent += 16382
+    mantissa = int(mantissa * (1 << 64))
+    return struct.pack('>HQ', exponent, mantissa)
+
+def aiff_header(channels, sample_rate, sample_width, data_size):
+    """AIFF header for data_size bytes of big-endian PCM"""
+    frames = data_size // (channels * sample_width)
+    return (b'FORM' + struct.pack('>L', 46 + data_size + data_size % 2) + b'AIFF'
+            + b'COMM' + struct.pack('>LhLh', 18, channels, frames, sample_width * 8)
+            + _extended80(sample_rate)
+            + b'SSND' + struct.pack('>LLL', 8 + data_size, 0, 0))
+
+def wav_header(channels, sample_rate, sample_width, data_size):
+    """WAV header for data_size bytes of little-endian PCM
+
+    Matches what the wave module writes, except that the RIFF size of odd-sized
+    data counts the pad byte RIFF requires after it.
+    """
+    block_align = channels * sample_width
+    return (b'RIFF' + struct.pack('<L', 36 + data_size + data_size % 2) + b'WAVE'
+            + b'fmt ' + struct.pack('<LHHLLHH', 16, 1, channels, sample_rate,
+                                    sample_rate * block_align, block_align, sample_width * 8)
+            + b'data' + struct.pack('<L', data_size))
+
+def pcm_header(format_type, channels, sample_rate, sample_width, data_size):
+    header = aiff_header if format_type == 'aiff' else wav_header
+    return header(channels, sample_rate, sample_width, data_size)
+
+class AIFFWriter:
+    """Minimal AIFF writer for big-endian PCM, with sizes patched on close"""
+    def __init__(self, f, channels, sample_rate, sample_width):
+        self.f = f
+        self.channels = channels
+        self.sample_width = sample_width
+        self.data_size = 0
+        f.write(aiff_header(channels, sample_rate, sample_width, 0))
+        self._frames_offset = 22
+
+    def write(self, data):
+        self.f.write(data)
+        self.data_size += len(data)
+
+    def close(self):
+        frames = self.data_size // (self.channels * self.sample_width)
+        if self.data_size % 2:
+            self.f.write(b'\x00')
+        self.f.seek(4)
+        self.f.write(struct.pack('>L', 46 + self.data_size + self.data_size % 2))
+        self.f.seek(self._frames_offset)
+        self.f.write(struct.pack('>L', frames))
+        self.f.seek(42)
+        self.f.write(struct.pack('>L', 8 + self.data_size))
+        self.f.close()
+
+class WAVWriter:
+    """Thin wrapper over the wave module with the same interface as AIFFWriter"""
+    def __init__(self, f, channels, sample_rate, sample_width):
+        self.wav = wave.open(f, 'wb')
+        self.wav.setnchannels(channels)
+        self.wav.setsampwidth(sample_width)
+        self.wav.setframerate(sample_rate)
+
+    def write(self, data):
+        self.wav.writeframesraw(data)
+
+    def close(self):
+        self.wav.close()
+
+def open_writer(path, format_type, channels, sample_rate, sample_width):
+    """Open a PCM writer for path; the caller must close it"""
+    writer_class = AIFFWriter if format_type == 'aiff' else WAVWriter
+    f = open(path, 'wb')
+    try:
+        return writer_class(f, channels, sample_rate, sample_width)
+    except Exception:
+        f.close()
+        raise
+
+def ffmpeg_flac_command(input_path, output_path, sample_rate=None, channels=None, bit_depth=16):
+    """ffmpeg arguments that encode input_path to FLAC, with progress on stdout
+
+    A sample rate or channel count of None keeps the source's.
+    """
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', input_path, '-vn',
+               '-c:a', 'flac', '-sample_fmt', FLAC_SAMPLE_FORMATS[bit_depth]]
+    if bit_depth == 24:
+        command += ['-bits_per_raw_sample', '24']
+    if sample_rate:
+        command += ['-ar', str(sample_rate)]
+    if channels:
+        command += ['-ac', str(channels)]
+    return command + ['-progress', 'pipe:1', '-f', 'flac', output_path]
+
+def ffmpeg_file_command(input_path, output_path, format_type, sample_rate=None, channels=None,
+                        bit_depth=16):
+    """ffmpeg arguments that write input_path to output_path in one of OUTPUT_FORMATS
+
+    For callers that let ffmpeg write the file itself, such as asyncio
+    subprocesses; the format is given explicitly so output_path can be a
+    temporary name. FLAC progress goes to stdout.
+    """
+    if format_type == 'flac':
+        return ffmpeg_flac_command(input_path, output_path, sample_rate, channels, bit_depth)
+    byte_order = 'big' if format_type == 'aiff' else 'little'
+    if (bit_depth, byte_order) not in PCM_FORMATS:
+        raise ConversionError(f"Unsupported bit depth: {bit_depth}")
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', input_path, '-vn',
+               '-c:a', f'pcm_{PCM_FORMATS[(bit_depth, byte_order)]}']
+    if sample_rate:
+        command += ['-ar', str(sample_rate)]
+    if channels:
+        command += ['-ac', str(channels)]
+    return command + ['-f', format_type, output_path]
+
+def ffmpeg_pcm_command(input_path, sample_format, sample_rate, channels):
+    """ffmpeg arguments that decode input_path to raw PCM on stdout"""
+    return ['ffmpeg', '-nostdin', '-v', 'error', '-i', input_path, '-vn',
+            '-f', sample_format, '-acodec', f'pcm_{sample_format}',
+            '-ar', str(sample_rate), '-ac', str(channels), 'pipe:1']
+
+def _feed(stdin, chunks, failures):
+    """Write byte chunks to ffmpeg's stdin, recording any error from the source"""
+    try:
+        for chunk in chunks:
+            stdin.write(chunk)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg exited or was killed; its exit status explains why
+        pass
+    except Exception as e:
+        failures.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+class _FFmpegProcess:
+    """ffmpeg child reading a path or a chunk source, read from stdout by the caller"""
+    def __init__(self, command, chunks=None):
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if chunks is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.stdout = self.process.stdout
+        # Drain stderr on the side so a chatty ffmpeg never blocks on a full pipe
+        self.errors = deque(maxlen=20)
+        self.failures = []
+        self._drain = threading.Thread(
+            target=lambda: self.errors.extend(line.decode('utf-8', 'replace').strip()
+                                              for line in self.process.stderr),
+            daemon=True
+        )
+        self._drain.start()
+        self._feeder = None
+        if chunks is not None:
+            self._feeder = threading.Thread(target=_feed,
+                                            args=(self.process.stdin, chunks, self.failures),
+                                            daemon=True)
+            self._feeder.start()
+
+    def wait(self):
+        """Wait for ffmpeg to exit, raising if it or the chunk source failed"""
+        returncode = self.process.wait()
+        self._drain.join()
+        if self._feeder is not None:
+            self._feeder.join()
+        if self.failures:
+            raise self.failures[0]
+        if returncode != 0:
+            raise ConversionError('; '.join(self.errors) or f"ffmpeg exited with status {returncode}")
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.stdout.close()
+
+def _encode_flac(input_path, output_path, piped, sample_rate, channels, bit_depth,
+                 progress, duration):
+    if bit_depth not in FLAC_SAMPLE_FORMATS:
+        raise ConversionError(f"Unsupported bit depth for FLAC: {bit_depth}")
+    if not piped and progress and duration is None:
+        duration = probe_audio(input_path)['duration']
+
+    tmp_path = f"{output_path}.part"
+    ffmpeg = _FFmpegProcess(
+        ffmpeg_flac_command('pipe:0' if piped else input_path, tmp_path,
+                            sample_rate, channels, bit_depth),
+        input_path if piped else None
+    )
+    try:
+        # ffmpeg writes the file itself and reports how far it got on stdout
+        for line in ffmpeg.stdout:
+            key, _, value = line.decode('ascii', 'replace').strip().partition('=')
+            if key == 'out_time_us' and value.isdigit() and progress and duration:
+                progress(min(1.0, int(value) / 1e6 / duration))
+        ffmpeg.wait()
+        os.replace(tmp_path, output_path)
+        if progress:
+            progress(1.0)
+        return output_path
+    finally:
+        ffmpeg.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def stream_convert(input_path, output_path, format_type='wav', sample_rate=None,
+                   channels=None, bit_depth=16, chunk_size=CHUNK_SIZE, progress=None,
+                   duration=None):
+    """Convert input_path to a WAV, AIFF or FLAC file at output_path
+
+    input_path is a file path, or an iterable of byte chunks that is fed to
+    ffmpeg's stdin while the output is being written. Sample rate and channel
+    count default to those of the source file (44.1 kHz stereo for piped
+    input to WAV or AIFF). The output is written next to output_path and
+    renamed into place when complete. progress, if given, is called with the
+    fraction of the track converted. Returns output_path; raises
+    ConversionError if ffmpeg fails, or the source's own exception if a piped
+    source fails.
+    """
+    format_type = format_type.lower()
+    if format_type not in OUTPUT_FORMATS:
+        raise ConversionError(f"Unsupported output format: {format_type}")
+    piped = not isinstance(input_path, (str, os.PathLike))
+    if format_type == 'flac':
+        return _encode_flac(input_path, output_path, piped, sample_rate, channels, bit_depth,
+                            progress, duration)
+
+    byte_order = 'big' if format_type == 'aiff' else 'little'
+    if (bit_depth, byte_order) not in PCM_FORMATS:
+        raise ConversionError(f"Unsupported bit depth: {bit_depth}")
+    sample_format = PCM_FORMATS[(bit_depth, byte_order)]
+    sample_width = bit_depth // 8
+
+    if not piped and (sample_rate is None or channels is None or (progress and duration is None)):
+        info = probe_audio(input_path)
+        sample_rate = sample_rate or info['sample_rate']
+        channels = channels or info['channels']
+        duration = duration or info['duration']
+    sample_rate = int(sample_rate or 44100)
+    channels = int(channels or 2)
+    bytes_per_second = sample_rate * channels * sample_width
+
+    ffmpeg = _FFmpegProcess(
+        ffmpeg_pcm_command('pipe:0' if piped else input_path, sample_format, sample_rate, channels),
+        input_path if piped else None
+    )
+    tmp_path = f"{output_path}.part"
+    writer = None
+    try:
+        writer = open_writer(tmp_path, format_type, channels, sample_rate, sample_width)
+        written = 0
+        while True:
+            chunk = ffmpeg.stdout.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+            written += len(chunk)
+            if progress and duration:
+                progress(min(1.0, written / bytes_per_second / duration))
+        writer.close()
+        writer = None
+        ffmpeg.wait()
+        os.replace(tmp_path, output_path)
+        return output_path
+    finally:
+        ffmpeg.close()
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def read_flac_info(path):
+    """Sample rate, channels, bit depth and length from a FLAC file's STREAMINFO block"""
+    with open(path, 'rb') as f:
+        if f.read(4) != b'fLaC':
+            raise ConversionError(f"Not a FLAC file: {path}")
+        block_header = f.read(4)
+        streaminfo = f.read(34)
+    if len(streaminfo) < 34 or block_header[0] & 0x7f != 0:
+        raise ConversionError(f"FLAC file has no STREAMINFO block: {path}")
+    # 20 bits sample rate, 3 bits channels - 1, 5 bits bits per sample - 1, 36 bits samples
+    packed = int.from_bytes(streaminfo[10:18], 'big')
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    return {
+        'sample_rate': sample_rate,
+        'channels': ((packed >> 41) & 0x7) + 1,
+        'bits_per_sample': ((packed >> 36) & 0x1f) + 1,
+        'total_samples': total_samples,
+        'duration': total_samples / sample_rate if sample_rate and total_samples else None,
+    }
+
+def pcm_bit_depth(bits_per_sample):
+    """Smallest WAV/AIFF sample depth that holds bits_per_sample without loss"""
+    for depth in (16, 24, 32):
+        if bits_per_sample <= depth:
+            return depth
+    return 32
+
+def materialize(flac_path, output_path, format_type='wav', progress=None):
+    """Write a WAV or AIFF copy of a stored FLAC file at its own rate, depth and channels"""
+    info = read_flac_info(flac_path)
+    return stream_convert(flac_path, output_path, format_type, sample_rate=info['sample_rate'],
+                          channels=info['channels'],
+                          bit_depth=pcm_bit_depth(info['bits_per_sample']),
+                          progress=progress, duration=info['duration'])
+
+def materialize_stream(flac_path, format_type='wav', chunk_size=CHUNK_SIZE):
+    """Exact size and byte chunks of a WAV or AIFF rendering of a stored FLAC file
+
+    Nothing is written to disk. The header comes from the FLAC's STREAMINFO
+    block, so the size is known before any decoding, and ffmpeg only starts
+    once the chunks are iterated. Raises ConversionError when the FLAC does
+    not record its length.
+    """
+    format_type = format_type.lower()
+    if format_type not in PCM_OUTPUT_FORMATS:
+        raise ConversionError(f"Unsupported output format: {format_type}")
+    info = read_flac_info(flac_path)
+    if not info['total_samples']:
+        raise ConversionError(f"FLAC file does not record its length: {flac_path}")
+    bit_depth = pcm_bit_depth(info['bits_per_sample'])
+    sample_width = bit_depth // 8
+    sample_format = PCM_FORMATS[(bit_depth, 'big' if format_type == 'aiff' else 'little')]
+    data_size = info['total_samples'] * info['channels'] * sample_width
+    header = pcm_header(format_type, info['channels'], info['sample_rate'], sample_width, data_size)
+    padding = data_size % 2
+
+    def chunks():
+        ffmpeg = _FFmpegProcess(ffmpeg_pcm_command(flac_path, sample_format,
+                                                   info['sample_rate'], info['channels']))
+        try:
+            yield header
+            remaining = data_size
+            while remaining:
+                chunk = ffmpeg.stdout.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            if remaining:
+                # The decoder came up short; keep the promised length if it exited cleanly
+                ffmpeg.wait()
+                while remaining:
+                    filler = min(chunk_size, remaining)
+                    remaining -= filler
+                    yield b'\x00' * filler
+            if padding:
+                yield b'\x00'
+        finally:
+            ffmpeg.close()
+
+    return len(header) + data_size + padding, chunks()
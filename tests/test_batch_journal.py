@@ -0,0 +1,76 @@
+import json
+import os
+
+from batch_journal import BatchJournal
+
+def make_journal(tmp_path, **kwargs):
+    return BatchJournal(str(tmp_path / 'batch_log.json'), **kwargs)
+
+def test_replays_adds_and_updates(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, {'url': 'a', 'status': 'pending'})
+    journal.add(1, {'url': 'b', 'status': 'pending'})
+    journal.update(0, {'status': 'completed', 'output': 'a.wav'})
+    journal.update(1, {'status': 'failed'})
+    journal.close()
+
+    assert make_journal(tmp_path).load() == [
+        {'url': 'a', 'status': 'completed', 'output': 'a.wav'},
+        {'url': 'b', 'status': 'failed'},
+    ]
+
+def test_ignores_a_torn_final_line(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, {'url': 'a', 'status': 'pending'})
+    journal.close()
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op": "update", "index": 0, "fie')
+
+    assert make_journal(tmp_path).load() == [{'url': 'a', 'status': 'pending'}]
+
+def test_compaction_writes_a_snapshot_and_empties_the_journal(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, {'url': 'a', 'status': 'completed'})
+    journal.add(1, {'url': 'b', 'status': 'pending'})
+    results = journal.load()
+    journal.compact(results, {'completed': 1})
+
+    with open(journal.log_file, encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert snapshot['total_urls'] == 2
+    assert snapshot['completed'] == 1
+    assert snapshot['results'] == results
+    assert os.path.getsize(journal.journal_file) == 0
+    assert not os.path.exists(journal.log_file + '.tmp')
+
+    # Records written after compaction replay on top of the snapshot
+    journal.update(1, {'status': 'completed'})
+    journal.close()
+    assert make_journal(tmp_path).load() == [
+        {'url': 'a', 'status': 'completed'},
+        {'url': 'b', 'status': 'completed'},
+    ]
+
+def test_replaying_records_already_in_the_snapshot_is_harmless(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, {'url': 'a', 'status': 'pending'})
+    journal.update(0, {'status': 'completed'})
+    journal.close()
+    expected = journal.load()
+    # A crash after the snapshot was renamed into place but before the journal was truncated
+    with open(journal.journal_file, encoding='utf-8') as f:
+        journal_lines = f.read()
+    journal.compact(expected, {'completed': 1})
+    journal.close()
+    with open(journal.journal_file, 'w', encoding='utf-8') as f:
+        f.write(journal_lines)
+
+    assert make_journal(tmp_path).load() == expected
+
+def test_compaction_threshold_grows_with_the_batch(tmp_path):
+    journal = make_journal(tmp_path, compact_every=3)
+    for index in range(3):
+        journal.add(index, {'url': str(index)})
+    assert journal.should_compact(total=3)
+    assert not journal.should_compact(total=10)
+    journal.close()
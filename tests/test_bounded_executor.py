@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from bounded_executor import BoundedExecutor, QueueFull
+
+@pytest.fixture
+def blocked():
+    """Event the test jobs wait on, set when the test is done"""
+    event = threading.Event()
+    yield event
+    event.set()
+
+def test_rejects_submissions_beyond_the_queue(blocked):
+    executor = BoundedExecutor(max_workers=1, max_queue=1)
+    assert executor.submit(blocked.wait) == 0
+    assert executor.submit(blocked.wait) == 1
+    with pytest.raises(QueueFull) as exc:
+        executor.submit(blocked.wait)
+    assert exc.value.position == 2
+    assert exc.value.retry_after >= 1
+    assert executor.queue_depth() == 1
+
+def test_accepts_work_again_once_a_slot_frees_up():
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    release = threading.Event()
+    done = threading.Event()
+    executor.submit(release.wait)
+    with pytest.raises(QueueFull):
+        executor.submit(done.set)
+    release.set()
+    for _ in range(100):
+        try:
+            executor.submit(done.set)
+            break
+        except QueueFull:
+            time.sleep(0.01)
+    assert done.wait(5)
+
+def test_convert_answers_429_when_the_pool_is_full(blocked, monkeypatch, tmp_path):
+    # web_app creates its downloads folder and job store under the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MUSIC_CACHE_DISABLED', '1')
+    web_app = pytest.importorskip('web_app')
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    executor.submit(blocked.wait)
+    monkeypatch.setattr(web_app, 'executor', executor)
+
+    response = web_app.app.test_client().post(
+        '/convert', json={'url': 'https://example.com/track.mp3', 'format': 'wav'})
+
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['queue_position'] == 1
@@ -0,0 +1,73 @@
+import gc
+import os
+
+import pytest
+
+from download_cache import DownloadCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(str(tmp_path / 'cache'))
+
+def source_file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b'\x01' * size)
+    return str(path)
+
+def test_put_then_fetch_copies_the_entry(cache, tmp_path):
+    key = cache.make_key('Youtube', 'abc', 'wav', 'cd')
+    cache.put(key, source_file(tmp_path, 'track.wav', 100), 'Youtube', 'abc', 'wav', 'cd', 'Track')
+
+    out = tmp_path / 'out'
+    out.mkdir()
+    assert cache.fetch(key, str(out)) == str(out / 'Track.wav')
+    assert cache.fetch(key, str(out), name='Renamed', prefix='job_') == str(out / 'job_Renamed.wav')
+    assert (out / 'Track.wav').read_bytes() == b'\x01' * 100
+    assert cache.stats.snapshot()['hits'] == 2
+
+def test_keys_differ_by_format_and_quality():
+    keys = {DownloadCache.make_key('Youtube', 'abc', fmt, quality)
+            for fmt in ('wav', 'aiff') for quality in ('cd', 'studio')}
+    assert len(keys) == 4
+    assert DownloadCache.make_key('YouTube', 'abc', 'WAV', 'CD') == DownloadCache.make_key(
+        'youtube', 'abc', 'wav', 'cd')
+
+def test_key_for_info_needs_an_extractor_and_id(cache):
+    assert cache.key_for_info({'extractor_key': 'Youtube', 'id': 'abc'}, 'wav', 'cd') == (
+        cache.make_key('Youtube', 'abc', 'wav', 'cd'))
+    assert cache.key_for_info({'id': 'abc'}, 'wav', 'cd') is None
+
+def test_missing_file_is_a_miss(cache, tmp_path):
+    key = cache.make_key('Youtube', 'abc', 'wav', 'cd')
+    stored = cache.put(key, source_file(tmp_path, 'track.wav', 10))
+    os.remove(stored)
+    assert cache.get(key) is None
+    assert cache.stats.snapshot()['misses'] == 1
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size_mb=250 / (1024 * 1024))
+    keys = [cache.make_key('Youtube', name, 'wav', 'cd') for name in 'abc']
+    cache.put(keys[0], source_file(tmp_path, 'a.wav', 100))
+    cache.put(keys[1], source_file(tmp_path, 'b.wav', 100))
+    # Using the older entry makes the other one the least recently used
+    assert cache.get(keys[0])
+    cache.put(keys[2], source_file(tmp_path, 'c.wav', 100))
+
+    assert cache.get(keys[0])
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2])
+    assert not os.path.exists(os.path.join(cache.cache_dir, f'{keys[1]}.wav'))
+
+def test_files_larger_than_the_cache_are_not_stored(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size_mb=50 / (1024 * 1024))
+    key = cache.make_key('Youtube', 'abc', 'wav', 'cd')
+    assert cache.put(key, source_file(tmp_path, 'track.wav', 100)) is None
+    assert cache.get(key) is None
+
+def test_key_lock_is_shared_while_held_and_dropped_after(cache):
+    lock = cache.lock('key')
+    assert cache.lock('key') is lock
+    assert cache.lock('other') is not lock
+    del lock
+    gc.collect()
+    assert len(cache._key_locks) == 0
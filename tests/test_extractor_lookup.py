@@ -0,0 +1,61 @@
+import pytest
+
+import extractor_lookup
+from extractor_lookup import suitable_extractor
+from download_cache import canonical_media_id, media_id_for_info
+
+pytest.importorskip('yt_dlp')
+
+@pytest.fixture(autouse=True)
+def empty_host_cache():
+    extractor_lookup._hosts.clear()
+    yield
+    extractor_lookup._hosts.clear()
+
+def full_scan(url):
+    from yt_dlp.extractor import gen_extractor_classes
+    return next(ie for ie in gen_extractor_classes() if ie.suitable(url)).ie_key()
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://youtu.be/dQw4w9WgXcQ',
+    'https://www.youtube.com/playlist?list=PL1234567890',
+    'https://soundcloud.com/artist/track-name',
+    'https://soundcloud.com/artist/sets/album',
+    'https://artist.bandcamp.com/album/record',
+    'https://vimeo.com/12345',
+    'https://www.dailymotion.com/video/x7tgad0',
+    'https://example.com/track.mp3',
+])
+def test_matches_the_full_scan(url):
+    assert suitable_extractor(url).ie_key() == full_scan(url)
+    # The second lookup is answered from the caches
+    assert suitable_extractor(url).ie_key() == full_scan(url)
+
+@pytest.mark.parametrize('root, media, ie_key', [
+    ('https://archive.org/', 'https://archive.org/details/Cops1922', 'ArchiveOrg'),
+    ('https://www.twitch.tv/', 'https://www.twitch.tv/videos/6528877', 'TwitchVod'),
+    ('https://www.dailymotion.com/', 'https://www.dailymotion.com/video/x7tgad0', 'Dailymotion'),
+])
+def test_generic_root_url_does_not_hide_the_hosts_extractor(root, media, ie_key):
+    assert suitable_extractor(root).ie_key() == 'Generic'
+    assert suitable_extractor(media).ie_key() == ie_key
+    assert canonical_media_id(media) is not None
+
+def test_cached_extractor_is_checked_against_each_url():
+    assert suitable_extractor('https://www.dailymotion.com/video/x7tgad0').ie_key() == 'Dailymotion'
+    assert (suitable_extractor('https://www.dailymotion.com/playlist/x6hynp').ie_key()
+            == 'DailymotionPlaylist')
+
+def test_soundcloud_tracks_get_an_offline_id():
+    url = 'https://soundcloud.com/artist/track-name'
+    assert canonical_media_id(url) == ('Soundcloud', 'artist/track-name')
+    # The extracted track maps to the same id, so it is cached under the URL's key
+    info = {'extractor_key': 'Soundcloud', 'id': '123456', 'webpage_url': url}
+    assert media_id_for_info(info) == canonical_media_id(url)
+
+def test_other_extractors_keep_the_extracted_id():
+    info = {'extractor_key': 'Youtube', 'id': 'dQw4w9WgXcQ',
+            'webpage_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'}
+    assert media_id_for_info(info) == ('Youtube', 'dQw4w9WgXcQ')
+    assert canonical_media_id('https://example.com/track.mp3') is None
@@ -0,0 +1,48 @@
+import pytest
+
+from format_selection import audio_format_selector, format_rank
+
+OPUS = {'format_id': 'opus', 'acodec': 'opus', 'vcodec': 'none', 'abr': 160, 'protocol': 'https'}
+AAC = {'format_id': 'aac', 'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 128, 'protocol': 'https'}
+AAC_LOW = {'format_id': 'aac-low', 'acodec': 'mp4a.40.5', 'vcodec': 'none', 'abr': 48, 'protocol': 'https'}
+FLAC = {'format_id': 'flac', 'acodec': 'flac', 'vcodec': 'none', 'abr': 900, 'protocol': 'https'}
+MUXED = {'format_id': 'muxed', 'acodec': 'mp4a.40.2', 'vcodec': 'avc1', 'tbr': 2000, 'protocol': 'https'}
+VIDEO = {'format_id': 'video', 'acodec': 'none', 'vcodec': 'avc1', 'tbr': 3000, 'protocol': 'https'}
+HLS = {'format_id': 'hls', 'acodec': 'opus', 'vcodec': 'none', 'abr': 256, 'protocol': 'm3u8_native'}
+DIRECT = {'format_id': 'direct', 'url': 'https://example.com/track.mp3', 'protocol': 'https'}
+
+def select(formats, quality='best', pipeline=False):
+    return [f['format_id'] for f in audio_format_selector(quality, pipeline)({'formats': formats})]
+
+def best(formats, quality='best', pipeline=False):
+    return max(formats, key=lambda f: format_rank(f, quality, pipeline))['format_id']
+
+def test_best_prefers_lossless_then_bitrate():
+    assert best([AAC, OPUS, FLAC]) == 'flac'
+    assert best([AAC, OPUS]) == 'opus'
+
+def test_audio_only_beats_formats_with_video():
+    assert best([MUXED, AAC_LOW]) == 'aac-low'
+    assert best([MUXED, AAC_LOW], 'medium') == 'aac-low'
+
+@pytest.mark.parametrize('quality, expected', [('medium', 'aac'), ('high', 'flac')])
+def test_lower_quality_takes_the_cheapest_sufficient_format(quality, expected):
+    # Lossless is always sufficient but costs more to fetch than a lossy stream
+    assert best([FLAC, OPUS, AAC, AAC_LOW], quality) == expected
+
+def test_insufficient_formats_get_as_close_to_the_target_as_possible():
+    assert best([AAC_LOW, AAC], 'high') == 'aac'
+
+def test_pipeline_prefers_single_http_streams():
+    assert best([HLS, OPUS]) == 'hls'
+    assert best([HLS, OPUS], pipeline=True) == 'opus'
+
+def test_selector_skips_video_only_formats():
+    assert select([VIDEO, MUXED]) == ['muxed']
+
+def test_selector_keeps_direct_links_without_codec_information():
+    assert select([DIRECT]) == ['direct']
+
+def test_selector_yields_nothing_for_video_only_sources():
+    # yt-dlp then reports that the requested format is not available
+    assert select([VIDEO]) == []
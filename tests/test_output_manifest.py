@@ -0,0 +1,71 @@
+import pytest
+
+from output_manifest import OutputManifest, final_output_path, source_id
+
+@pytest.fixture
+def manifest(tmp_path):
+    return OutputManifest(str(tmp_path))
+
+def output_file(tmp_path, name, data=b'\x01' * 100):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def test_record_then_lookup(manifest, tmp_path):
+    path = output_file(tmp_path, 'Track.wav')
+    manifest.record('youtube:abc', path, 'WAV', 'CD', 'Track')
+    entry = manifest.lookup('youtube:abc', 'wav', 'cd')
+    assert entry['path'] == path
+    assert entry['size'] == 100
+    assert entry['title'] == 'Track'
+    assert len(entry['checksum']) == 64
+
+def test_lookup_is_per_format_and_quality(manifest, tmp_path):
+    manifest.record('youtube:abc', output_file(tmp_path, 'Track.wav'), 'wav', 'cd')
+    assert manifest.lookup('youtube:abc', 'aiff', 'cd') is None
+    assert manifest.lookup('youtube:abc', 'wav', 'studio') is None
+    assert manifest.lookup('youtube:other', 'wav', 'cd') is None
+    assert manifest.lookup(None, 'wav', 'cd') is None
+
+def test_removed_file_drops_the_entry(manifest, tmp_path):
+    path = output_file(tmp_path, 'Track.wav')
+    manifest.record('youtube:abc', path, 'wav', 'cd')
+    (tmp_path / 'Track.wav').unlink()
+    assert manifest.lookup('youtube:abc', 'wav', 'cd') is None
+    # Restoring the file does not bring the dropped entry back
+    output_file(tmp_path, 'Track.wav')
+    assert manifest.lookup('youtube:abc', 'wav', 'cd') is None
+
+def test_file_of_another_size_drops_the_entry(manifest, tmp_path):
+    path = output_file(tmp_path, 'Track.wav')
+    manifest.record('youtube:abc', path, 'wav', 'cd')
+    output_file(tmp_path, 'Track.wav', b'\x02' * 50)
+    assert manifest.lookup('youtube:abc', 'wav', 'cd') is None
+
+def test_record_skips_unknown_sources_and_missing_files(manifest, tmp_path):
+    manifest.record(None, output_file(tmp_path, 'Track.wav'), 'wav', 'cd')
+    manifest.record('youtube:abc', str(tmp_path / 'missing.wav'), 'wav', 'cd')
+    assert manifest.lookup('youtube:abc', 'wav', 'cd') is None
+
+def test_remove_file_forgets_its_entries(manifest, tmp_path):
+    path = output_file(tmp_path, 'Track.wav')
+    manifest.record('youtube:abc', path, 'wav', 'cd')
+    manifest.remove_file(path)
+    assert manifest.lookup('youtube:abc', 'wav', 'cd') is None
+
+def test_entries_survive_reopening(tmp_path):
+    path = output_file(tmp_path, 'Track.wav')
+    OutputManifest(str(tmp_path)).record('youtube:abc', path, 'wav', 'cd')
+    assert OutputManifest(str(tmp_path)).lookup('youtube:abc', 'wav', 'cd')['path'] == path
+
+def test_source_id():
+    assert source_id('Youtube', 'abc') == 'youtube:abc'
+    assert source_id(None, 'abc') is None
+    assert source_id('Youtube', None) is None
+
+def test_final_output_path_prefers_the_last_requested_download():
+    info = {'filepath': '/tmp/a.webm',
+            'requested_downloads': [{'filepath': '/tmp/a.m4a'}, {'filepath': '/tmp/a.wav'}]}
+    assert final_output_path(info) == '/tmp/a.wav'
+    assert final_output_path({'filepath': '/tmp/a.webm'}) == '/tmp/a.webm'
+    assert final_output_path({}) is None
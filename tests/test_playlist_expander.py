@@ -0,0 +1,36 @@
+import pytest
+
+import extractor_lookup
+from playlist_expander import is_collection_url
+
+pytest.importorskip('yt_dlp')
+
+@pytest.fixture(autouse=True)
+def empty_host_cache():
+    extractor_lookup._hosts.clear()
+    yield
+    extractor_lookup._hosts.clear()
+
+@pytest.mark.parametrize('first, collection', [
+    ('https://www.dailymotion.com/', 'https://www.dailymotion.com/playlist/x6hynp'),
+    ('https://www.dailymotion.com/video/x7tgad0', 'https://www.dailymotion.com/user/someone'),
+    ('https://www.twitch.tv/', 'https://www.twitch.tv/somechannel/videos'),
+])
+def test_earlier_urls_of_a_host_do_not_hide_its_collections(first, collection):
+    assert not is_collection_url(first)
+    assert is_collection_url(collection)
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.youtube.com/playlist?list=PL1234567890', True),
+    ('https://soundcloud.com/artist/sets/album', True),
+    ('https://artist.bandcamp.com/album/record', True),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', False),
+    ('https://soundcloud.com/artist/track-name', False),
+    ('https://example.com/track.mp3', False),
+])
+def test_collection_urls(url, expected):
+    assert is_collection_url(url) is expected
+
+def test_listing_ie_key_decides_without_the_url():
+    assert is_collection_url('https://example.com/anything', ie_key='YoutubeTab')
+    assert not is_collection_url('https://example.com/anything', ie_key='Youtube')
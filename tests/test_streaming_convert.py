@@ -0,0 +1,100 @@
+import io
+import os
+import stat
+import struct
+import wave
+
+import pytest
+
+from streaming_convert import (AIFFWriter, ConversionError, aiff_header, materialize_stream,
+                               read_flac_info, wav_header)
+
+def flac_file(tmp_path, sample_rate=44100, channels=2, bits_per_sample=16, total_samples=1000):
+    """A FLAC file with only a STREAMINFO block, which is all the size calculation reads"""
+    packed = ((sample_rate << 44) | ((channels - 1) << 41) | ((bits_per_sample - 1) << 36)
+              | total_samples)
+    path = tmp_path / 'stored.flac'
+    path.write_bytes(b'fLaC' + bytes([0x80, 0, 0, 34]) + b'\0' * 10
+                     + packed.to_bytes(8, 'big') + b'\0' * 16)
+    return str(path)
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Put an ffmpeg on PATH that writes the given number of bytes of decoded audio"""
+    def install(output_bytes):
+        bin_dir = tmp_path / 'bin'
+        bin_dir.mkdir()
+        script = bin_dir / 'ffmpeg'
+        script.write_text('#!/bin/sh\n'
+                          f'head -c {output_bytes} /dev/zero | tr "\\000" "\\001"\n')
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return install
+
+@pytest.mark.parametrize('channels, sample_width, data_size', [(2, 2, 4000), (1, 3, 3003)])
+def test_wav_header_matches_the_wave_module(channels, sample_width, data_size):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(48000)
+        wav.writeframes(b'\x01' * data_size)
+    header = wav_header(channels, 48000, sample_width, data_size)
+    assert len(header) == 44
+    assert header[8:] == buffer.getvalue()[8:44]
+    # The wave module leaves out the pad byte after odd-sized data
+    assert struct.unpack('<L', header[4:8])[0] == 36 + data_size + data_size % 2
+
+@pytest.mark.parametrize('channels, sample_width, data_size', [(2, 2, 4000), (1, 3, 3003)])
+def test_aiff_header_sizes(channels, sample_width, data_size):
+    header = aiff_header(channels, 44100, sample_width, data_size)
+    assert len(header) == 54
+    padded = data_size + data_size % 2
+    assert struct.unpack('>L', header[4:8])[0] == len(header) + padded - 8
+    assert struct.unpack('>LhLh', header[16:28]) == (
+        18, channels, data_size // (channels * sample_width), sample_width * 8)
+    assert struct.unpack('>L', header[42:46])[0] == 8 + data_size
+
+@pytest.mark.parametrize('data_size', [4000, 3003])
+def test_aiff_header_matches_what_the_writer_patches_in(tmp_path, data_size):
+    path = tmp_path / 'out.aiff'
+    writer = AIFFWriter(open(path, 'wb'), 1, 44100, 3)
+    writer.write(b'\x01' * data_size)
+    writer.close()
+    written = path.read_bytes()
+    assert written[:54] == aiff_header(1, 44100, 3, data_size)
+    assert len(written) == 54 + data_size + data_size % 2
+
+def test_read_flac_info(tmp_path):
+    info = read_flac_info(flac_file(tmp_path, 48000, 2, 24, 96000))
+    assert info == {'sample_rate': 48000, 'channels': 2, 'bits_per_sample': 24,
+                    'total_samples': 96000, 'duration': 2.0}
+
+@pytest.mark.parametrize('format_type, bits_per_sample, header_size', [
+    ('wav', 16, 44), ('aiff', 16, 54), ('wav', 24, 44), ('aiff', 20, 54),
+])
+def test_materialize_stream_size_is_known_before_decoding(tmp_path, format_type,
+                                                          bits_per_sample, header_size):
+    size, _ = materialize_stream(flac_file(tmp_path, 44100, 2, bits_per_sample, 1001), format_type)
+    sample_width = 2 if bits_per_sample <= 16 else 3
+    data_size = 1001 * 2 * sample_width
+    assert size == header_size + data_size + data_size % 2
+
+@pytest.mark.parametrize('format_type', ['wav', 'aiff'])
+@pytest.mark.parametrize('decoded', [4004, 1000])
+def test_materialize_stream_sends_exactly_its_size(tmp_path, fake_ffmpeg, format_type, decoded):
+    # 1001 stereo 16-bit frames are 4004 bytes; a short decode is padded to the promised length
+    fake_ffmpeg(decoded)
+    size, chunks = materialize_stream(flac_file(tmp_path, total_samples=1001), format_type,
+                                      chunk_size=512)
+    body = b''.join(chunks)
+    assert len(body) == size
+    assert body[:4] == (b'FORM' if format_type == 'aiff' else b'RIFF')
+
+def test_materialize_stream_rejects_other_formats(tmp_path):
+    with pytest.raises(ConversionError):
+        materialize_stream(flac_file(tmp_path), 'mp3')
+
+def test_materialize_stream_needs_the_flac_length(tmp_path):
+    with pytest.raises(ConversionError):
+        materialize_stream(flac_file(tmp_path, total_samples=0), 'wav')
@@ -0,0 +1,72 @@
+import io
+import json
+
+import pytest
+
+import url_loaders
+from url_loaders import iter_urls, iter_urls_from_json, iter_urls_from_text
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Read JSON a few characters at a time, so values straddle chunk boundaries"""
+    monkeypatch.setattr(url_loaders, 'CHUNK_SIZE', 5)
+
+def test_text_skips_comments_and_blank_lines(tmp_path):
+    path = write(tmp_path, 'urls.txt', '# header\n\nhttps://a\n  https://b  \n')
+    assert [(e['url'], e['line_number']) for e in iter_urls_from_text(path)] == [
+        ('https://a', 3), ('https://b', 4)]
+
+def test_text_reads_json_lines(tmp_path):
+    path = write(tmp_path, 'urls.jsonl',
+                 '{"url": "https://a", "name": "first"}\n{"title": "no url"}\nhttps://b\n')
+    entries = list(iter_urls(path))
+    assert [e['url'] for e in entries] == ['https://a', 'https://b']
+    assert entries[0]['name'] == 'first'
+    assert entries[0]['status'] == 'pending'
+
+def test_text_skips_malformed_json_lines(tmp_path, capsys):
+    path = write(tmp_path, 'urls.jsonl', '{"url": "https://a"}\n{"url": \nhttps://b\n')
+    assert [e['url'] for e in iter_urls_from_text(path)] == ['https://a', 'https://b']
+    assert f'Skipping line 2 of {path}: invalid JSON' in capsys.readouterr().out
+
+def test_text_reads_stdin(monkeypatch):
+    monkeypatch.setattr('sys.stdin', io.StringIO('https://a\nhttps://b\n'))
+    assert [e['url'] for e in iter_urls('-')] == ['https://a', 'https://b']
+
+def test_json_array(tmp_path, small_chunks):
+    items = ['https://a', {'url': 'https://b', 'retries': 12345}, {'name': 'no url'}, 'https://c']
+    path = write(tmp_path, 'batch.json', json.dumps(items, indent=2))
+    entries = list(iter_urls(path))
+    assert [e['url'] for e in entries] == ['https://a', 'https://b', 'https://c']
+    assert entries[1]['retries'] == 12345
+
+def test_json_object_with_urls_after_other_keys(tmp_path, small_chunks):
+    data = {'name': 'batch', 'options': {'format': 'wav', 'count': 2}, 'urls': ['https://a', 'https://b']}
+    path = write(tmp_path, 'batch.json', json.dumps(data))
+    assert [e['url'] for e in iter_urls_from_json(path)] == ['https://a', 'https://b']
+
+def test_json_empty_array(tmp_path):
+    assert list(iter_urls_from_json(write(tmp_path, 'batch.json', ' [ ] '))) == []
+
+def test_json_yields_entries_before_reading_the_whole_input(tmp_path, small_chunks):
+    # The second element is broken, but the first is handed out before it is reached
+    entries = iter_urls_from_json(write(tmp_path, 'batch.json', '["https://a", {"url": '))
+    assert next(entries)['url'] == 'https://a'
+    with pytest.raises(ValueError):
+        next(entries)
+
+@pytest.mark.parametrize('text, message', [
+    ('["https://a" "https://b"]', 'Malformed JSON array'),
+    ('{"name": "batch" "urls": ["https://a"]}', 'Malformed JSON object'),
+    ('{1: "x", "urls": []}', 'Malformed JSON object'),
+    ('{"name": "batch"}', "no 'urls' array"),
+    ('"https://a"', 'Invalid JSON format'),
+])
+def test_json_rejects_malformed_input(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_urls_from_json(write(tmp_path, 'batch.json', text)))
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from work_queue import SQLiteWorkQueue
+
+LEASE_SECONDS = 0.2
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / 'queue.sqlite3'), lease_seconds=LEASE_SECONDS)
+
+def expire():
+    time.sleep(LEASE_SECONDS * 1.5)
+
+def test_enqueue_skips_urls_already_queued(queue):
+    assert queue.enqueue([{'url': 'https://a'}, {'url': 'https://b'}]) == 2
+    assert queue.enqueue([{'url': 'https://b'}, {'url': 'https://c'}]) == 1
+    assert queue.counts() == {'pending': 3}
+
+def test_leased_entries_are_not_handed_out_twice(queue):
+    queue.enqueue([{'url': 'https://a'}])
+    item = queue.lease('w1')
+    assert item['entry']['url'] == 'https://a'
+    assert item['attempt'] == 1
+    assert queue.lease('w2') is None
+
+def test_expired_lease_goes_back_to_the_queue(queue):
+    queue.enqueue([{'url': 'https://a'}])
+    first = queue.lease('w1')
+    expire()
+    second = queue.lease('w2')
+    assert second['item_id'] == first['item_id']
+    assert second['attempt'] == 2
+    assert second['token'] != first['token']
+
+def test_stale_token_is_rejected(queue):
+    queue.enqueue([{'url': 'https://a'}])
+    first = queue.lease('w1')
+    expire()
+    second = queue.lease('w2')
+
+    assert not queue.heartbeat(first['item_id'], first['token'])
+    assert not queue.complete(first['item_id'], first['token'], {'output': 'w1.wav'})
+    assert not queue.fail(first['item_id'], first['token'], 'w1 gave up')
+    assert queue.complete(second['item_id'], second['token'], {'output': 'w2.wav'})
+    # Only the first completion counts, even with the right token
+    assert not queue.complete(second['item_id'], second['token'], {'output': 'again.wav'})
+
+    [result] = queue.results()
+    assert result['status'] == 'completed'
+    assert result['output'] == 'w2.wav'
+    assert result['worker'] == 'w2'
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.enqueue([{'url': 'https://a'}])
+    item = queue.lease('w1')
+    for _ in range(3):
+        time.sleep(LEASE_SECONDS / 2)
+        assert queue.heartbeat(item['item_id'], item['token'])
+    assert queue.lease('w2') is None
+    assert queue.complete(item['item_id'], item['token'], {})
+
+def test_lease_expiring_on_the_last_attempt_fails_the_entry(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite3'), lease_seconds=LEASE_SECONDS,
+                            max_attempts=1)
+    queue.enqueue([{'url': 'https://a'}])
+    queue.lease('w1')
+    expire()
+    assert queue.lease('w2') is None
+    assert queue.counts() == {'failed': 1}
+    assert queue.is_drained()
+
+def test_fail_requeues_until_attempts_run_out(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite3'), max_attempts=2)
+    queue.enqueue([{'url': 'https://a'}])
+    item = queue.lease('w1')
+    assert queue.fail(item['item_id'], item['token'], 'first error')
+    assert queue.counts() == {'pending': 1}
+    item = queue.lease('w1')
+    assert queue.fail(item['item_id'], item['token'], 'second error')
+    assert queue.counts() == {'failed': 1}
+    [result] = queue.results()
+    assert result['error'] == 'second error'
+    assert result['attempts'] == 2
@@ -0,0 +1,80 @@
+import pytest
+
+from ydl_sessions import SessionPool
+
+pytest.importorskip('yt_dlp')
+
+PARAMS = {'quiet': True, 'no_warnings': True}
+
+@pytest.fixture
+def pool():
+    pool = SessionPool()
+    yield pool
+    pool.close()
+
+def test_released_instance_is_reused(pool):
+    session = pool.lease('audio', PARAMS)
+    ydl = session.ydl
+    session.release()
+
+    again = pool.lease('audio', PARAMS)
+    assert again.ydl is ydl
+    assert (pool.created, pool.reused) == (1, 1)
+    again.release()
+
+def test_instances_are_pooled_by_key(pool):
+    session = pool.lease('audio', PARAMS)
+    session.release()
+    other = pool.lease('video', PARAMS)
+    assert other.ydl is not session.ydl
+    other.release()
+
+def test_failed_job_discards_its_instance(pool):
+    session = pool.lease('audio', PARAMS)
+    session.release(failed=True)
+
+    again = pool.lease('audio', PARAMS)
+    assert again.ydl is not session.ydl
+    assert (pool.created, pool.reused) == (2, 0)
+    again.release()
+
+def test_reported_download_error_discards_its_instance(pool):
+    session = pool.lease('audio', PARAMS)
+    session.ydl._download_retcode = 1
+    session.release()
+    assert pool.lease('audio', PARAMS).ydl is not session.ydl
+
+def test_release_removes_the_jobs_template_and_hooks(pool):
+    def hook(status):
+        pass
+
+    session = pool.lease('audio', PARAMS, outtmpl='/tmp/job/%(title)s.%(ext)s',
+                         hooks={'progress_hooks': [hook], 'postprocessor_hooks': [hook]})
+    ydl = session.ydl
+    assert ydl.params['outtmpl']['default'] == '/tmp/job/%(title)s.%(ext)s'
+    assert hook in ydl._progress_hooks
+    session.release()
+
+    again = pool.lease('audio', PARAMS)
+    assert again.ydl is ydl
+    assert ydl.params['outtmpl']['default'] != '/tmp/job/%(title)s.%(ext)s'
+    assert hook not in ydl._progress_hooks
+    assert hook not in ydl._postprocessor_hooks
+    again.release()
+
+def test_instances_are_retired_after_max_uses():
+    pool = SessionPool(max_uses=2)
+    first = pool.lease('audio', PARAMS)
+    first.release()
+    second = pool.lease('audio', PARAMS)
+    assert second.ydl is first.ydl
+    second.release()
+    assert pool.lease('audio', PARAMS).ydl is not first.ydl
+
+def test_idle_instances_of_old_keys_are_evicted():
+    pool = SessionPool(max_keys=1)
+    session = pool.lease('audio', PARAMS)
+    session.release()
+    pool.lease('video', PARAMS).release()
+    assert pool.evicted == 1
+    assert pool.lease('audio', PARAMS).ydl is not session.ydl
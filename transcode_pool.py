@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Transcode Pool
+Second stage of the download pipeline. Download workers only download and
+hand each finished file to this pool, which is sized to the CPU count and
+runs the conversion (the CPU work itself happens in ffmpeg subprocesses).
+The two stages are joined by a bounded queue: when every core is busy and
+the queue is full, downloaders wait instead of piling up raw files, and a
+slow transcode never holds a download slot.
+"""
+
+import os
+import queue
+import threading
+import contextvars
+from concurrent.futures import Future
+from bounded_executor import WorkerThreads
+
+DEFAULT_TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', str(os.cpu_count() or 2)))
+# Downloads that may wait for a free core before downloaders are held back
+DEFAULT_TRANSCODE_QUEUE = int(os.environ.get('TRANSCODE_QUEUE', str(DEFAULT_TRANSCODE_WORKERS * 2)))
+
+def completed_future(result):
+    """A Future that already holds result"""
+    future = Future()
+    future.set_result(result)
+    return future
+
+class TranscodePool(WorkerThreads):
+    def __init__(self, max_workers=DEFAULT_TRANSCODE_WORKERS, max_queue=DEFAULT_TRANSCODE_QUEUE):
+        super().__init__(max_workers)
+        self.max_queue = max(1, max_queue)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._active = 0
+        self._active_lock = threading.Lock()
+
+    def _worker(self):
+        while True:
+            future, context, fn, args, kwargs = self._queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                with self._active_lock:
+                    self._active += 1
+                try:
+                    result = context.run(fn, *args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                finally:
+                    with self._active_lock:
+                        self._active -= 1
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn and return a Future of its result
+
+        Blocks while the queue is full, which is what holds downloaders back
+        when transcoding cannot keep up. fn runs in a copy of the caller's
+        context.
+        """
+        self._start_workers()
+        future = Future()
+        self._queue.put((future, contextvars.copy_context(), fn, args, kwargs))
+        return future
+
+    def join(self):
+        """Wait until every queued conversion has finished"""
+        self._queue.join()
+
+    def queue_depth(self):
+        """Number of conversions waiting for a free worker"""
+        return self._queue.qsize()
+
+    def active_count(self):
+        """Number of conversions currently running"""
+        with self._active_lock:
+            return self._active
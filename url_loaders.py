@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+URL Loaders
+Generators that read URL lists lazily, so processing can start on the first
+entry of a multi-million line input without loading the whole file.
+
+Supported inputs: plain text (one URL per line, # comments), JSON arrays or
+{"urls": [...]} objects (parsed incrementally), JSON Lines, and stdin ('-').
+"""
+
+import sys
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+def normalize_entry(item, line_number=None):
+    """Turn a loaded item (URL string or dict) into a batch entry"""
+    if isinstance(item, str):
+        entry = {'url': item.strip()}
+    elif isinstance(item, dict) and item.get('url'):
+        entry = dict(item)
+    else:
+        return None
+    if line_number is not None:
+        entry.setdefault('line_number', line_number)
+    entry.setdefault('status', 'pending')
+    return entry
+
+def open_input(path):
+    """Open a path for reading, with '-' meaning stdin"""
+    if path == '-':
+        return sys.stdin
+    return open(path, 'r', encoding='utf-8')
+
+def iter_urls_from_text(path):
+    """Yield entries from a text file with one URL per line
+
+    Lines starting with '{' are parsed as JSON objects, so the same reader
+    handles JSON Lines input. A line that is not valid JSON is reported and
+    skipped.
+    """
+    f = open_input(path)
+    try:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):  # Skip empty lines and comments
+                continue
+            if line.startswith('{'):
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Skipping line {line_num} of {path}: invalid JSON ({e})")
+                    continue
+            else:
+                item = line
+            entry = normalize_entry(item, line_num)
+            if entry:
+                yield entry
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+class _JSONStream:
+    """Minimal pull parser over a text stream, one JSON value at a time"""
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at end of input"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON input")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                self.eof = True
+
+    def array(self):
+        """Yield the elements of the array starting at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("Malformed JSON array")
+
+def iter_urls_from_json(path):
+    """Yield entries from a JSON array or an object with a 'urls' array
+
+    The array is decoded one element at a time, so memory use does not grow
+    with the number of entries.
+    """
+    f = open_input(path)
+    try:
+        stream = _JSONStream(f)
+        first = stream.peek()
+        if first == '[':
+            items = stream.array()
+        elif first == '{':
+            items = None
+            stream.expect('{')
+            if stream.peek() == '}':
+                stream.pos += 1
+            else:
+                while True:
+                    key = stream.value()
+                    if not isinstance(key, str):
+                        raise ValueError("Malformed JSON object")
+                    stream.expect(':')
+                    if key == 'urls':
+                        items = stream.array()
+                        break
+                    stream.value()
+                    char = stream.peek()
+                    stream.pos += 1
+                    if char == '}':
+                        break
+                    if char != ',':
+                        raise ValueError("Malformed JSON object")
+            if items is None:
+                raise ValueError("Invalid JSON format: no 'urls' array")
+        else:
+            raise ValueError("Invalid JSON format")
+
+        for item in items:
+            entry = normalize_entry(item)
+            if entry:
+                yield entry
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def iter_urls(path):
+    """Pick a loader from the input's name"""
+    if path.endswith('.json'):
+        return iter_urls_from_json(path)
+    # Text files, .jsonl files and stdin share the line-based reader
+    return iter_urls_from_text(path)
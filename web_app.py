@@ -5,30 +5,131 @@ A Flask web application for music conversion
 Note: This is a simplified version for web deployment
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
+from urllib.parse import quote
 import os
+import shutil
 import tempfile
 import threading
 import time
 from pathlib import Path
-import yt_dlp
-from pydub import AudioSegment
 import json
+import mimetypes
+import unicodedata
+from concurrent.futures import Future
+from download_cache import DownloadCache, media_id_for_info
+from metadata_cache import MetadataCache
+from output_manifest import OutputManifest, final_output_path, source_id
+from job_store import create_job_store, new_job_id, FINISHED_STATES
+from bounded_executor import BoundedExecutor, QueueFull
+from progress import ProgressTracker
+from streaming_convert import materialize_stream, PCM_OUTPUT_FORMATS
+from format_selection import convert_download, QUALITY_TARGETS
+from download_flow import DownloadFlow
+from transcode_pool import TranscodePool, DEFAULT_TRANSCODE_WORKERS, DEFAULT_TRANSCODE_QUEUE
+from audio_profiles import AUDIO_PROFILES, DEFAULT_PROFILE
+from metrics import Registry
+from ydl_sessions import SessionPool
 
 app = Flask(__name__)
 
 # Configuration
 UPLOAD_FOLDER = 'downloads'
-ALLOWED_EXTENSIONS = {'wav', 'aiff'}
+# Downloads are network-bound, so MAX_CONCURRENT_JOBS is sized for network
+# concurrency; conversions run on a separate pool of TRANSCODE_WORKERS
+# (default: one per core, 0 converts in the download worker) fed through a
+# queue of TRANSCODE_QUEUE files
+MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', '8'))
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', '16'))
+
+# PIPELINED_DOWNLOADS=1 converts while downloading, without an intermediate file
+PIPELINED_DOWNLOADS = bool(os.environ.get('PIPELINED_DOWNLOADS'))
+
+# FLAC_STORAGE=1 keeps converted audio (and cache entries) as FLAC; WAV and AIFF
+# requests share one stored copy and are decoded as they are downloaded
+FLAC_STORAGE = bool(os.environ.get('FLAC_STORAGE'))
+
+# Hand file transfers to the front-end server instead of copying bytes in Python:
+# USE_X_SENDFILE=1 for Apache/lighttpd, X_ACCEL_REDIRECT_PREFIX=/internal/ for an
+# nginx internal location aliased to UPLOAD_FOLDER
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+app.config['USE_X_SENDFILE'] = bool(os.environ.get('USE_X_SENDFILE') or X_ACCEL_REDIRECT_PREFIX)
+DOWNLOAD_MAX_AGE = int(os.environ.get('DOWNLOAD_MAX_AGE', '3600'))
+
+# Server-Sent Events: how often other processes' updates are picked up, how often
+# an idle stream sends a keep-alive, and how long a stream stays open at most
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', '0.5'))
+SSE_KEEPALIVE_INTERVAL = 15
+SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', '3600'))
+# Each open stream holds a server thread, so streams are capped below the
+# thread count (--threads in the Procfile) and busier clients fall back to
+# polling /status; one stream follows at most SSE_MAX_JOBS jobs. A client
+# that went away is noticed, and its slot freed, at the next keep-alive
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '8'))
+SSE_MAX_JOBS = int(os.environ.get('SSE_MAX_JOBS', '50'))
+sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Store conversion status
-conversion_status = {}
+# Store conversion status where every worker process can see it
+# (JOB_STORE=memory keeps it in-process, otherwise it names an SQLite file)
+job_store = create_job_store()
+
+# Downloads run on a fixed pool; requests beyond the queue limit get a 429
+executor = BoundedExecutor(MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS)
+
+# Downloaded files are converted on a second pool sized to the cores
+transcoder = (TranscodePool(DEFAULT_TRANSCODE_WORKERS, DEFAULT_TRANSCODE_QUEUE)
+              if DEFAULT_TRANSCODE_WORKERS > 0 else None)
+
+# Shared download and metadata caches (set MUSIC_CACHE_DISABLED=1 to turn them off)
+download_cache = None if os.environ.get('MUSIC_CACHE_DISABLED') else DownloadCache()
+metadata_cache = None if os.environ.get('MUSIC_CACHE_DISABLED') else MetadataCache()
+
+# Index of converted files in UPLOAD_FOLDER, keyed by source track
+output_manifest = OutputManifest(UPLOAD_FOLDER)
+
+# YoutubeDL instances the download workers reuse from job to job
+ydl_sessions = SessionPool()
+
+def cache_stats(field):
+    """One field of the download and metadata cache stats, by cache"""
+    caches = {'download': download_cache, 'metadata': metadata_cache}
+    return {(name,): cache.stats.snapshot()[field] for name, cache in caches.items() if cache}
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Served in the Prometheus text format at /metrics
+metrics = Registry()
+stage_seconds = metrics.histogram('musicconvert_stage_seconds',
+                                  'Seconds a job spent in each stage', ('stage',))
+jobs_finished = metrics.counter('musicconvert_jobs_finished_total', 'Jobs finished, by status',
+                                ('status',))
+bytes_served = metrics.counter('musicconvert_download_bytes_total',
+                               'Bytes of converted audio sent from /download')
+metrics.gauge('musicconvert_active_jobs', 'Jobs running on the worker pool',
+              function=lambda: executor.active_count())
+metrics.gauge('musicconvert_queued_jobs', 'Jobs waiting for a free worker',
+              function=lambda: executor.queue_depth())
+metrics.gauge('musicconvert_active_conversions', 'Conversions running on the transcode pool',
+              function=lambda: transcoder.active_count() if transcoder else 0)
+metrics.gauge('musicconvert_queued_conversions', 'Conversions waiting for a free transcode worker',
+              function=lambda: transcoder.queue_depth() if transcoder else 0)
+metrics.counter('musicconvert_cache_hits_total', 'Cache lookups that found an entry', ('cache',),
+                function=lambda: cache_stats('hits'))
+metrics.counter('musicconvert_cache_misses_total', 'Cache lookups that found nothing', ('cache',),
+                function=lambda: cache_stats('misses'))
+metrics.counter('musicconvert_ydl_sessions_created_total', 'YoutubeDL instances created',
+                function=lambda: ydl_sessions.created)
+metrics.counter('musicconvert_ydl_sessions_reused_total', 'Jobs that reused a pooled YoutubeDL instance',
+                function=lambda: ydl_sessions.reused)
+metrics.counter('musicconvert_ydl_sessions_evicted_total', 'Idle YoutubeDL instances closed by the pool',
+                function=lambda: ydl_sessions.evicted)
+metrics.gauge('musicconvert_cache_hit_ratio', 'Share of cache lookups that found an entry',
+              ('cache',), function=lambda: cache_stats('hit_rate'))
+
+def storage_format(format_type):
+    """Format converted audio is kept in for a requested output format"""
+    return 'flac' if FLAC_STORAGE else format_type.lower()
 
 def detect_platform(url):
     """Detect the platform from the URL"""
@@ -43,126 +144,414 @@ def detect_platform(url):
     else:
         return 'unknown'
 
-def download_audio_web(url, output_dir, format_type, quality, job_id):
-    """Download audio using yt-dlp for web version"""
+def complete_job(job_id, file_path, message='Download completed successfully!', output_format=None):
+    """Mark a job as completed with its output file
+
+    output_format is the format the file is downloaded as, when it differs
+    from the stored file's.
+    """
+    output_format = (output_format or os.path.splitext(file_path)[1][1:]).lower()
+    job_store.update(
+        job_id,
+        status='completed',
+        progress=100,
+        stage='done',
+        message=message,
+        file_path=file_path,
+        output_format=output_format,
+        filename=f"{os.path.splitext(os.path.basename(file_path))[0]}.{output_format}",
+    )
+
+def complete_from_existing(source, output_dir, format_type, quality, job_id):
+    """Finish a job from an output already in the manifest, returning True on a hit"""
+    entry = output_manifest.lookup(source, storage_format(format_type), quality)
+    if not entry:
+        return False
+    
+    # Give the job its own name for the file; a hard link costs no copy
+    stem = os.path.splitext(os.path.basename(entry['path']))[0]
+    if stem.startswith('job_'):
+        stem = stem.split('_', 2)[-1]
+    job_path = os.path.join(output_dir, f"{job_id}_{stem}{os.path.splitext(entry['path'])[1]}")
     try:
-        conversion_status[job_id] = {'status': 'processing', 'progress': 0, 'message': 'Starting download...'}
-        
-        # Configure yt-dlp options
-        quality_map = {
-            'best': '320',
-            'high': '192', 
-            'medium': '128'
-        }
-        
-        bitrate = quality_map.get(quality.lower(), '192')
+        os.link(entry['path'], job_path)
+    except OSError:
+        try:
+            shutil.copyfile(entry['path'], job_path)
+        except OSError:
+            return False
+    complete_job(job_id, job_path, 'Download completed successfully! (already converted)',
+                 format_type)
+    return True
+
+def complete_from_cache(cache_key, output_dir, job_id, format_type):
+    """Finish a job from the download cache, returning True on a hit"""
+    cached = download_cache.fetch(cache_key, output_dir, prefix=f'{job_id}_')
+    if not cached:
+        return False
+    complete_job(job_id, cached, 'Download completed successfully! (cached)', format_type)
+    return True
+
+STAGE_MESSAGES = {
+    'extract': 'Extracting video information...',
+    'download': 'Downloading...',
+    'transcode': 'Converting audio...',
+    'done': 'Finishing up...',
+}
+
+def job_progress_reporter(job_id):
+    """Progress callback that records byte-level progress on the job"""
+    def report(snapshot):
+        job_store.update(
+            job_id,
+            progress=int(snapshot['percent']),
+            stage=snapshot['stage'],
+            message=STAGE_MESSAGES[snapshot['stage']],
+            downloaded_bytes=snapshot['downloaded_bytes'],
+            total_bytes=snapshot['total_bytes'],
+            speed=snapshot['speed'],
+            eta=snapshot['eta'],
+            average_speed=snapshot['average_speed'],
+        )
+    return report
+
+def record_timings(job_id, progress):
+    """Store a finished job's stage durations and add them to the metrics"""
+    timings = progress.timings()
+    job_store.update(job_id, durations=timings)
+    for stage, seconds in timings.items():
+        stage_seconds.observe(seconds, stage=stage)
+    jobs_finished.inc(status=(job_store.get(job_id) or {}).get('status', 'unknown'))
+
+class WebDownload(DownloadFlow):
+    """Download flow of a web job, reporting to the job store"""
+    quiet = True
+
+    def __init__(self, url, output_dir, format_type, quality, job_id, profile, progress):
+        super().__init__(url, format_type, quality, profile, progress,
+                         os.path.join(output_dir, f'{job_id}_%(title)s.%(ext)s'), ydl_sessions,
+                         download_cache, metadata_cache, storage_format(format_type),
+                         PIPELINED_DOWNLOADS, transcoder)
+        self.output_dir = output_dir
+        self.job_id = job_id
+
+    def find_existing(self):
+        return complete_from_existing(self.source, self.output_dir, self.format_type,
+                                      self.variant, self.job_id)
+
+    def find_cached(self):
+        return complete_from_cache(self.cache_key, self.output_dir, self.job_id, self.format_type)
+
+    def downloaded(self, info):
+        job_store.update(self.job_id, title=info.get('title', 'Unknown'),
+                         duration=info.get('duration', 0))
+        if self.deferred:
+            job_store.update(self.job_id, stage='transcode', message='Waiting for a free converter...')
+
+    def finish(self, job, ydl=None):
+        finish_download_web(job, self.job_id, ydl)
+
+def download_audio_web(url, output_dir, format_type, quality, job_id, profile=DEFAULT_PROFILE):
+    """Download audio using yt-dlp for web version
+
+    With the transcode pool enabled, this worker only downloads and the
+    conversion is queued on the pool.
+    """
+    progress = ProgressTracker(job_progress_reporter(job_id))
+    result = None
+    try:
+        job_store.update(job_id, status='processing', progress=0, message='Starting download...',
+                         stage='extract', queue_position=0, estimated_wait=0)
+        result = WebDownload(url, output_dir, format_type, quality, job_id, profile, progress).run()
+        if isinstance(result, Future):
+            # The transcode pool records the job's timings once it is done
+            result.add_done_callback(lambda _: record_timings(job_id, progress))
+    except Exception as e:
+        job_store.update(job_id, status='failed', message=f'Error: {str(e)}')
+    finally:
+        if not isinstance(result, Future):
+            record_timings(job_id, progress)
+
+def finish_download_web(job, job_id, ydl=None):
+    """Convert a download if ydl is given, then complete the job and record its output"""
+    info, format_type, stored_format = job['info'], job['format_type'], job['storage_format']
+    variant, progress = job['variant'], job['progress']
+    try:
+        progress.end_span('transcode_wait')
+        if ydl is not None:
+            convert_download(ydl, info, stored_format, job['profile'], progress)
+        progress.finish()
         
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(output_dir, f'{job_id}_%(title)s.%(ext)s'),
-            'extractaudio': True,
-            'audioformat': format_type.lower(),
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': format_type.lower(),
-                'preferredquality': bitrate,
-            }],
-            'quiet': True,
-            'no_warnings': True,
-        }
+        final_path = final_output_path(info)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Get video info first
-            conversion_status[job_id]['message'] = 'Extracting video information...'
-            conversion_status[job_id]['progress'] = 20
-            
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'Unknown')
-            duration = info.get('duration', 0)
-            
-            conversion_status[job_id]['title'] = title
-            conversion_status[job_id]['duration'] = duration
-            conversion_status[job_id]['message'] = f'Downloading: {title}'
-            conversion_status[job_id]['progress'] = 40
-            
-            # Download
-            ydl.download([url])
-            conversion_status[job_id]['progress'] = 80
-            
-            # Find the downloaded file
-            downloaded_files = [f for f in os.listdir(output_dir) 
-                              if f.startswith(f'{job_id}_') and f.endswith(f'.{format_type.lower()}')]
-            
-            if downloaded_files:
-                final_path = os.path.join(output_dir, downloaded_files[0])
-                conversion_status[job_id]['status'] = 'completed'
-                conversion_status[job_id]['progress'] = 100
-                conversion_status[job_id]['message'] = 'Download completed successfully!'
-                conversion_status[job_id]['file_path'] = final_path
-                conversion_status[job_id]['filename'] = downloaded_files[0]
-            else:
-                conversion_status[job_id]['status'] = 'failed'
-                conversion_status[job_id]['message'] = 'Download completed but file not found'
-                
+        if final_path and os.path.exists(final_path):
+            complete_job(job_id, final_path, output_format=format_type)
+            with progress.span('store'):
+                output_manifest.record(source_id(*media_id_for_info(info)),
+                                       final_path, stored_format, variant, info.get('title', 'Unknown'))
+                cache_key = download_cache.key_for_info(info, stored_format, variant) if download_cache else None
+                if cache_key:
+                    stem = os.path.splitext(os.path.basename(final_path))[0][len(f'{job_id}_'):]
+                    download_cache.put(
+                        cache_key, final_path, info.get('extractor_key'), info.get('id'),
+                        stored_format, variant.lower(), stem
+                    )
+        else:
+            job_store.update(job_id, status='failed',
+                             message='Download completed but file not found')
     except Exception as e:
-        conversion_status[job_id]['status'] = 'failed'
-        conversion_status[job_id]['message'] = f'Error: {str(e)}'
+        job_store.update(job_id, status='failed', message=f'Error: {str(e)}')
+
+def refresh_queue_positions():
+    for position, queued_id in enumerate(executor.queued_tags(), 1):
+        job_store.update(queued_id, queue_position=position,
+                         estimated_wait=executor.estimate_wait(position))
+
+def run_queued_job(url, output_dir, format_type, quality, job_id, profile=DEFAULT_PROFILE):
+    """Worker entry point: refresh queue positions, then convert"""
+    refresh_queue_positions()
+    download_audio_web(url, output_dir, format_type, quality, job_id, profile)
+
+def purge_expired_jobs():
+    """Drop finished jobs past their TTL along with their output files"""
+    for job in job_store.purge_expired():
+        file_path = job.get('file_path')
+        if file_path and os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        if file_path:
+            output_manifest.remove_file(file_path)
+
+def queue_job(job_id, fn, *args):
+    """Create a job and queue fn on the worker pool, answering 429 when full"""
+    job_store.create(job_id, status='queued', progress=0, message='Waiting in queue...')
+    
+    try:
+        position = executor.submit(fn, *args, tag=job_id)
+    except QueueFull as e:
+        job_store.delete(job_id)
+        response = jsonify({
+            'error': 'Server is busy, please retry later',
+            'queue_position': e.position,
+            'retry_after': e.retry_after,
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    
+    estimated_wait = executor.estimate_wait(position)
+    if position:
+        job_store.update(job_id, queue_position=position, estimated_wait=estimated_wait)
+    
+    return jsonify({
+        'job_id': job_id,
+        'message': 'Conversion queued' if position else 'Conversion started',
+        'queue_position': position,
+        'estimated_wait': estimated_wait,
+    }), 200
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', profiles=AUDIO_PROFILES, default_profile=DEFAULT_PROFILE)
 
 @app.route('/convert', methods=['POST'])
 def convert():
     data = request.get_json()
     url = data.get('url', '').strip()
-    format_type = data.get('format', 'wav')
-    quality = data.get('quality', 'best')
+    format_type = str(data.get('format', 'wav')).lower()
+    quality = str(data.get('quality', 'best')).lower()
+    profile = data.get('profile', DEFAULT_PROFILE)
     
     if not url:
         return jsonify({'error': 'URL is required'}), 400
+    if format_type not in PCM_OUTPUT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {format_type}'}), 400
+    if quality not in QUALITY_TARGETS:
+        return jsonify({'error': f'Unknown quality: {quality}'}), 400
+    if profile not in AUDIO_PROFILES:
+        return jsonify({'error': f'Unknown profile: {profile}'}), 400
     
-    # Generate unique job ID
-    job_id = f"job_{int(time.time())}"
-    
-    # Start conversion in background thread
-    thread = threading.Thread(
-        target=download_audio_web,
-        args=(url, UPLOAD_FOLDER, format_type, quality, job_id)
-    )
-    thread.daemon = True
-    thread.start()
+    purge_expired_jobs()
     
-    return jsonify({'job_id': job_id, 'message': 'Conversion started'})
+    # Generate unique job ID
+    job_id = new_job_id()
+    return queue_job(job_id, run_queued_job, url, UPLOAD_FOLDER, format_type, quality, job_id,
+                     profile)
 
 @app.route('/status/<job_id>')
 def get_status(job_id):
-    if job_id not in conversion_status:
+    job = job_store.get(job_id)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
     
-    return jsonify(conversion_status[job_id])
+    return jsonify(job)
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def job_event_stream(job_ids):
+    """Yield an SSE message whenever one of the followed jobs changes
+
+    The stream ends once every job has finished or disappeared.
+    """
+    last_seen = {}
+    remaining = list(dict.fromkeys(job_ids))
+    deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+    last_sent = time.monotonic()
+    
+    # Tell EventSource how long to wait before reconnecting
+    yield "retry: 2000\n\n"
+    
+    while remaining and time.monotonic() < deadline:
+        for job_id in list(remaining):
+            job = job_store.get(job_id)
+            if job is None:
+                remaining.remove(job_id)
+                yield sse_message('missing', {'job_id': job_id, 'error': 'Job not found'})
+                last_sent = time.monotonic()
+                continue
+            
+            if job.get('updated_at') != last_seen.get(job_id):
+                last_seen[job_id] = job.get('updated_at')
+                yield sse_message('status', dict(job, job_id=job_id))
+                last_sent = time.monotonic()
+            
+            if job.get('status') in FINISHED_STATES:
+                remaining.remove(job_id)
+        
+        if not remaining:
+            break
+        
+        if time.monotonic() - last_sent >= SSE_KEEPALIVE_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        
+        job_store.wait_for_change(SSE_POLL_INTERVAL)
+
+def sse_response(job_ids):
+    """Event stream for job_ids, or 503 when SSE_MAX_STREAMS streams are already open"""
+    if not sse_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open event streams, poll /status instead'})
+        response.headers['Retry-After'] = str(SSE_KEEPALIVE_INTERVAL)
+        return response, 503
+    response = Response(
+        stream_with_context(job_event_stream(job_ids)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+    # The slot is freed when the stream ends or the client disconnects
+    response.call_on_close(sse_slots.release)
+    return response
+
+@app.route('/events/<job_id>')
+def job_events(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return sse_response([job_id])
+
+@app.route('/events')
+def multi_job_events():
+    job_ids = [job_id.strip() for job_id in request.args.get('jobs', '').split(',') if job_id.strip()]
+    if not job_ids:
+        return jsonify({'error': 'jobs parameter is required'}), 400
+    if len(job_ids) > SSE_MAX_JOBS:
+        return jsonify({'error': f'At most {SSE_MAX_JOBS} jobs per stream'}), 400
+    
+    return sse_response(job_ids)
+
+def count_served(chunks):
+    """Pass chunks through, counting each once the server asks for the next
+
+    A client that disconnects closes the generator at the pending chunk, so
+    only the bytes actually written are counted.
+    """
+    for chunk in chunks:
+        yield chunk
+        bytes_served.inc(len(chunk))
+
+def materialized_response(job):
+    """Stream a stored FLAC file as the job's WAV or AIFF output
+
+    The header is built from the FLAC's own metadata, so the response has
+    an exact Content-Length even though it is decoded on the fly; Range
+    requests are not supported.
+    """
+    size, chunks = materialize_stream(job['file_path'], job['output_format'])
+    response = Response(stream_with_context(count_served(chunks)),
+                        mimetype=mimetypes.guess_type(job['filename'])[0] or 'application/octet-stream',
+                        direct_passthrough=True)
+    response.content_length = size
+    response.headers['Accept-Ranges'] = 'none'
+    response.cache_control.max_age = DOWNLOAD_MAX_AGE
+    
+    filename = job['filename']
+    names = {'filename': filename}
+    if not filename.isascii():
+        names = {
+            'filename': unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii'),
+            'filename*': f"UTF-8''{quote(filename)}",
+        }
+    response.headers.set('Content-Disposition',
+                         'inline' if request.args.get('inline') else 'attachment', **names)
+    return response
 
 @app.route('/download/<job_id>')
 def download_file(job_id):
-    if job_id not in conversion_status:
+    job = job_store.get(job_id)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
     
-    job = conversion_status[job_id]
     if job['status'] != 'completed' or 'file_path' not in job:
         return jsonify({'error': 'File not ready'}), 400
     
     try:
-        return send_file(
+        # Files kept in the FLAC tier are decoded to the requested format as they are sent
+        stored_ext = os.path.splitext(job['file_path'])[1][1:].lower()
+        if stored_ext == 'flac' and job.get('output_format', stored_ext) != stored_ext:
+            return materialized_response(job)
+        
+        # conditional=True answers Range, If-Range and If-None-Match requests with
+        # 206/304 responses, so interrupted downloads resume and previews can seek
+        response = send_file(
             job['file_path'],
-            as_attachment=True,
-            download_name=job['filename']
+            as_attachment=not request.args.get('inline'),
+            download_name=job['filename'],
+            conditional=True,
+            etag=True,
+            max_age=DOWNLOAD_MAX_AGE
         )
+        if X_ACCEL_REDIRECT_PREFIX and 'X-Sendfile' in response.headers:
+            relative_path = os.path.relpath(job['file_path'], UPLOAD_FOLDER).replace(os.sep, '/')
+            del response.headers['X-Sendfile']
+            response.headers['X-Accel-Redirect'] = (
+                X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relative_path)
+            )
+        # Counts the body of 200 and 206 responses; 304s carry none
+        if response.status_code in (200, 206):
+            bytes_served.inc(response.content_length or 0)
+        return response
     except Exception as e:
         return jsonify({'error': f'Download failed: {str(e)}'}), 500
 
 @app.route('/health')
 def health():
-    return jsonify({'status': 'healthy', 'message': 'Music Converter Web API is running'})
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Music Converter Web API is running',
+        'active_jobs': executor.active_count(),
+        'queued_jobs': executor.queue_depth(),
+        'active_conversions': transcoder.active_count() if transcoder else 0,
+        'queued_conversions': transcoder.queue_depth() if transcoder else 0,
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
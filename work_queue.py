@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Work Queue
+Shared queue of batch entries that several batch_processor.py --worker
+processes drain together, on one host or on many hosts over a shared
+filesystem. A worker leases an entry for a limited time and renews the lease
+with heartbeats while it works on it; entries whose lease runs out because
+their worker died go back to the queue. Each entry is completed exactly once:
+only the holder of the current lease can record the result.
+"""
+
+import os
+import json
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+DEFAULT_LEASE_SECONDS = int(os.environ.get('WORK_LEASE_SECONDS', '300'))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get('WORK_MAX_ATTEMPTS', '3'))
+
+# Entries in these states are no longer handed out
+FINISHED_STATES = ('completed', 'failed')
+
+def default_worker_id():
+    """Identifier of this process that is unique across hosts"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue(ABC):
+    """Interface shared by all work queue backends"""
+    def __init__(self, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+
+    @abstractmethod
+    def enqueue(self, entries):
+        """Add entries, skipping URLs already in the queue; returns how many were added"""
+
+    @abstractmethod
+    def lease(self, worker_id):
+        """Take the next pending entry, or None when nothing is available right now
+
+        Returns a dict with the item id, lease token, attempt number and entry.
+        """
+
+    @abstractmethod
+    def heartbeat(self, item_id, token):
+        """Extend a lease; returns False once the lease has been lost"""
+
+    @abstractmethod
+    def complete(self, item_id, token, result):
+        """Record the result of a leased entry; returns False if the lease was lost"""
+
+    @abstractmethod
+    def fail(self, item_id, token, error):
+        """Give up a leased entry, re-queueing it until it runs out of attempts"""
+
+    @abstractmethod
+    def counts(self):
+        """Number of entries in each state"""
+
+    @abstractmethod
+    def results(self):
+        """Every entry with its state and result, in queue order"""
+
+    def is_drained(self):
+        """True once every entry is completed or failed"""
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+class SQLiteWorkQueue(WorkQueue):
+    def __init__(self, db_path, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        super().__init__(lease_seconds, max_attempts)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            # WAL needs shared memory on a single host; the rollback journal
+            # only relies on file locks, so it also works on shared filesystems
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS items (
+                    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL UNIQUE,
+                    entry TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_token TEXT,
+                    lease_expires REAL,
+                    result TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_items_status ON items (status, item_id)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers
+            # can never lease the same entry
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def enqueue(self, entries, batch_size=500):
+        added = 0
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                added += self._insert(batch)
+                batch = []
+        if batch:
+            added += self._insert(batch)
+        return added
+
+    def _insert(self, entries):
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (url, entry, status, updated_at) VALUES (?, ?, 'pending', ?)",
+                [(entry['url'], json.dumps(entry, ensure_ascii=False), now) for entry in entries]
+            )
+            return conn.total_changes - before
+
+    def _expire_leases(self, conn, now):
+        """Return entries whose worker stopped heartbeating to the queue"""
+        conn.execute(
+            "UPDATE items SET status = 'failed', lease_token = NULL, updated_at = ?, result = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, json.dumps({'error': 'Lease expired on the last attempt'}), now, self.max_attempts)
+        )
+        conn.execute(
+            "UPDATE items SET status = 'pending', lease_token = NULL, updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (now, now)
+        )
+
+    def lease(self, worker_id):
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT item_id, entry, attempts FROM items WHERE status = 'pending' "
+                "ORDER BY item_id LIMIT 1"
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE items SET status = 'leased', attempts = attempts + 1, worker = ?, "
+                "lease_token = ?, lease_expires = ?, updated_at = ? WHERE item_id = ?",
+                (worker_id, token, now + self.lease_seconds, now, row[0])
+            )
+        return {'item_id': row[0], 'token': token, 'attempt': row[2] + 1,
+                'entry': json.loads(row[1])}
+
+    def heartbeat(self, item_id, token):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET lease_expires = ?, updated_at = ? "
+                "WHERE item_id = ? AND lease_token = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, item_id, token)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, item_id, token, result):
+        with self._connect() as conn:
+            # Matching the token makes the first completion the only one: a
+            # worker whose lease expired and was handed on cannot record a result
+            cursor = conn.execute(
+                "UPDATE items SET status = 'completed', result = ?, lease_token = NULL, "
+                "updated_at = ? WHERE item_id = ? AND lease_token = ? AND status = 'leased'",
+                (json.dumps(result, ensure_ascii=False), time.time(), item_id, token)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, item_id, token, error):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "result = ?, lease_token = NULL, updated_at = ? "
+                "WHERE item_id = ? AND lease_token = ? AND status = 'leased'",
+                (self.max_attempts, json.dumps({'error': str(error)}), time.time(), item_id, token)
+            )
+            return cursor.rowcount == 1
+
+    def counts(self):
+        with self._transaction() as conn:
+            # Expired leases count as pending, so waiting workers pick them up
+            self._expire_leases(conn, time.time())
+            rows = conn.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall()
+        return dict(rows)
+
+    def results(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT entry, status, attempts, worker, result FROM items ORDER BY item_id'
+            ).fetchall()
+        results = []
+        for entry, status, attempts, worker, result in rows:
+            item = json.loads(entry)
+            item.update(json.loads(result) if result else {})
+            item.update(status=status, attempts=attempts, worker=worker)
+            results.append(item)
+        return results
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+YoutubeDL Sessions
+Pool of YoutubeDL instances shared by the download workers of the CLI,
+batch processor and web app. An instance keeps its cookies, extractor and
+player caches and keep-alive HTTP connections, so consecutive tracks skip
+repeated TLS handshakes and player downloads. Instances are pooled by
+option set; each job borrows one exclusively, adds its own output template,
+hooks and post-processors, and hands it back without them. An instance is
+retired after a number of jobs, or as soon as a job using it fails. Idle
+instances are closed after a while, and only the most recently used option
+sets keep idle instances at all.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_USES = int(os.environ.get('YDL_SESSION_MAX_USES', '100'))
+# Idle instances kept per option set
+DEFAULT_MAX_IDLE = int(os.environ.get('YDL_SESSION_MAX_IDLE', '4'))
+# Option sets with idle instances, and how long an instance may sit idle
+DEFAULT_MAX_KEYS = int(os.environ.get('YDL_SESSION_MAX_KEYS', '8'))
+DEFAULT_IDLE_SECONDS = float(os.environ.get('YDL_SESSION_IDLE_SECONDS', '300'))
+
+class Session:
+    """A pooled YoutubeDL instance on loan to one job"""
+    def __init__(self, pool, key, ydl):
+        self.pool = pool
+        self.key = key
+        self.ydl = ydl
+        self.uses = 0
+        self._hooks = {}
+        self._pps = None
+        self._outtmpl = None
+
+    def begin(self, outtmpl=None, hooks=None):
+        """Apply a job's output template and progress/post-processor hooks"""
+        ydl = self.ydl
+        self.uses += 1
+        self._pps = {when: list(pps) for when, pps in ydl._pps.items()}
+        self._outtmpl = dict(ydl.params['outtmpl'])
+        if outtmpl:
+            ydl.params['outtmpl']['default'] = outtmpl
+        self._hooks = hooks or {}
+        # Post-processor hooks must be in place before the job adds its post-processors
+        for hook in self._hooks.get('progress_hooks', ()):
+            ydl.add_progress_hook(hook)
+        for hook in self._hooks.get('postprocessor_hooks', ()):
+            ydl.add_postprocessor_hook(hook)
+
+    def end(self):
+        """Remove everything begin and the job added"""
+        ydl = self.ydl
+        for hook in self._hooks.get('progress_hooks', ()):
+            if hook in ydl._progress_hooks:
+                ydl._progress_hooks.remove(hook)
+        for hook in self._hooks.get('postprocessor_hooks', ()):
+            if hook in ydl._postprocessor_hooks:
+                ydl._postprocessor_hooks.remove(hook)
+        for when, pps in self._pps.items():
+            ydl._pps[when][:] = pps
+        ydl.params['outtmpl'].clear()
+        ydl.params['outtmpl'].update(self._outtmpl)
+        self._hooks = {}
+
+    def release(self, failed=False):
+        """Hand the instance back to the pool; a failed job retires it"""
+        self.pool.release(self, failed)
+
+class SessionPool:
+    def __init__(self, max_uses=DEFAULT_MAX_USES, max_idle=DEFAULT_MAX_IDLE,
+                 max_keys=DEFAULT_MAX_KEYS, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.max_uses = max(1, max_uses)
+        self.max_idle = max(0, max_idle)
+        self.max_keys = max(1, max_keys)
+        self.idle_seconds = idle_seconds
+        # Idle (session, released at) pairs by key, least recently released key first
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def lease(self, key, params, outtmpl=None, hooks=None):
+        """Borrow an instance for the option set key, creating it from params if none is idle
+
+        params must be the same for every lease with the same key; per-job
+        settings go in outtmpl and hooks (a dict with progress_hooks and
+        postprocessor_hooks lists). Release the session when the job, including
+        any conversion that uses its YoutubeDL, has finished.
+        """
+        session = None
+        with self._lock:
+            expired = self._expire()
+            idle = self._idle.get(key)
+            if idle:
+                session, _ = idle.pop()
+                if not idle:
+                    del self._idle[key]
+                self.reused += 1
+        self._close_all(expired)
+        if session is None:
+            # Imported here so front ends load yt-dlp only once they download
+            import yt_dlp
+            session = Session(self, key, yt_dlp.YoutubeDL(params))
+            with self._lock:
+                self.created += 1
+        session.begin(outtmpl, hooks)
+        return session
+
+    def release(self, session, failed=False):
+        try:
+            session.end()
+        except Exception:
+            failed = True
+        # A non-zero return code means yt-dlp reported an error it did not raise
+        failed = failed or bool(getattr(session.ydl, '_download_retcode', 0))
+        with self._lock:
+            idle = self._idle.get(session.key, [])
+            keep = (not failed and session.uses < self.max_uses and len(idle) < self.max_idle)
+            if keep:
+                idle.append((session, time.monotonic()))
+                self._idle[session.key] = idle
+                self._idle.move_to_end(session.key)
+            expired = self._expire()
+        if not keep:
+            self._close(session)
+        self._close_all(expired)
+
+    def _expire(self):
+        """Take idle sessions past idle_seconds, and those of keys beyond max_keys, out of the pool"""
+        expired = []
+        cutoff = time.monotonic() - self.idle_seconds
+        for key in list(self._idle):
+            idle = self._idle[key]
+            stale = [entry for entry in idle if entry[1] < cutoff]
+            if stale:
+                expired.extend(session for session, _ in stale)
+                idle[:] = [entry for entry in idle if entry[1] >= cutoff]
+            if not idle:
+                del self._idle[key]
+        while len(self._idle) > self.max_keys:
+            _, idle = self._idle.popitem(last=False)
+            expired.extend(session for session, _ in idle)
+        self.evicted += len(expired)
+        return expired
+
+    def _close(self, session):
+        try:
+            session.ydl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL session: {e}")
+
+    def _close_all(self, sessions):
+        for session in sessions:
+            self._close(session)
+
+    def close(self):
+        """Close every idle instance"""
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session, _ in idle]
+            self._idle.clear()
+        self._close_all(sessions)